@@ -0,0 +1,240 @@
+# Copyright (c) 2023 - 2024 Molodos
+# The ElegooNeptuneThumbnails plugin is released under the terms of the AGPLv3 or higher.
+
+"""
+Benchmark suite for all thumbnail encoders, ColPic, G-code header parsing and splicing (headless, no Cura needed)
+Run with: python -m benchmarks [--output results.json] [--baseline old_results.json]
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import timeit
+from array import array
+from datetime import datetime, timezone
+from functools import partial
+from typing import Any, Callable, Iterator, Optional
+
+from tools import lib_col_pic
+from tools.encoders import ThumbnailEncoder
+from tools.gcode_header import GCodeHeaderParser
+from tools.gcode_splicer import GCodeSplicer
+from tools.printer_profiles import PrinterProfiles
+
+try:
+    from tools import lib_col_pic_numpy
+except ImportError:
+    # NumPy is optional, its ColPic encoder is skipped without it
+    lib_col_pic_numpy = None
+
+try:
+    from PyQt6.QtCore import QByteArray, QBuffer, QIODeviceBase
+    from PyQt6.QtGui import QImage
+except ImportError:
+    # JPEG compression needs Qt, base64 JPEG thumbnails are skipped without it
+    QImage = None
+
+Benchmark = tuple[str, Callable[[], Any]]
+
+COMPLEXITIES: list[str] = ["flat", "gradient", "noise"]
+KLIPPER_SIZES: list[int] = [32, 300]
+COL_PIC_SIZE: int = 200
+COL_PIC_REDUCED_COLORS: int = 256
+LAYERS: int = 50_000
+MIN_RUN_SECONDS: float = 0.05
+DEFAULT_REPEAT: int = 3
+DEFAULT_THRESHOLD: float = 1.25
+HEADERS: dict[str, str] = {
+    "elegoo": ";FLAVOR:Marlin\n;TIME:2432\n;Filament used: 2.02409m\n;Layer height: 0.2\n;MINX:86.84\n;MINY:101.226\n"
+              ";MINZ:0.2\n;MAXX:140.428\n;MAXY:130.771\n;MAXZ:33\n;TARGET_MACHINE.NAME:ELEGOO NEPTUNE 4 Pro\n"
+              ";Generated with Cura_SteamEngine 5.8.0\n",
+    "ultimaker": ";START_OF_HEADER\n;HEADER_VERSION:0.1\n;FLAVOR:Griffin\n;GENERATOR.NAME:Cura_SteamEngine\n"
+                 ";TARGET_MACHINE.NAME:Ultimaker S5\n;PRINT.TIME:2432\n;PRINT.SIZE.MIN.X:86.84\n"
+                 ";PRINT.SIZE.MIN.Y:101.226\n;PRINT.SIZE.MIN.Z:0.2\n;PRINT.SIZE.MAX.X:140.428\n"
+                 ";PRINT.SIZE.MAX.Y:130.771\n;PRINT.SIZE.MAX.Z:33\n;END_OF_HEADER\n"
+                 ";Generated with Cura_SteamEngine 5.8.0\n"
+}
+
+_images: dict[tuple[int, int, str], bytes] = {}
+
+
+def synthetic_image(width: int, height: int, complexity: str) -> bytes:
+    """
+    Build (and cache) an opaque RGBA8888 test image without row padding
+    :param complexity: "flat" (one color), "gradient" (thousands of smooth colors) or "noise" (random colors)
+    """
+    key: tuple[int, int, str] = (width, height, complexity)
+    if key not in _images:
+        if complexity == "flat":
+            _images[key] = bytes((48, 57, 79, 255)) * (width * height)
+        elif complexity == "gradient":
+            _images[key] = bytes(value for y in range(height) for x in range(width) for value in
+                                 (x * 255 // max(width - 1, 1), y * 255 // max(height - 1, 1),
+                                  (x + y) * 255 // max(width + height - 2, 1), 255))
+        else:
+            pixels: bytearray = bytearray(random.Random(width * height).randbytes(width * height * 4))
+            pixels[3::4] = b"\xff" * (width * height)
+            _images[key] = bytes(pixels)
+    return _images[key]
+
+
+def encode_thumbnail(encoding: str, rgba: bytes, width: int, height: int, img_type: str) -> list[str]:
+    """
+    Encode a thumbnail like the thumbnail generator does (without scaling)
+    """
+    if encoding == "old":
+        return ThumbnailEncoder.encode_old_thumbnail(rgba, width, height, width * 4, img_type)
+    elif encoding == "b64jpg":
+        image: QImage = QImage(rgba, width, height, width * 4, QImage.Format.Format_RGBA8888)
+        byte_array: QByteArray = QByteArray()
+        byte_buffer: QBuffer = QBuffer(byte_array)
+        byte_buffer.open(QIODeviceBase.OpenModeFlag.WriteOnly)
+        image.save(byte_buffer, "JPEG")
+        return ThumbnailEncoder.encode_b64jpg_thumbnail(byte_array.data(), img_type)
+    return ThumbnailEncoder.encode_col_pic_thumbnail(rgba, width, height, width * 4, img_type)
+
+
+def encode_klipper_thumbnails(icons: list[tuple[bytes, int]]) -> list[str]:
+    """
+    Encode the klipper thumbnails of a save
+    """
+    lines: list[str] = []
+    for rgba, size in icons:
+        lines += ThumbnailEncoder.encode_klipper_thumbnail(rgba, size, size, size * 4)
+    return lines
+
+
+def encode_col_pic(encode: Callable, pixels: array, width: int, height: int, colors_max: int = 1024) -> int:
+    """
+    Run a ColPic backend the same way the ColPic thumbnail encoder does
+    :param colors_max: Palette size (excess colors are merged, which remaps a copy of the pixels)
+    """
+    output_data: bytearray = bytearray(width * height * 10)
+    return encode(array("H", pixels), height, width, output_data, width * height * 10, colors_max)
+
+
+def benchmarks() -> Iterator[Benchmark]:
+    """
+    All benchmarks of the suite
+    """
+    # Every thumbnail of every layout (one benchmark per distinct encoding and size)
+    names: set[str] = set()
+    for layout, thumbnails in PrinterProfiles.layouts().items():
+        for encoding, width, height, img_type in thumbnails:
+            if encoding == "b64jpg" and QImage is None:
+                continue
+            for complexity in COMPLEXITIES:
+                name: str = f"thumbnail/{encoding}/{width}x{height}/{complexity}"
+                if name not in names:
+                    names.add(name)
+                    yield name, partial(encode_thumbnail, encoding, synthetic_image(width, height, complexity), width,
+                                        height, img_type)
+
+    # Klipper thumbnails
+    for complexity in COMPLEXITIES:
+        yield f"klipper/{complexity}", partial(encode_klipper_thumbnails, [
+            (synthetic_image(size, size, complexity), size) for size in KLIPPER_SIZES])
+
+    # ColPic backends on the largest thumbnail size
+    backends: dict[str, Callable] = {"python": lib_col_pic.ColPic_EncodeStr_Python}
+    if lib_col_pic_numpy is not None:
+        backends["numpy"] = lib_col_pic_numpy.ColPic_EncodeStr
+    if lib_col_pic.lib_col_pic_native is not None:
+        backends["native"] = lib_col_pic.lib_col_pic_native.ColPic_EncodeStr
+    for backend, encode in backends.items():
+        for complexity in COMPLEXITIES:
+            rgba: bytes = synthetic_image(COL_PIC_SIZE, COL_PIC_SIZE, complexity)
+            pixels: array = ThumbnailEncoder.rgba_to_rgb565(rgba, COL_PIC_SIZE, COL_PIC_SIZE, COL_PIC_SIZE * 4)
+            yield (f"col_pic/{backend}/{COL_PIC_SIZE}x{COL_PIC_SIZE}/{complexity}",
+                   partial(encode_col_pic, encode, pixels, COL_PIC_SIZE, COL_PIC_SIZE))
+            yield (f"col_pic/{backend}/{COL_PIC_SIZE}x{COL_PIC_SIZE}/{complexity}/{COL_PIC_REDUCED_COLORS}_colors",
+                   partial(encode_col_pic, encode, pixels, COL_PIC_SIZE, COL_PIC_SIZE, COL_PIC_REDUCED_COLORS))
+
+    # G-code handling of the save hook (on a 50k layer print)
+    layers: list[str] = [f";LAYER:{i}\nG1 X10 Y10 E0.1\n" for i in range(LAYERS)]
+    for flavor, header in HEADERS.items():
+        yield f"header_parse/{flavor}", partial(GCodeHeaderParser.parse, [header] + layers)
+    prefixes: list[str] = ["\r;gimage:" + "0" * 40_000 + "\r", "\r; thumbnail begin 300 300 1000\r; thumbnail end\r\r"]
+    segments: list[str] = prefixes + [HEADERS["elegoo"]] + layers
+    yield "gcode_splice", partial(GCodeSplicer.splice_prefixes, segments, prefixes, 3, [0, 1])
+
+
+def measure(function: Callable[[], Any], repeat: int) -> dict[str, Any]:
+    """
+    Time a benchmark, fast functions are run multiple times per measurement
+    :return: Best and mean seconds per call
+    """
+    first: float = timeit.timeit(function, number=1)
+    if first >= MIN_RUN_SECONDS:
+        # Slow benchmark, the first call already counts
+        number: int = 1
+        runs: list[float] = [first] + timeit.repeat(function, number=1, repeat=repeat - 1)
+    else:
+        number = max(1, int(MIN_RUN_SECONDS / max(first, 1e-7)))
+        runs = [run / number for run in timeit.repeat(function, number=number, repeat=repeat)]
+    return {"min_ms": min(runs) * 1e3, "mean_ms": sum(runs) / len(runs) * 1e3, "repeat": repeat, "number": number}
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """
+    Run the suite
+    :return: Exit code (1 if a benchmark regressed compared to the baseline)
+    """
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(prog="python -m benchmarks",
+                                                              description="Thumbnail encoding benchmark suite")
+    parser.add_argument("-o", "--output", help="Write the results to this JSON file")
+    parser.add_argument("-b", "--baseline", help="JSON results of an earlier run to compare to")
+    parser.add_argument("-t", "--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"Slowdown factor compared to the baseline that counts as regression "
+                             f"(default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("-r", "--repeat", type=int, default=DEFAULT_REPEAT,
+                        help=f"Measurements per benchmark (default: {DEFAULT_REPEAT})")
+    parser.add_argument("-f", "--filter", nargs="+", help="Only run benchmarks containing one of these strings")
+    args: argparse.Namespace = parser.parse_args(argv)
+
+    baseline: dict[str, dict[str, Any]] = {}
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            baseline = json.load(file)["results"]
+
+    results: dict[str, dict[str, Any]] = {}
+    regressions: list[str] = []
+    print(f"{'benchmark':<44}{'min ms':>12}{'mean ms':>12}{'baseline':>10}")
+    for name, function in benchmarks():
+        if args.filter and not any(part in name for part in args.filter):
+            continue
+        results[name] = measure(function=function, repeat=max(args.repeat, 1))
+        comparison: str = ""
+        if name in baseline:
+            ratio: float = results[name]["min_ms"] / baseline[name]["min_ms"]
+            comparison = f"{ratio:.2f}x"
+            if ratio > args.threshold:
+                regressions.append(name)
+                comparison += " !"
+        print(f"{name:<44}{results[name]['min_ms']:>12.3f}{results[name]['mean_ms']:>12.3f}{comparison:>10}",
+              flush=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump({
+                "meta": {
+                    "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "numpy": lib_col_pic_numpy is not None,
+                    "qt": QImage is not None
+                },
+                "results": results
+            }, file, indent=2)
+
+    if regressions:
+        print(f"{len(regressions)} regression(s) slower than {args.threshold}x the baseline: {', '.join(regressions)}",
+              file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+# Copyright (c) 2023 - 2024 Molodos
+# The ElegooNeptuneThumbnails plugin is released under the terms of the AGPLv3 or higher.
+
+"""
+Micro-benchmark for the line-chunked payload emitter, compares it to the previous string concatenation approach
+Run with: python -m benchmarks.chunk_writer_benchmark
+"""
+
+import random
+import string
+import timeit
+
+from tools.chunk_writer import ChunkWriter
+
+# Approximate base64 payload sizes of typical thumbnails
+PAYLOADS: dict[str, int] = {
+    "400x400 JPEG": 64_000,
+    "300x300 PNG": 120_000
+}
+SCALES: list[int] = [1, 2, 4, 8]
+ELEGOO_LINE_SIZE: int = 1024 - 8 - 1
+KLIPPER_LINE_SIZE: int = 78
+
+
+def concat_elegoo_lines(payload: str) -> str:
+    """
+    Previous per-character implementation of the elegoo line layout
+    """
+    result: str = ""
+    max_line: int = int(len(payload) / ELEGOO_LINE_SIZE)
+    for i in range(len(payload)):
+        if i == max_line * ELEGOO_LINE_SIZE:
+            result += "\r;;gimage:" + payload[i]
+        elif i == 0:
+            result += ";gimage:" + payload[i]
+        elif i % ELEGOO_LINE_SIZE == 0:
+            result += "\r;gimage:" + payload[i]
+        else:
+            result += payload[i]
+    return result
+
+
+def concat_klipper_lines(payload: str) -> str:
+    """
+    Previous re-slicing implementation of the klipper line layout
+    """
+    result: str = ""
+    while payload:
+        result += f"; {payload[0:KLIPPER_LINE_SIZE]}\r"
+        payload = payload[KLIPPER_LINE_SIZE:]
+    return result
+
+
+def writer_elegoo_lines(payload: str) -> str:
+    """
+    Elegoo line layout with the chunk writer
+    """
+    writer = ChunkWriter()
+    writer.write_chunked(payload, ELEGOO_LINE_SIZE, line_prefix="\r;gimage:")
+    return writer.getvalue()
+
+
+def writer_klipper_lines(payload: str) -> str:
+    """
+    Klipper line layout with the chunk writer
+    """
+    writer = ChunkWriter()
+    writer.write_chunked(payload, KLIPPER_LINE_SIZE, line_prefix="; ", line_suffix="\r")
+    return writer.getvalue()
+
+
+def time_per_kilo_char(function, payload: str) -> float:
+    """
+    Best of 5 runtime in microseconds per 1000 payload characters
+    """
+    runs: list[float] = timeit.repeat(lambda: function(payload), number=1, repeat=5)
+    return min(runs) * 1e6 / (len(payload) / 1000)
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    alphabet: str = string.ascii_letters + string.digits + "+/"
+    print(f"{'payload':<14}{'scale':>6}{'chars':>10}  {'method':<16}{'concat us/kc':>14}{'writer us/kc':>14}")
+    for name, size in PAYLOADS.items():
+        for scale in SCALES:
+            payload: str = "".join(random.choices(alphabet, k=size * scale))
+            for method, concat, writer in [("elegoo lines", concat_elegoo_lines, writer_elegoo_lines),
+                                           ("klipper lines", concat_klipper_lines, writer_klipper_lines)]:
+                print(f"{name:<14}{scale:>6}{len(payload):>10}  {method:<16}"
+                      f"{time_per_kilo_char(concat, payload):>14.1f}{time_per_kilo_char(writer, payload):>14.1f}")
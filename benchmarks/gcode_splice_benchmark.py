@@ -0,0 +1,53 @@
+# Copyright (c) 2023 - 2024 Molodos
+# The ElegooNeptuneThumbnails plugin is released under the terms of the AGPLv3 or higher.
+
+"""
+Benchmark for prepending thumbnails to a synthetic 50k layer G-code segment list
+Run with: python -m benchmarks.gcode_splice_benchmark
+"""
+
+import timeit
+
+from tools.gcode_splicer import GCodeSplicer
+
+LAYERS: int = 50_000
+HEADER: str = ";FLAVOR:Marlin\n;TIME:2432\n;Generated with Cura_SteamEngine 5.8.0\n"
+PREFIXES: list[str] = [";gimage:" + "0" * 40_000 + "\r", "; thumbnail begin 300 300 1000\r; thumbnail end\r\r"]
+
+
+def synthetic_gcode_dict() -> dict[int, list[str]]:
+    """
+    Build a G-code dict with old thumbnails, a header and one segment per layer
+    """
+    layers: list[str] = [f";LAYER:{i}\nG1 X10 Y10 E0.1\n" for i in range(LAYERS)]
+    return {0: PREFIXES + [HEADER] + layers}
+
+
+def rebuild(gcode_dict: dict[int, list[str]]) -> None:
+    """
+    Previous approach: delete old thumbnails, build a new list and concatenate all segments
+    """
+    segments: list[str] = gcode_dict[0]
+    for i in reversed([0, 1]):
+        del segments[i]
+    gcode_dict[0] = []
+    gcode_dict[0] += PREFIXES
+    gcode_dict[0] += segments
+
+
+def splice(gcode_dict: dict[int, list[str]]) -> None:
+    """
+    In-place splice of the header region
+    """
+    GCodeSplicer.splice_prefixes(segments=gcode_dict[0], prefixes=PREFIXES, header_length=3,
+                                 thumbnail_segments=[0, 1])
+
+
+if __name__ == "__main__":
+    for name, function in [("rebuild", rebuild), ("splice", splice)]:
+        gcode_dict: dict[int, list[str]] = synthetic_gcode_dict()
+        original: list[str] = gcode_dict[0]
+        runs: list[float] = timeit.repeat(lambda: function(gcode_dict), number=100, repeat=5)
+        assert gcode_dict[0][:3] == PREFIXES + [HEADER] and len(gcode_dict[0]) == LAYERS + 3
+        print(f"{name:<8} {min(runs) * 1e6 / 100:>10.1f} us per save  "
+              f"(same list object: {gcode_dict[0] is original})")
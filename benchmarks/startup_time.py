@@ -0,0 +1,122 @@
+# Copyright (c) 2023 - 2024 Molodos
+# The ElegooNeptuneThumbnails plugin is released under the terms of the AGPLv3 or higher.
+
+"""
+Startup cost of the plugin: imports the plugin package in fresh interpreters (with the Qt, Uranium and Cura modules it
+uses already imported, like in a running Cura) and reports the import time, the slowest imports and modules that
+should only be imported on first use (needs the cura and UM folders in the base directory, see the development guide)
+Run with: python -m benchmarks.startup_time [--repeat 5] [--path extra/sys/path]
+"""
+
+import argparse
+import importlib
+import importlib.util
+import json
+import statistics
+import subprocess
+import sys
+import time
+from os import path
+from typing import Any, Optional
+
+PLUGIN_DIR: str = path.abspath(path.join(path.dirname(path.realpath(__file__)), ".."))
+PACKAGE_NAME: str = "ElegooNeptuneThumbnails"
+DEFAULT_REPEAT: int = 5
+SLOWEST_COUNT: int = 10
+
+# Loaded by Cura before plugins are registered
+PRELOADED_MODULES: list[str] = ["numpy", "PyQt6.QtCore", "PyQt6.QtGui", "PyQt6.QtQuick", "UM.Application",
+                                "UM.Extension", "UM.Logger", "UM.Qt", "UM.Scene.Scene", "cura.CuraApplication",
+                                "cura.Settings.ExtruderStack", "cura.UI.PrintInformation"]
+
+# Only needed once the popup is opened or G-code is saved
+DEFERRED_MODULES: list[str] = ["requests", f"{PACKAGE_NAME}.tools.settings_translator",
+                               f"{PACKAGE_NAME}.tools.preview_image_provider",
+                               f"{PACKAGE_NAME}.tools.statistics_sender", f"{PACKAGE_NAME}.tools.thumbnail_generator",
+                               f"{PACKAGE_NAME}.tools.encoding_pipeline", f"{PACKAGE_NAME}.tools.encoders",
+                               f"{PACKAGE_NAME}.tools.lib_col_pic_native"]
+
+
+def measure_import(extra_paths: list[str]) -> dict[str, Any]:
+    """
+    Import the plugin package (runs in the child interpreter)
+    :return: Import time, modules imported by the plugin and deferred modules that were imported
+    """
+    sys.path[:0] = extra_paths + [PLUGIN_DIR]
+    for module_name in PRELOADED_MODULES:
+        importlib.import_module(module_name)
+    preloaded: set[str] = set(sys.modules)
+
+    # Import like Cura does (package named after the plugin folder)
+    start: float = time.perf_counter()
+    spec = importlib.util.spec_from_file_location(PACKAGE_NAME, path.join(PLUGIN_DIR, "__init__.py"),
+                                                  submodule_search_locations=[PLUGIN_DIR])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[PACKAGE_NAME] = module
+    spec.loader.exec_module(module)
+    duration: float = time.perf_counter() - start
+
+    imported: list[str] = [name for name in sys.modules if name not in preloaded]
+    return {"seconds": duration, "imported": imported,
+            "deferred_imported": [name for name in DEFERRED_MODULES if name in sys.modules]}
+
+
+def run_child(extra_paths: list[str]) -> tuple[dict[str, Any], list[tuple[int, str]]]:
+    """
+    Measure the import in a fresh interpreter
+    :return: Measurement and self import time (us) of every module imported by the plugin
+    """
+    process: subprocess.CompletedProcess = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "benchmarks.startup_time", "--child", "--path", *extra_paths],
+        cwd=PLUGIN_DIR, capture_output=True, text=True)
+    if process.returncode != 0:
+        raise RuntimeError(f"Importing the plugin failed:\n{process.stderr[-2000:]}")
+    result: dict[str, Any] = json.loads(process.stdout.strip().splitlines()[-1])
+
+    # Lines of -X importtime: "import time: self [us] | cumulative | imported package"
+    imported: set[str] = set(result["imported"])
+    self_times: list[tuple[int, str]] = []
+    for line in process.stderr.splitlines():
+        parts: list[str] = line.split("|")
+        if line.startswith("import time:") and len(parts) == 3 and parts[2].strip() in imported:
+            self_times.append((int(parts[0].split(":")[1]), parts[2].strip()))
+    return result, self_times
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """
+    Measure and report the startup cost
+    :return: Exit code (1 if modules that should be deferred are imported on startup)
+    """
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(prog="python -m benchmarks.startup_time",
+                                                              description="Plugin startup cost")
+    parser.add_argument("-r", "--repeat", type=int, default=DEFAULT_REPEAT, help="Fresh interpreters to measure")
+    parser.add_argument("-p", "--path", nargs="*", default=[], help="Extra import paths (e.g. Cura and Uranium)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args: argparse.Namespace = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(measure_import(args.path)))
+        return 0
+
+    durations: list[float] = []
+    result: dict[str, Any] = {}
+    self_times: list[tuple[int, str]] = []
+    for _ in range(args.repeat):
+        result, self_times = run_child(args.path)
+        durations.append(result["seconds"])
+
+    print(f"Plugin import: {statistics.median(durations) * 1e3:.1f} ms median, {min(durations) * 1e3:.1f} ms min "
+          f"({args.repeat} runs, {len(result['imported'])} modules imported)")
+    print("Slowest imports (self time of the last run):")
+    for self_time, module_name in sorted(self_times, reverse=True)[:SLOWEST_COUNT]:
+        print(f"  {self_time / 1e3:8.2f} ms  {module_name}")
+    if result["deferred_imported"]:
+        print(f"Imported on startup but only needed on first use: {', '.join(result['deferred_imported'])}")
+        return 1
+    print("No deferred modules imported on startup")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
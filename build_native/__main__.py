@@ -0,0 +1,81 @@
+# Copyright (c) 2023 - 2024 Molodos
+# The ElegooNeptuneThumbnails plugin is released under the terms of the AGPLv3 or higher.
+
+"""
+Build the native ColPic encoder from tools/native/col_pic.c into a shared library next to its source, the plugin uses it
+instead of the NumPy and pure Python encoders on the platform it was built for (needs a C compiler, e.g. gcc, clang or
+MSVC cl, recorded in a build manifest, python -m package_plugin only packages libraries listed there)
+Run with: python -m build_native [--compiler clang]
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from os import path
+from typing import Optional
+
+from .build_manifest import NATIVE_PATH, record_build
+
+SOURCE_PATH: str = path.join(NATIVE_PATH, "col_pic.c")
+LIBRARY_SUFFIX: str = ".dll" if sys.platform == "win32" else ".dylib" if sys.platform == "darwin" else ".so"
+LIBRARY_PATH: str = path.join(NATIVE_PATH, f"col_pic{LIBRARY_SUFFIX}")
+COMPILERS: list[str] = ["cc", "gcc", "clang", "cl"]
+
+
+def find_compiler() -> Optional[str]:
+    """
+    Find a C compiler (the CC environment variable is preferred)
+    """
+    for compiler in [os.environ.get("CC", "")] + COMPILERS:
+        if compiler and shutil.which(compiler):
+            return compiler
+    return None
+
+
+def compile_command(compiler: str) -> list[str]:
+    """
+    Command line that compiles the source into the shared library
+    """
+    if path.splitext(path.basename(compiler))[0].lower() == "cl":
+        return [compiler, "/nologo", "/O2", "/LD", SOURCE_PATH, f"/Fe{LIBRARY_PATH}"]
+    return [compiler, "-O2", "-std=c99", "-shared", "-fPIC", "-fvisibility=hidden", "-o", LIBRARY_PATH, SOURCE_PATH]
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """
+    Build and check the native encoder
+    :return: Exit code
+    """
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(prog="python -m build_native",
+                                                              description="Build the native ColPic encoder")
+    parser.add_argument("-c", "--compiler", help="C compiler to use (default: $CC, cc, gcc, clang or cl)")
+    args: argparse.Namespace = parser.parse_args(argv)
+
+    compiler: Optional[str] = args.compiler or find_compiler()
+    if compiler is None:
+        print("No C compiler found, set one with --compiler", file=sys.stderr)
+        return 1
+
+    # Intermediate files of the compiler end up in a temporary directory
+    command: list[str] = compile_command(compiler)
+    print(" ".join(command))
+    with tempfile.TemporaryDirectory() as build_dir:
+        if subprocess.run(command, cwd=build_dir).returncode != 0:
+            print("Compiling the native encoder failed", file=sys.stderr)
+            return 1
+
+    # Loading the encoder checks it against the pure Python one
+    from tools import lib_col_pic
+    if "native" not in lib_col_pic.AVAILABLE_BACKENDS:
+        print(f"Built {LIBRARY_PATH}, but it doesn't encode like the pure Python encoder", file=sys.stderr)
+        return 1
+    record_build(LIBRARY_PATH)
+    print(f"Built {LIBRARY_PATH} (ColPic backend: {lib_col_pic.BACKEND})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
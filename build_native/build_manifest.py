@@ -0,0 +1,50 @@
+# Copyright (c) 2023 - 2024 Molodos
+# The ElegooNeptuneThumbnails plugin is released under the terms of the AGPLv3 or higher.
+
+import hashlib
+import json
+import platform
+import sys
+from os import path
+
+NATIVE_PATH: str = path.abspath(path.join(path.dirname(path.realpath(__file__)), "..", "tools", "native"))
+MANIFEST_PATH: str = path.join(NATIVE_PATH, "build_manifest.json")
+
+
+def file_hash(file_path: str) -> str:
+    """
+    SHA-256 of a file (identifies the library that was built, so replaced libraries aren't packaged)
+    """
+    with open(file_path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def read_manifest() -> dict[str, dict[str, str]]:
+    """
+    Libraries built with python -m build_native by file name, with the platform and machine they were built for and
+    their hash (empty if nothing was built yet)
+    """
+    if not path.exists(MANIFEST_PATH):
+        return {}
+    with open(MANIFEST_PATH, "r") as file:
+        return json.load(file)
+
+
+def record_build(library_path: str) -> None:
+    """
+    Add a built library to the manifest (replaces an earlier build of the same file)
+    """
+    manifest: dict[str, dict[str, str]] = read_manifest()
+    manifest[path.basename(library_path)] = {"platform": sys.platform, "machine": platform.machine().lower(),
+                                             "sha256": file_hash(library_path)}
+    with open(MANIFEST_PATH, "w") as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+
+
+def built_libraries(platforms: list[str]) -> list[str]:
+    """
+    File names of the built libraries for the given platforms that are still the ones that were built
+    """
+    return sorted(name for name, build in read_manifest().items()
+                  if build["platform"] in platforms and path.exists(path.join(NATIVE_PATH, name))
+                  and file_hash(path.join(NATIVE_PATH, name)) == build["sha256"])
@@ -3,17 +3,21 @@
 
 import json
 from os import path
-from typing import Optional
+from typing import Iterator, Optional, TYPE_CHECKING, Union
 
 from UM.Application import Application
 from UM.Extension import Extension
 from UM.Logger import Logger
 from UM.Qt import Duration
+from UM.Scene.Iterator.DepthFirstIterator import DepthFirstIterator
 from UM.Scene.Scene import Scene
 from cura.CuraApplication import CuraApplication
 from cura.Settings.ExtruderStack import ExtruderStack
 from cura.UI.PrintInformation import PrintInformation
-from .tools import SettingsManager, StatisticsSender, GUIManager, SliceData, ThumbnailGenerator
+from .tools import Settings, SettingsManager, GUIManager, SaveProfiler, get_if_loaded
+
+if TYPE_CHECKING:
+    from .tools import SliceData
 
 
 class ElegooNeptune3Thumbnails(Extension):
@@ -39,8 +43,8 @@ class ElegooNeptune3Thumbnails(Extension):
         # Add a hook when the selected printer changes -> load settings
         Application.getInstance().globalContainerStackChanged.connect(self.printer_switched)
 
-        # Init popup on load to keep popup open time low
-        CuraApplication.getInstance().mainWindowChanged.connect(self._gui.init_gui)
+        # Stop the background workers on shutdown
+        Application.getInstance().applicationShuttingDown.connect(self.shutdown)
 
         # Get a scene handler for later usage
         self.scene: Scene = Application.getInstance().getController().getScene()
@@ -56,13 +60,41 @@ class ElegooNeptune3Thumbnails(Extension):
         """
         SettingsManager.load()
 
+    @classmethod
+    def shutdown(cls) -> None:
+        """
+        Hook triggered on Cura shutdown (only stops workers of modules that were loaded)
+        """
+        for name in ["EncodingPipeline", "StatisticsSender"]:
+            worker_class: Optional[type] = get_if_loaded(name)
+            if worker_class is not None:
+                worker_class.shutdown()
+
     def add_snapshot_to_gcode(self, output_device) -> None:
         """
         Hook triggered on G-code write to file
         """
+        # Time the stages of this save if enabled (logged when done)
+        SaveProfiler.start_save(enabled=SettingsManager.get_settings().timings_enabled)
+        try:
+            self._add_snapshot_to_gcode()
+        finally:
+            report: Optional[str] = SaveProfiler.finish_save()
+            if report:
+                Logger.log("i", f"Thumbnail timings: {report}")
+
+    def _add_snapshot_to_gcode(self) -> None:
+        """
+        Add the thumbnails to the G-code of the scene
+        """
+        # Imported on first save to keep the Cura startup fast
+        from .tools import StatisticsSender, SliceData, RenderContext, EncodingPipeline, GCodeHeaderParser, \
+            GCodeSplicer, PrefixCache, ThumbnailSegmentDetector
+
         # Send statistics if enabled
         if SettingsManager.get_settings().statistics_enabled:
-            StatisticsSender.send_statistics()
+            with SaveProfiler.stage("statistics"):
+                StatisticsSender.send_statistics()
 
         # Cancel if thumbnail is disabled
         if not SettingsManager.get_settings().thumbnails_enabled and not SettingsManager.get_settings().klipper_thumbnails_enabled:
@@ -76,81 +108,34 @@ class ElegooNeptune3Thumbnails(Extension):
         # Only get first build plate (spoiler: there is only one possible, multiple buildplates are deprecated)
         g_code_segments: list[str] = self.scene.gcode_dict[0]
 
-        # Flag for existing thumbnail
+        # Flag for existing thumbnail and amount of segments up to the end of the header
         thumbnail_segments: list[int] = []
+        header_length: int = 0
 
-        # Params G-code
-        g_code_params: dict[str, Optional[str]] = {}
-        """
-        Example for g_code_params:
-        {
-            'flavor': 'Marlin',
-            'time': '2432',
-            'filament_used': '2.02409m',
-            'layer_height': '0.2',
-            'minx': '86.84',
-            'miny': '101.226',
-            'minz': '0.2',
-            'maxx': '140.428',
-            'maxy': '130.771',
-            'maxz': '33',
-            'machine_name': 'ELEGOO NEPTUNE 4 Pro',
-        }
-        """
+        # Params G-code (only the ones needed for the thumbnail)
+        header_parser: GCodeHeaderParser = GCodeHeaderParser(params=["layer_height", "maxz"])
 
-        # Param mappings
-        param_mappings: dict[str, dict[str, str]] = {
-            "elegoo": {
-                "flavor": "flavor",
-                "time": "time",
-                "filament used": "filament_used",
-                "layer height": "layer_height",
-                "minx": "minx",
-                "miny": "miny",
-                "minz": "minz",
-                "maxx": "maxx",
-                "maxy": "maxy",
-                "maxz": "maxz",
-                "target_machine.name": "machine_name",
-            },
-            "ultimaker": {
-                "flavor": "flavor",
-                "print.time": "time",
-                "print.size.min.x": "minx",
-                "print.size.min.y": "miny",
-                "print.size.min.z": "minz",
-                "print.size.max.x": "maxx",
-                "print.size.max.y": "maxy",
-                "print.size.max.z": "maxz",
-                "target_machine.name": "machine_name",
-            }
-        }
+        # Thumbnails of previous saves (one segment per image)
+        thumbnail_detector: ThumbnailSegmentDetector = ThumbnailSegmentDetector(
+            thumbnails_enabled=SettingsManager.get_settings().thumbnails_enabled,
+            klipper_thumbnails_enabled=SettingsManager.get_settings().klipper_thumbnails_enabled)
 
         # Go through all G-code segments and extract information
-        for i, g_code in enumerate(g_code_segments):
-
-            # Go through segment lines and extract parameters from mapping
-            for line in g_code.splitlines():
-                for param_mapping in param_mappings.values():
-                    for key, mapping in param_mapping.items():
-                        prefix: str = f";{key}:"
-                        if line.lower().startswith(prefix):
-                            value: str = line[len(prefix):]
-                            g_code_params[mapping] = value
-
-            # Check if thumbnail is already present
-            if SettingsManager.get_settings().thumbnails_enabled and (";gimage:" in g_code or ";simage:" in g_code):
-                thumbnail_segments.append(i)
-            elif SettingsManager.get_settings().klipper_thumbnails_enabled and "; thumbnail begin " in g_code:
-                thumbnail_segments.append(i)
-
-            # Find end of head to break
-            if ";Generated with Cura_SteamEngine" in g_code:
-                break
-
-        # Remove thumbnail parts from gcode
-        for i in reversed(thumbnail_segments):
-            del g_code_segments[i]
+        with SaveProfiler.stage("header"):
+            for i, g_code in enumerate(g_code_segments):
+                header_length = i + 1
+
+                # Extract parameters until all are found
+                if not header_parser.done:
+                    header_parser.feed_segment(g_code)
+
+                # Check if thumbnail is already present
+                if thumbnail_detector.feed_segment(g_code):
+                    thumbnail_segments.append(i)
+
+                # Find end of head to break
+                if GCodeHeaderParser.HEADER_END in g_code:
+                    break
 
         # Get extruder line width
         extruders: list[ExtruderStack] = Application.getInstance().getGlobalContainerStack().extruderList
@@ -169,27 +154,72 @@ class ElegooNeptune3Thumbnails(Extension):
         # TODO: Find Model height and layer height independent of gcode (but not from settings because they could change between slice and save)
 
         # Create slice data object from g-code params and print information (prioritized)
-        slice_data: SliceData = SliceData(layer_height=float(g_code_params.get("layer_height", "-1.0")),
+        slice_data: SliceData = SliceData(layer_height=float(header_parser.params.get("layer_height", "-1.0")),
                                           time_seconds=print_time,
                                           filament_meters=material_length,
                                           filament_grams=material_weight,
-                                          model_height=float(g_code_params.get("maxz", "-1.0")),
+                                          model_height=float(header_parser.params.get("maxz", "-1.0")),
                                           filament_cost=material_cost,
                                           line_width=line_width,
                                           currency=currency)
 
-        # Clear gcode
-        self.scene.gcode_dict[0] = []
-
-        # Add thumbnail if enabled
-        if SettingsManager.get_settings().thumbnails_enabled:
-            thumbnail_prefix: str = ThumbnailGenerator.generate_gcode_prefix(slice_data=slice_data)
-            self.scene.gcode_dict[0].append(thumbnail_prefix)
-
-        # Add klipper thumbnails if enabled
-        if SettingsManager.get_settings().klipper_thumbnails_enabled:
-            klipper_thumbnail_prefix: str = ThumbnailGenerator.generate_klipper_thumbnail_gcode(slice_data=slice_data)
-            self.scene.gcode_dict[0].append(klipper_thumbnail_prefix)
-
-        # Add original gcode
-        self.scene.gcode_dict[0] += g_code_segments
+        # Reuse the thumbnails of a previous save if the scene, slice and settings didn't change
+        with SaveProfiler.stage("cache key"):
+            cache_key: str = PrefixCache.make_key(self._cache_key_parts(
+                segments=g_code_segments, header_length=header_length, thumbnail_segments=thumbnail_segments,
+                slice_data=slice_data))
+        thumbnail_prefixes: Optional[list[str]] = PrefixCache.get(cache_key)
+        if thumbnail_prefixes is not None:
+            Logger.log("d", "Reusing the thumbnails of a previous save")
+        else:
+            # Render the scene once for all thumbnails of this save and encode them in the background
+            render_context: RenderContext = RenderContext(slice_data=slice_data)
+            with SaveProfiler.stage("thumbnails"):
+                thumbnail_prefixes = EncodingPipeline.generate_prefixes(
+                    render_context=render_context,
+                    thumbnails_enabled=SettingsManager.get_settings().thumbnails_enabled,
+                    klipper_thumbnails_enabled=SettingsManager.get_settings().klipper_thumbnails_enabled,
+                    timeout=SettingsManager.get_settings().encoding_timeout)
+            # Failed encodings are not cached, so the next save tries again
+            if thumbnail_prefixes:
+                PrefixCache.put(cache_key, thumbnail_prefixes)
+
+        # Replace old thumbnails with the new ones in place (no thumbnails if encoding failed)
+        with SaveProfiler.stage("splice", size=sum(len(prefix) for prefix in thumbnail_prefixes)):
+            GCodeSplicer.splice_prefixes(segments=g_code_segments, prefixes=thumbnail_prefixes,
+                                         header_length=header_length, thumbnail_segments=thumbnail_segments)
+
+    def _cache_key_parts(self, segments: list[str], header_length: int, thumbnail_segments: list[int],
+                         slice_data: "SliceData") -> Iterator[Union[str, bytes]]:
+        """
+        Everything the thumbnails of a save are rendered from (scene, slice and settings)
+        :param segments: G-code segments of the slice
+        :param header_length: Amount of segments up to the end of the header
+        :param thumbnail_segments: Indices of existing thumbnail segments (ignored, they are replaced)
+        :param slice_data: Slice data shown on the thumbnails
+        """
+        # Settings
+        settings: Settings = SettingsManager.get_settings()
+        yield f"{settings.plugin_json['version']} {settings.get_printer_model_id()} {settings.get_corner_option_ids()}"
+        yield f"{settings.thumbnails_enabled} {settings.klipper_thumbnails_enabled}"
+
+        # Slice (identity of the segment list, Cura creates a new one for every slice and thumbnails are spliced in
+        # place, the header without thumbnails and the amount of segments)
+        yield str(id(segments))
+        yield repr(sorted(vars(slice_data).items()))
+        yield str(len(segments) - len(thumbnail_segments))
+        removed: set[int] = set(thumbnail_segments)
+        yield from (segment for i, segment in enumerate(segments[:header_length]) if i not in removed)
+
+        # Material colors the models are drawn in
+        extruders: list[ExtruderStack] = Application.getInstance().getGlobalContainerStack().extruderList
+        yield " ".join(str(extruder.material.getMetaDataEntry("color_code", "")) for extruder in extruders)
+
+        # Scene (identity, mesh and placement of all models in the snapshot)
+        for node in DepthFirstIterator(self.scene.getRoot()):
+            if not node.callDecoration("isSliceable") or not node.isVisible():
+                continue
+            mesh_data = node.getMeshData()
+            yield (f"{id(node)} {id(mesh_data)} {mesh_data.getVertexCount() if mesh_data else 0} "
+                   f"{node.callDecoration('getActiveExtruderPosition')}")
+            yield node.getWorldTransformation().getData().tobytes()
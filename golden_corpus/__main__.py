@@ -0,0 +1,232 @@
+# Copyright (c) 2023 - 2024 Molodos
+# The ElegooNeptuneThumbnails plugin is released under the terms of the AGPLv3 or higher.
+
+"""
+Golden output corpus for the ColPic format: checks every ColPic backend for byte equality with the reference outputs
+and round trips all outputs through the pure Python decoder
+Run with: python -m golden_corpus [--backend python numpy] (--regenerate rebuilds the corpus, needs PyQt6)
+"""
+
+import argparse
+import base64
+import gzip
+import json
+import random
+import sys
+import time
+from array import array
+from os import path
+from typing import Any, Callable, Iterator, Optional
+
+from tools import lib_col_pic
+from tools.encoders import ThumbnailEncoder
+from tools.printer_profiles import PrinterProfiles
+from .col_pic_decoder import ColPicDecoder
+
+try:
+    from tools import lib_col_pic_numpy
+except ImportError:
+    # NumPy is optional, its ColPic encoder is skipped without it
+    lib_col_pic_numpy = None
+
+CORPUS_PATH: str = path.join(path.dirname(path.realpath(__file__)), "col_pic_corpus.json.gz")
+IMG_PATH: str = path.join(path.dirname(path.realpath(__file__)), "..", "img")
+COL_PIC_LAYOUTS: dict[str, str] = {"colpic": "bg_new.png", "artillery": "bg_artillery.png"}
+COLORS_MAX: int = 1024
+
+
+def backends() -> dict[str, Callable]:
+    """
+    Available ColPic_EncodeStr implementations (the pure Python one is the reference)
+    """
+    available: dict[str, Callable] = {"python": lib_col_pic.ColPic_EncodeStr_Python}
+    if lib_col_pic_numpy is not None:
+        available["numpy"] = lib_col_pic_numpy.ColPic_EncodeStr
+    if lib_col_pic.lib_col_pic_native is not None:
+        available["native"] = lib_col_pic.lib_col_pic_native.ColPic_EncodeStr
+    return available
+
+
+def encode(backend: Callable, pixels: array, width: int, height: int) -> str:
+    """
+    Encode pixels the same way ThumbnailEncoder.encode_col_pic_thumbnail does (including the buffer size and the
+    swapped width and height, which the header stores as given)
+    :return: Encoded string, checked to be followed by zeros only
+    """
+    output_data: bytearray = bytearray(width * height * 10)
+    length: int = int(backend(array('H', pixels), height, width, output_data, width * height * 10, COLORS_MAX))
+    if output_data.find(b"\x00") != length or output_data.rstrip(b"\x00") != output_data[:length]:
+        raise ValueError(f"Return value {length} doesn't match the encoded data")
+    return output_data[:length].decode("latin-1")
+
+
+def check_round_trip(encoded: str, pixels: array, width: int, height: int) -> None:
+    """
+    Decode an output and compare it to the input: colors in the palette are exact, colors that didn't make it into the
+    palette (more than 1024 colors) are encoded as the first palette color
+    """
+    decoded_width, decoded_height, palette, decoded = ColPicDecoder.decode_str(encoded)
+    if (decoded_width, decoded_height) != (height, width):
+        raise ValueError(f"Decoded size {decoded_width}x{decoded_height} doesn't match")
+    colors: set[int] = set(palette)
+    for i, (pixel, decoded_pixel) in enumerate(zip(pixels, decoded)):
+        if decoded_pixel != (pixel if pixel in colors else palette[0]):
+            raise ValueError(f"Pixel {i} decoded to {decoded_pixel:#06x} instead of {pixel:#06x}")
+
+
+def load_corpus() -> list[dict[str, Any]]:
+    """
+    Load the corpus cases (pixels are decoded to arrays)
+    """
+    with gzip.open(CORPUS_PATH, "rt", encoding="utf-8") as file:
+        cases: list[dict[str, Any]] = json.load(file)["cases"]
+    for case in cases:
+        pixels: array = array('H')
+        pixels.frombytes(base64.b64decode(case["pixels"]))
+        if sys.byteorder != "little":
+            pixels.byteswap()
+        case["pixels"] = pixels
+    return cases
+
+
+def verify(selected_backends: dict[str, Callable], name_filter: Optional[list[str]]) -> int:
+    """
+    Verify all backends against the corpus
+    :return: Amount of failures
+    """
+    failures: int = 0
+    for case in load_corpus():
+        if name_filter and not any(part in case["name"] for part in name_filter):
+            continue
+        results: list[str] = []
+        try:
+            check_round_trip(case["encoded"], case["pixels"], case["width"], case["height"])
+            results.append("decode ok")
+        except ValueError as e:
+            failures += 1
+            results.append(f"decode FAILED ({e})")
+        for backend_name, backend in selected_backends.items():
+            start: float = time.perf_counter()
+            try:
+                encoded: str = encode(backend, case["pixels"], case["width"], case["height"])
+                equal: bool = encoded == case["encoded"]
+            except Exception as e:
+                encoded, equal = f"{type(e).__name__}: {e}", False
+            duration: float = time.perf_counter() - start
+            if not equal:
+                failures += 1
+            results.append(f"{backend_name} {'ok' if equal else 'MISMATCH'} ({duration * 1e3:.1f} ms)")
+
+        # The G-code layer has to reproduce the same payload
+        if case.get("img_type"):
+            pixels: array = case["pixels"]
+            rgba: bytes = bytes(value for pixel in pixels for value in
+                                ((pixel >> 11) << 3, ((pixel >> 5) & 63) << 2, (pixel & 31) << 3, 255))
+            gcode: str = "".join(ThumbnailEncoder.encode_col_pic_thumbnail(rgba, case["width"], case["height"],
+                                                                            case["width"] * 4, case["img_type"]))
+            if ColPicDecoder.extract_payload(gcode, case["img_type"]) != case["encoded"]:
+                failures += 1
+                results.append("gcode MISMATCH")
+            else:
+                results.append("gcode ok")
+        print(f"{case['name']:<32} {', '.join(results)}", flush=True)
+    return failures
+
+
+def corpus_inputs() -> Iterator[tuple[str, int, int, array, Optional[str]]]:
+    """
+    Reference inputs: the preview thumbnail of every ColPic layout size and synthetic edge cases
+    :return: Name, width, height, RGB565 pixels and image type (for cases also checked on G-code level)
+    """
+    from PyQt6.QtCore import Qt
+    from PyQt6.QtGui import QImage, QPainter
+
+    # Preview thumbnails (background and benchy, composed like the thumbnail generator does)
+    for layout, background_file in COL_PIC_LAYOUTS.items():
+        thumbnail: QImage = QImage(900, 900, QImage.Format.Format_RGBA8888)
+        thumbnail.fill(Qt.GlobalColor.transparent)
+        painter: QPainter = QPainter(thumbnail)
+        painter.drawImage(0, 0, QImage(path.join(IMG_PATH, background_file)))
+        painter.drawImage(150, 160, QImage(path.join(IMG_PATH, "benchy.png")))
+        painter.end()
+        for _, width, height, img_type in PrinterProfiles.layouts()[layout]:
+            scaled: QImage = thumbnail.scaled(width, height, Qt.AspectRatioMode.KeepAspectRatio)
+            scaled = scaled.convertToFormat(QImage.Format.Format_RGBA8888)
+            bits = scaled.constBits()
+            bits.setsize(scaled.sizeInBytes())
+            pixels: array = ThumbnailEncoder.rgba_to_rgb565(bits.asstring(), scaled.width(), scaled.height(),
+                                                            scaled.bytesPerLine())
+            yield f"{layout}_{img_type.strip(';')}_{width}x{height}", scaled.width(), scaled.height(), pixels, img_type
+
+    # Synthetic edge cases
+    rnd: random.Random = random.Random(13)
+    yield "flat_200x200", 200, 200, array('H', [0x3212]) * 40_000, "gimage"
+    yield "small_4x4", 4, 4, array('H', [0xffff, 0x0000] * 8), None
+    yield "odd_size_3x7", 3, 7, array('H', [rnd.choice([1, 2, 3, 0xf800, 0x07e0]) for _ in range(21)]), None
+    runs: list[int] = [1, 2, 5, 6, 7, 8, 254, 255, 256, 300, 511, 512]
+    yield (f"runs_{sum(runs)}x1", sum(runs), 1,
+           array('H', [pixel for i, run in enumerate(runs) for pixel in [0x1234 + i % 2] * run]), None)
+    yield ("palette_ties_8x8", 8, 8,
+           array('H', [[0x0001, 0x0002, 0x0003, 0x0004][(x + y) % 4] for y in range(8) for x in range(8)]), None)
+    yield ("palette_pages_40x25", 40, 25, array('H', [x * 1601 for y in range(25) for x in range(40)]), None)
+    yield "palette_1024_32x32", 32, 32, array('H', [i * 61 for i in range(1024)]), None
+    yield "palette_1025_41x25", 41, 25, array('H', [i * 61 for i in range(1025)]), None
+    yield ("gradient_64x64", 64, 64,
+           array('H', [((x >> 1) << 11) | (y << 5) | ((x & 1) * 31) for y in range(64) for x in range(64)]), None)
+    yield "photo_noise_96x96", 96, 96, array('H', [photo_pixel(rnd, x, y) for y in range(96) for x in range(96)]), None
+    yield "noise_48x48", 48, 48, array('H', [rnd.randrange(65536) for _ in range(48 * 48)]), None
+
+
+def photo_pixel(rnd: random.Random, x: int, y: int) -> int:
+    """
+    Pixel of a gradient with sensor like noise (many similar colors, few runs)
+    """
+    red: int = min(31, max(0, (x >> 2) + rnd.randrange(-2, 3)))
+    green: int = min(63, max(0, (y >> 1) + rnd.randrange(-3, 4)))
+    return (red << 11) | (green << 5) | rnd.randrange(8)
+
+
+def regenerate() -> None:
+    """
+    Rebuild the corpus with the reference (pure Python) encoder
+    """
+    cases: list[dict[str, Any]] = []
+    for name, width, height, pixels, img_type in corpus_inputs():
+        encoded: str = encode(lib_col_pic.ColPic_EncodeStr_Python, pixels, width, height)
+        check_round_trip(encoded, pixels, width, height)
+        little_endian: array = array('H', pixels)
+        if sys.byteorder != "little":
+            little_endian.byteswap()
+        cases.append({"name": name, "width": width, "height": height, "img_type": img_type,
+                      "pixels": base64.b64encode(little_endian.tobytes()).decode("ascii"), "encoded": encoded})
+        print(f"{name:<32} {len(set(pixels)):>6} colors {len(encoded):>8} chars", flush=True)
+    with gzip.GzipFile(CORPUS_PATH, "wb", mtime=0) as file:
+        file.write(json.dumps({"cases": cases}, indent=1).encode("utf-8"))
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """
+    Verify or regenerate the corpus
+    :return: Exit code
+    """
+    available: dict[str, Callable] = backends()
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(prog="python -m golden_corpus",
+                                                              description="ColPic golden output corpus")
+    parser.add_argument("-b", "--backend", nargs="+", choices=list(available.keys()),
+                        default=list(available.keys()), help="ColPic backends to check (default: all available)")
+    parser.add_argument("-f", "--filter", nargs="+", help="Only check cases containing one of these strings")
+    parser.add_argument("--regenerate", action="store_true",
+                        help="Rebuild the corpus from the pure Python reference encoder (only if the format changes)")
+    args: argparse.Namespace = parser.parse_args(argv)
+
+    if args.regenerate:
+        regenerate()
+        return 0
+    failures: int = verify(selected_backends={name: available[name] for name in args.backend},
+                           name_filter=args.filter)
+    print(f"{failures} failure(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+# Copyright (c) 2023 - 2024 Molodos
+# The ElegooNeptuneThumbnails plugin is released under the terms of the AGPLv3 or higher.
+
+import struct
+import sys
+from array import array
+
+
+class ColPicDecoder:
+    """
+    Pure Python decoder for the ColPic thumbnail format (the inverse of lib_col_pic.ColPic_EncodeStr)
+
+    Binary layout: a 32 byte header (version 3, width, height, mark, palette size and color data size as little endian
+    uint32 at offsets 0, 4, 8, 12, 16 and 20), the RGB565 palette (little endian uint16) and the color data. Every color
+    data byte holds a 3 bit code and a 5 bit palette index: code 7 selects the palette page (32 colors each), codes 1-6
+    are runs of that length and code 0 is followed by a byte with the run length. The binary data is then written as
+    string with 6 bits per char (offset by 48, "\\" is replaced by "~").
+    """
+
+    HEADER_SIZE: int = 32
+    VERSION: int = 3
+    MARK: int = 98419516
+    CHAR_OFFSET: int = 48
+    ESCAPED_CHAR: int = ord("~")
+    ESCAPE_REPLACEMENT: int = ord("\\")
+    PAGE_SIZE: int = 32
+    PAGE_CODE: int = 7
+
+    @classmethod
+    def decode_str(cls, encoded: str) -> tuple[int, int, array, array]:
+        """
+        Decode a ColPic string
+        :param encoded: Encoded string (without G-code line prefixes)
+        :return: Width, height, palette and pixels (RGB565 row by row)
+        """
+        return cls.decode_binary(cls.unpack_chars(encoded))
+
+    @classmethod
+    def unpack_chars(cls, encoded: str) -> bytes:
+        """
+        Convert a ColPic string back to binary data (4 chars of 6 bits to 3 bytes)
+        """
+        if len(encoded) % 4:
+            raise ValueError(f"Encoded length {len(encoded)} is not a multiple of 4")
+        values: list[int] = []
+        for char in encoded.encode("latin-1"):
+            value: int = (cls.ESCAPE_REPLACEMENT if char == cls.ESCAPED_CHAR else char) - cls.CHAR_OFFSET
+            if not 0 <= value < 64:
+                raise ValueError(f"Invalid char {chr(char)!r}")
+            values.append(value)
+        data: bytearray = bytearray()
+        for i in range(0, len(values), 4):
+            group: int = (values[i] << 18) | (values[i + 1] << 12) | (values[i + 2] << 6) | values[i + 3]
+            data += group.to_bytes(3, "big")
+        return bytes(data)
+
+    @classmethod
+    def decode_binary(cls, data: bytes) -> tuple[int, int, array, array]:
+        """
+        Decode binary ColPic data (trailing padding is ignored)
+        :return: Width, height, palette and pixels (RGB565 row by row)
+        """
+        if len(data) < cls.HEADER_SIZE:
+            raise ValueError("Data is shorter than the header")
+        width, height, mark, palette_size, color_data_size = struct.unpack_from("<IIIII", data, 4)
+        if data[0] != cls.VERSION or mark != cls.MARK:
+            raise ValueError(f"Invalid header (version {data[0]}, mark {mark})")
+        color_data_start: int = cls.HEADER_SIZE + palette_size
+        if len(data) < color_data_start + color_data_size:
+            raise ValueError("Data is shorter than the header states")
+
+        palette: array = array('H')
+        palette.frombytes(data[cls.HEADER_SIZE:color_data_start])
+        if sys.byteorder != "little":
+            palette.byteswap()
+
+        pixels: array = array('H')
+        color_data: bytes = data[color_data_start:color_data_start + color_data_size]
+        page: int = 0
+        i: int = 0
+        while i < len(color_data):
+            code: int = color_data[i] >> 5
+            index: int = color_data[i] & 31
+            if code == cls.PAGE_CODE:
+                page = index
+                i += 1
+                continue
+            if code == 0:
+                if i + 1 >= len(color_data):
+                    raise ValueError("Run length byte is missing")
+                run: int = color_data[i + 1]
+                i += 2
+            else:
+                run = code
+                i += 1
+            index += page * cls.PAGE_SIZE
+            if index >= len(palette):
+                raise ValueError(f"Palette index {index} is out of range ({len(palette)} colors)")
+            pixels.extend(array('H', [palette[index]]) * run)
+
+        if len(pixels) != width * height:
+            raise ValueError(f"Decoded {len(pixels)} pixels, expected {width * height}")
+        return width, height, palette, pixels
+
+    @classmethod
+    def extract_payload(cls, gcode: str, img_type: str) -> str:
+        """
+        Extract the encoded string of a ColPic thumbnail from G-code lines
+        :param gcode: G-code (or prefix) containing the thumbnail
+        :param img_type: Image type of the thumbnail (without leading semicolon and colon)
+        :return: Encoded string
+        """
+        prefixes: tuple[str, str] = (f";{img_type}:", f";;{img_type}:")
+        chunks: list[str] = []
+        for line in gcode.replace("\r\n", "\n").replace("\r", "\n").split("\n"):
+            for prefix in prefixes:
+                if line.startswith(prefix):
+                    chunks.append(line[len(prefix):])
+                    break
+        if not chunks:
+            raise ValueError(f"No {img_type} thumbnail found")
+        return "".join(chunks)
@@ -5,13 +5,30 @@ import os
 import shutil
 from zipfile import ZipFile
 
+from build_native.build_manifest import built_libraries
+from tools.printer_profiles import PrinterProfiles
+
 PACKAGE_PATH: str = os.path.dirname(os.path.realpath(__file__))
 
 PLUGIN_FILES: list[str] = ["__init__.py", "elegoo_neptune_thumbnails.py", "LICENSE", "plugin.json", "README.md",
-                           "changelog.txt", "img/benchy.png", "img/cross.png", "img/bg_old.png", "img/bg_new.png",
+                           "changelog.txt", "printer_profiles.json", "img/benchy.png", "img/cross.png",
                            "tools/__init__.py", "tools/settings.py", "tools/thumbnail_generator.py", "tools/gui.qml",
                            "tools/gui.py", "tools/statistics_sender.py", "tools/lib_col_pic.py",
-                           "img/sponsor_elegoo.png", "img/bg_artillery.png", "img/bg_orangestorm.png"]
+                           "tools/lib_col_pic_numpy.py", "tools/chunk_writer.py", "tools/image_cache.py",
+                           "tools/encoding_pipeline.py", "tools/encoders.py", "tools/parallel_encoder.py",
+                           "tools/gcode_header.py", "tools/gcode_splicer.py", "tools/save_profiler.py",
+                           "tools/settings_translator.py", "tools/printer_profiles.py",
+                           "tools/preview_image_provider.py", "tools/prefix_cache.py", "tools/lib_col_pic_native.py",
+                           "img/sponsor_elegoo.png"]
+
+# Backgrounds of all printers
+PLUGIN_FILES += sorted({f"img/{profile.background}" for profile in PrinterProfiles.profiles()})
+
+# Native ColPic encoders built with python -m build_native for the target platforms (optional, other platforms use the
+# Python encoders), libraries that aren't in the build manifest or were replaced since are left out
+NATIVE_TARGETS: list[str] = ["linux", "darwin", "win32"]
+NATIVE_LIBRARIES: list[str] = built_libraries(NATIVE_TARGETS)
+PLUGIN_FILES += [f"tools/native/{name}" for name in NATIVE_LIBRARIES]
 
 BUILD_NAME = os.path.join(PACKAGE_PATH, "ElegooNeptuneThumbnails.curapackage")
 PLUGIN_BUILD_NAME = os.path.join(PACKAGE_PATH, "ElegooNeptuneThumbnails.zip")
@@ -23,6 +40,8 @@ if __name__ == "__main__":
     Package the plugin
     """
 
+    print(f"Native ColPic encoders: {', '.join(NATIVE_LIBRARIES) or 'none'}")
+
     # Clear old builds
     if os.path.exists(BUILD_NAME):
         os.remove(BUILD_NAME)
@@ -0,0 +1,267 @@
+# Copyright (c) 2023 - 2024 Molodos
+# The ElegooNeptuneThumbnails plugin is released under the terms of the AGPLv3 or higher.
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from typing import Iterator, Optional
+
+from tools.encoders import ThumbnailEncoder
+from tools.gcode_header import GCodeHeaderParser
+from tools.gcode_splicer import ThumbnailSegmentDetector
+from tools.printer_profiles import PrinterProfile, PrinterProfiles
+
+PLUGIN_JSON_PATH: str = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "plugin.json")
+
+COPY_BUFFER_SIZE: int = 1024 * 1024
+# Lines (without thumbnails) searched for the end of the header, the rest of files without Cura header is copied as is
+MAX_HEADER_LINES: int = 200
+
+# G-code prefix of the current worker (set once per process instead of sending it with every file)
+_prefix: str = ""
+
+
+def build_prefix(image_path: str, layout: str, klipper_thumbnails: bool) -> str:
+    """
+    Encode a preview image to the G-code prefix with all thumbnails
+    :param image_path: Path of the preview image (scaled to the thumbnail sizes, keeping the aspect ratio)
+    :param layout: Thumbnail layout of the printer (name of a layout in printer_profiles.json or "none")
+    :param klipper_thumbnails: Whether to add klipper thumbnails
+    :return: The G-code prefix
+    """
+    from PyQt6.QtCore import Qt, QByteArray, QBuffer, QIODeviceBase
+    from PyQt6.QtGui import QImage
+
+    image: QImage = QImage(image_path)
+    if image.isNull():
+        raise ValueError(f"Can't read image {image_path}")
+
+    lines: list[str] = []
+    if layout != "none":
+        for encoding, width, height, img_type in PrinterProfiles.layouts()[layout]:
+            scaled: QImage = image.scaled(width, height, Qt.AspectRatioMode.KeepAspectRatio)
+            if encoding == "b64jpg":
+                byte_array: QByteArray = QByteArray()
+                byte_buffer: QBuffer = QBuffer(byte_array)
+                byte_buffer.open(QIODeviceBase.OpenModeFlag.WriteOnly)
+                scaled.save(byte_buffer, "JPEG")
+                lines += ThumbnailEncoder.encode_b64jpg_thumbnail(byte_array.data(), img_type)
+            elif encoding == "old":
+                lines += ThumbnailEncoder.encode_old_thumbnail(*_rgba_buffer(scaled), img_type)
+            else:
+                lines += ThumbnailEncoder.encode_col_pic_thumbnail(*_rgba_buffer(scaled), img_type)
+        with open(PLUGIN_JSON_PATH, "r", encoding="utf-8") as file:
+            plugin_json: dict = json.load(file)
+        lines += ThumbnailEncoder.encode_footer(plugin_json["name"], plugin_json["version"])
+
+    if klipper_thumbnails:
+        lines.append("\r")
+        for size in [32, 300]:
+            icon: QImage = image.scaled(size, size, Qt.AspectRatioMode.KeepAspectRatio,
+                                        Qt.TransformationMode.SmoothTransformation)
+            lines += ThumbnailEncoder.encode_klipper_thumbnail(*_rgba_buffer(icon))
+    return "".join(lines)
+
+
+def _rgba_buffer(image) -> tuple[bytes, int, int, int]:
+    """
+    Get the raw RGBA8888 pixels of a QImage
+    :return: Pixels, width, height and bytes per pixel row
+    """
+    from PyQt6.QtGui import QImage
+
+    rgba_image: QImage = image.convertToFormat(QImage.Format.Format_RGBA8888)
+    bits = rgba_image.constBits()
+    bits.setsize(rgba_image.sizeInBytes())
+    return bits.asstring(), rgba_image.width(), rgba_image.height(), rgba_image.bytesPerLine()
+
+
+def collect_files(paths: list[str], output_dir: Optional[str]) -> list[tuple[str, str]]:
+    """
+    Find the G-code files to process
+    :param paths: G-code files or directories (searched recursively)
+    :param output_dir: Directory to write to (keeps the structure of searched directories), None to edit in place
+    :return: Source and target path of every file
+    """
+    files: list[tuple[str, str]] = []
+    for file_path in paths:
+        if os.path.isdir(file_path):
+            for root, directories, names in os.walk(file_path):
+                directories.sort()
+                for name in sorted(names):
+                    if name.lower().endswith(".gcode"):
+                        source: str = os.path.join(root, name)
+                        files.append((source, os.path.join(output_dir, os.path.relpath(source, file_path))
+                                      if output_dir else source))
+        else:
+            files.append((file_path, os.path.join(output_dir, os.path.basename(file_path))
+                          if output_dir else file_path))
+    return files
+
+
+def _init_worker(prefix: str) -> None:
+    """
+    Set the G-code prefix of the current process
+    """
+    global _prefix
+    _prefix = prefix
+
+
+def process_file(source: str, target: str) -> tuple[Optional[str], bool]:
+    """
+    Replace the thumbnails of a G-code file, streaming it line by line up to the end of the header and in blocks
+    afterward (the result is written to a temporary file and moved to the target at the end)
+    :param source: G-code file to read
+    :param target: Path to write the G-code with thumbnails to (can be the source)
+    :return: Machine name from the G-code header (if found) and whether existing thumbnails were removed
+    """
+    header_parser: GCodeHeaderParser = GCodeHeaderParser(params=["machine_name"])
+    directory: str = os.path.dirname(os.path.abspath(target))
+    os.makedirs(directory, exist_ok=True)
+    file_descriptor, temp_path = tempfile.mkstemp(suffix=".tmp", dir=directory)
+    try:
+        # Newlines are kept as they are, undecodable bytes are passed through
+        with open(source, "r", encoding="utf-8", errors="surrogateescape", newline="") as source_file, \
+                open(file_descriptor, "w", encoding="utf-8", errors="surrogateescape", newline="") as target_file:
+            target_file.write(_prefix)
+            # Existing thumbnails of any printer in printer_profiles.json are replaced (same detection as on save)
+            thumbnail_detector: ThumbnailSegmentDetector = ThumbnailSegmentDetector(
+                thumbnails_enabled=True, klipper_thumbnails_enabled=True)
+            # Empty lines are only dropped next to thumbnails, so they are held back until the next line is known
+            blank_lines: list[str] = []
+            after_thumbnail: bool = False
+            removed: bool = False
+            header_lines: int = 0
+            for line in source_file:
+                header_parser.feed_line(line)
+                if _is_blank_line(line):
+                    if not after_thumbnail:
+                        blank_lines.append(line)
+                elif thumbnail_detector.feed_segment(line):
+                    blank_lines.clear()
+                    after_thumbnail = True
+                    removed = True
+                else:
+                    target_file.writelines(blank_lines)
+                    blank_lines.clear()
+                    target_file.write(line)
+                    after_thumbnail = False
+                    header_lines += 1
+                if header_parser.header_end_found or header_lines >= MAX_HEADER_LINES:
+                    break
+            target_file.writelines(blank_lines)
+            shutil.copyfileobj(source_file, target_file, COPY_BUFFER_SIZE)
+        shutil.copymode(source, temp_path)
+        os.replace(temp_path, target)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return header_parser.params.get("machine_name", "").strip() or None, removed
+
+
+def describe_result(added: bool, removed: bool) -> str:
+    """
+    Describe what happened to the thumbnails of a file
+    :param added: Whether new thumbnails were written
+    :param removed: Whether existing thumbnails were removed
+    """
+    if added:
+        return "thumbnails replaced" if removed else "thumbnails added"
+    return "thumbnails removed" if removed else "no thumbnails to remove"
+
+
+def _is_blank_line(line: str) -> bool:
+    """
+    Check if a header line is empty
+    """
+    return not line.rstrip("\r\n")
+
+
+def run(files: list[tuple[str, str]], prefix: str,
+        jobs: int) -> Iterator[tuple[str, Optional[tuple[Optional[str], bool]], Optional[Exception]]]:
+    """
+    Process files, in worker processes if there are several
+    :param files: Source and target path of every file
+    :param prefix: G-code prefix with all thumbnails
+    :param jobs: Maximum amount of worker processes
+    :return: Source path, result of process_file (None if failed) and error of every file (in order of completion)
+    """
+    if jobs < 2 or len(files) < 2:
+        _init_worker(prefix)
+        for source, target in files:
+            try:
+                yield source, process_file(source, target), None
+            except Exception as e:
+                yield source, None, e
+        return
+
+    with ProcessPoolExecutor(max_workers=min(jobs, len(files)), initializer=_init_worker,
+                             initargs=(prefix,)) as executor:
+        futures: dict[Future, str] = {executor.submit(process_file, source, target): source
+                                      for source, target in files}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as e:
+                yield futures[future], None, e
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """
+    Add thumbnails to existing G-code files
+    :return: Exit code
+    """
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        prog="python -m post_processor",
+        description="Add thumbnails of a preview image to existing G-code files (replaces existing thumbnails)")
+    parser.add_argument("paths", nargs="+", help="G-code files or directories (searched recursively for .gcode files)")
+    parser.add_argument("-i", "--image", required=True, help="Preview image (ideally square, e.g. a 900x900 png)")
+    layout_printers: str = ", ".join(
+        f"{layout} ({', '.join(profile.name for profile in PrinterProfiles.profiles() if profile.layout == layout)})"
+        for layout in PrinterProfiles.layouts().keys())
+    parser.add_argument("-l", "--layout", choices=list(PrinterProfiles.layouts().keys()) + ["none"],
+                        default="colpic", help=f"Printer thumbnail layout: {layout_printers} or none (default: colpic)")
+    parser.add_argument("-p", "--printer",
+                        help="Printer model to select the layout by instead (e.g. elegoo_neptune_4_pro or "
+                             "\"Elegoo Neptune 4 Pro\")")
+    parser.add_argument("--no-klipper", action="store_true", help="Don't add klipper thumbnails")
+    parser.add_argument("-o", "--output-dir", help="Write the files to this directory instead of editing in place")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Maximum amount of files processed in parallel (default: CPU count)")
+    args: argparse.Namespace = parser.parse_args(argv)
+    if args.printer:
+        profile: Optional[PrinterProfile] = PrinterProfiles.find(args.printer)
+        if profile is None:
+            parser.error(f"Unsupported printer {args.printer!r}, supported: "
+                         f"{', '.join(supported.profile_id for supported in PrinterProfiles.profiles())}")
+        args.layout = profile.layout
+
+    files: list[tuple[str, str]] = collect_files(paths=args.paths, output_dir=args.output_dir)
+    if not files:
+        print("No G-code files found", file=sys.stderr)
+        return 1
+    try:
+        prefix: str = build_prefix(image_path=args.image, layout=args.layout, klipper_thumbnails=not args.no_klipper)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    failed: int = 0
+    for source, result, error in run(files=files, prefix=prefix, jobs=args.jobs):
+        if error is not None:
+            failed += 1
+            print(f"{source}: failed ({error})", file=sys.stderr)
+        else:
+            machine_name, removed = result
+            print(f"{source}: {describe_result(added=bool(prefix), removed=removed)}"
+                  + (f" ({machine_name})" if machine_name else ""))
+    print(f"Processed {len(files) - failed} of {len(files)} files")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
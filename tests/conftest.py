@@ -0,0 +1,9 @@
+# Copyright (c) 2023 - 2024 Molodos
+# The ElegooNeptuneThumbnails plugin is released under the terms of the AGPLv3 or higher.
+
+import os
+import sys
+
+# The Cura independent modules are imported from the top level package "tools" (its Cura dependent modules are only
+# imported on first use), like the benchmarks and the post processor do
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
@@ -0,0 +1,67 @@
+# Copyright (c) 2023 - 2024 Molodos
+# The ElegooNeptuneThumbnails plugin is released under the terms of the AGPLv3 or higher.
+
+"""
+Streaming writer for line-chunked G-code payloads
+"""
+
+import random
+
+import pytest
+
+from tools.chunk_writer import ChunkWriter
+
+
+def write(*texts: str) -> ChunkWriter:
+    """
+    Get a writer with the texts written to it
+    """
+    writer: ChunkWriter = ChunkWriter()
+    for text in texts:
+        writer.write(text)
+    return writer
+
+
+def test_lines() -> None:
+    assert write("a\r", "b\rc\r").getlines() == ["a\r", "b\r", "c\r"]
+    assert write("a", "b", "\rc", "\r").getlines() == ["ab\r", "c\r"]
+
+
+def test_unfinished_last_line() -> None:
+    writer: ChunkWriter = write("a\rb")
+    assert writer.getlines() == ["a\r", "b"]
+    writer.write("c\r")
+    assert writer.getlines() == ["a\r", "bc\r"]
+
+
+def test_blank_lines_are_folded() -> None:
+    # Into the line before them, or the line after them at the start
+    assert write("a\r\r", "\r", "b\r").getlines() == ["a\r\r\r", "b\r"]
+    assert write("\r", "\ra\r").getlines() == ["\r\ra\r"]
+    assert write("\r").getvalue() == "\r"
+
+
+def test_write_chunked() -> None:
+    writer: ChunkWriter = ChunkWriter()
+    writer.write_chunked("abcdefg", chunk_size=3, line_prefix=";img:", line_suffix="\r")
+    writer.write_chunked("", chunk_size=3, line_prefix=";img:", line_suffix="\r")
+    assert writer.getlines() == [";img:abc\r", ";img:def\r", ";img:g\r"]
+    assert list(ChunkWriter.iter_chunks("abcdef", 2)) == ["ab", "cd", "ef"]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_splits(seed: int) -> None:
+    rng: random.Random = random.Random(seed)
+    text: str = "".join(rng.choice(["a", "bc", ";0", "\r", "\r\r"]) for _ in range(200)) + "end\r"
+    pieces: list[str] = []
+    start: int = 0
+    while start < len(text):
+        end: int = start + rng.randint(0, 12)
+        pieces.append(text[start:end])
+        start = end
+    writer: ChunkWriter = write(*pieces)
+    assert writer.getvalue() == text
+    lines: list[str] = writer.getlines()
+    assert all(line.endswith(ChunkWriter.LINE_END) for line in lines)
+    # No blank segments
+    assert all(line.strip(ChunkWriter.LINE_END) for line in lines)
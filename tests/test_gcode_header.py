@@ -0,0 +1,55 @@
+# Copyright (c) 2023 - 2024 Molodos
+# The ElegooNeptuneThumbnails plugin is released under the terms of the AGPLv3 or higher.
+
+"""
+Parameters of the Cura G-code header
+"""
+
+from tools.gcode_header import GCodeHeaderParser
+
+ELEGOO_HEADER: list[str] = [";FLAVOR:Marlin\n", ";TIME:2432\n", ";Filament used: 2.02409m\n", ";Layer height: 0.2\n",
+                            ";MINX:86.84\n", ";MAXZ:33\n", ";TARGET_MACHINE.NAME:ELEGOO NEPTUNE 4 Pro\n",
+                            ";Generated with Cura_SteamEngine 5.8.0\n", "M140 S60\n"]
+ULTIMAKER_HEADER: list[str] = [";START_OF_HEADER\n", ";FLAVOR:Griffin\n", ";PRINT.TIME:5123\n",
+                               ";PRINT.SIZE.MAX.Z:12.5\n", ";TARGET_MACHINE.NAME:Ultimaker S5\n", ";END_OF_HEADER\n",
+                               ";Generated with Cura_SteamEngine 5.8.0\n"]
+
+
+def test_elegoo_header() -> None:
+    # Values are kept as written (including the space after the colon of some keys)
+    assert GCodeHeaderParser.parse(ELEGOO_HEADER) == {
+        "flavor": "Marlin", "time": "2432", "filament_used": " 2.02409m", "layer_height": " 0.2", "minx": "86.84",
+        "maxz": "33", "machine_name": "ELEGOO NEPTUNE 4 Pro"}
+
+
+def test_ultimaker_header() -> None:
+    assert GCodeHeaderParser.parse(ULTIMAKER_HEADER) == {"flavor": "Griffin", "time": "5123", "maxz": "12.5",
+                                                         "machine_name": "Ultimaker S5"}
+
+
+def test_requested_params_only() -> None:
+    parser: GCodeHeaderParser = GCodeHeaderParser(params=["layer_height", "maxz"])
+    # Done once the last requested param is found, before the end of the header
+    assert GCodeHeaderParser.parse(ELEGOO_HEADER, params=["layer_height", "maxz"]) == {"layer_height": " 0.2",
+                                                                                       "maxz": "33"}
+    done: list[bool] = [parser.feed_line(line.rstrip("\n")) for line in ELEGOO_HEADER]
+    assert done.index(True) == ELEGOO_HEADER.index(";MAXZ:33\n")
+
+
+def test_stops_at_header_end() -> None:
+    parser: GCodeHeaderParser = GCodeHeaderParser(params=["layer_height", "maxz"])
+    assert parser.feed_segment("".join([";Layer height: 0.1\n", ";Generated with Cura_SteamEngine 5.8.0\n",
+                                        ";MAXZ:10\n"]))
+    assert parser.header_end_found
+    assert parser.params == {"layer_height": " 0.1"}
+
+
+def test_segments_and_line_ends() -> None:
+    # Segments contain several lines, Windows line ends and values with colons
+    segments: list[str] = [";FLAVOR:Marlin\r\n;TIME:60\r\n", ";TARGET_MACHINE.NAME:Printer: Mk2\r\n",
+                           ";Generated with Cura_SteamEngine 5.8.0\r\n"]
+    assert GCodeHeaderParser.parse(segments) == {"flavor": "Marlin", "time": "60", "machine_name": "Printer: Mk2"}
+
+
+def test_ignores_other_lines() -> None:
+    assert GCodeHeaderParser.parse(["G28 ;TIME:1\n", ";:5\n", ";no separator\n", ";LAYER:0\n"]) == {}
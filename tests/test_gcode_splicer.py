@@ -0,0 +1,203 @@
+# Copyright (c) 2023 - 2024 Molodos
+# The ElegooNeptuneThumbnails plugin is released under the terms of the AGPLv3 or higher.
+
+"""
+Splicing thumbnails into the G-code segment list of a slice (replacing the thumbnails of earlier saves)
+"""
+
+from functools import lru_cache
+from itertools import product
+
+import pytest
+
+from tools.chunk_writer import ChunkWriter
+from tools.encoders import ThumbnailEncoder
+from tools.gcode_header import GCodeHeaderParser
+from tools.gcode_splicer import GCodeSplicer, ThumbnailSegmentDetector
+from tools.printer_profiles import PrinterProfiles
+
+HEADER: str = ";FLAVOR:Marlin\n;TIME:2432\n;Layer height: 0.2\n;MAXZ:33\n;Generated with Cura_SteamEngine 5.8.0\n"
+TOGGLES: list[tuple[bool, bool]] = [(True, True), (True, False), (False, True)]
+
+
+def gradient(width: int, height: int) -> tuple[bytes, int, int, int]:
+    """
+    Get an RGBA gradient image
+    :return: Pixels, width, height and bytes per pixel row
+    """
+    rgba: bytes = bytes(value for y in range(height) for x in range(width)
+                        for value in (x * 255 // width, y * 255 // height, (x + y) % 256, 255))
+    return rgba, width, height, width * 4
+
+
+@lru_cache(maxsize=None)
+def printer_prefixes(layout: str) -> tuple[str, ...]:
+    """
+    Printer thumbnail segments of a layout like the thumbnail generator inserts them (one per image and the footer)
+    """
+    segments: list[str] = []
+    for encoding, width, height, img_type in PrinterProfiles.layouts()[layout]:
+        if encoding == "b64jpg":
+            lines: list[str] = ThumbnailEncoder.encode_b64jpg_thumbnail(f"jpeg {width}x{height}".encode(), img_type)
+        elif encoding == "old":
+            lines = ThumbnailEncoder.encode_old_thumbnail(*gradient(width, height), img_type)
+        else:
+            lines = ThumbnailEncoder.encode_col_pic_thumbnail(*gradient(width, height), img_type)
+        segments.append("".join(lines))
+    segments.append("".join(ThumbnailEncoder.encode_footer("ElegooNeptuneThumbnails", "1.0.0")))
+    return tuple(segments)
+
+
+@lru_cache(maxsize=None)
+def klipper_prefixes() -> tuple[str, ...]:
+    """
+    Klipper thumbnail segments like the thumbnail generator inserts them
+    """
+    results: list[list[str]] = [ThumbnailEncoder.encode_klipper_thumbnail(*gradient(size, size)) for size in [32, 64]]
+    results[0][0] = "\r" + results[0][0]
+    return tuple("".join(lines) for lines in results)
+
+
+def sliced() -> list[str]:
+    """
+    Get the G-code segments of a fresh slice
+    """
+    return [HEADER] + [f";LAYER:{i}\nG1 X{i} Y{i}\n" for i in range(5)]
+
+
+def per_line(prefixes: tuple[str, ...]) -> list[str]:
+    """
+    Split prefixes into one segment per line like earlier versions inserted them
+    """
+    writer: ChunkWriter = ChunkWriter()
+    for prefix in prefixes:
+        writer.write(prefix)
+    return writer.getlines()
+
+
+def detect(segments: list[str], thumbnails: bool = True, klipper_thumbnails: bool = True) -> list[bool]:
+    """
+    Get which segments are detected as thumbnail segments
+    """
+    detector: ThumbnailSegmentDetector = ThumbnailSegmentDetector(thumbnails_enabled=thumbnails,
+                                                                  klipper_thumbnails_enabled=klipper_thumbnails)
+    return [detector.feed_segment(segment) for segment in segments]
+
+
+def save(segments: list[str], layout: str, thumbnails: bool, klipper_thumbnails: bool) -> None:
+    """
+    Add thumbnails to the segments like a save does
+    """
+    detector: ThumbnailSegmentDetector = ThumbnailSegmentDetector(thumbnails_enabled=thumbnails,
+                                                                  klipper_thumbnails_enabled=klipper_thumbnails)
+    thumbnail_segments: list[int] = []
+    header_length: int = 0
+    for i, segment in enumerate(segments):
+        header_length = i + 1
+        if detector.feed_segment(segment):
+            thumbnail_segments.append(i)
+        if GCodeHeaderParser.HEADER_END in segment:
+            break
+    prefixes: list[str] = (list(printer_prefixes(layout)) if thumbnails else []) \
+        + (list(klipper_prefixes()) if klipper_thumbnails else [])
+    GCodeSplicer.splice_prefixes(segments=segments, prefixes=prefixes, header_length=header_length,
+                                 thumbnail_segments=thumbnail_segments)
+
+
+def test_insert() -> None:
+    segments: list[str] = sliced()
+    layers: list[str] = segments[1:]
+    GCodeSplicer.splice_prefixes(segments=segments, prefixes=["a\r", "b\r"], header_length=1)
+    assert segments == ["a\r", "b\r", HEADER] + layers
+    # Layer segments are moved, not copied
+    assert all(segment is layer for segment, layer in zip(segments[3:], layers))
+
+
+def test_replace() -> None:
+    segments: list[str] = ["old 1\r", "old 2\r", HEADER, "old 3\r", ";LAYER:0\n"]
+    original: list[str] = segments
+    GCodeSplicer.splice_prefixes(segments=segments, prefixes=["new\r"], header_length=4,
+                                 thumbnail_segments=[0, 1, 3])
+    assert segments is original
+    assert segments == ["new\r", HEADER, ";LAYER:0\n"]
+
+
+def test_remove_only() -> None:
+    segments: list[str] = ["old\r", HEADER, ";LAYER:0\n"]
+    GCodeSplicer.splice_prefixes(segments=segments, prefixes=[], header_length=2, thumbnail_segments=[0])
+    assert segments == [HEADER, ";LAYER:0\n"]
+
+
+@pytest.mark.parametrize("layout", sorted(PrinterProfiles.layouts()))
+@pytest.mark.parametrize("thumbnails, klipper_thumbnails", TOGGLES)
+def test_save(layout: str, thumbnails: bool, klipper_thumbnails: bool) -> None:
+    segments: list[str] = sliced()
+    save(segments, layout, thumbnails, klipper_thumbnails)
+    assert segments == (list(printer_prefixes(layout)) if thumbnails else []) \
+        + (list(klipper_prefixes()) if klipper_thumbnails else []) + sliced()
+
+
+@pytest.mark.parametrize("first_layout, layout", list(product(sorted(PrinterProfiles.layouts()), repeat=2)))
+@pytest.mark.parametrize("first_toggles, toggles", list(product(TOGGLES, repeat=2)))
+def test_resave(first_layout: str, layout: str, first_toggles: tuple[bool, bool], toggles: tuple[bool, bool]) -> None:
+    # Saving again (e.g. after switching the printer) replaces the thumbnails of enabled kinds and keeps the others
+    segments: list[str] = sliced()
+    save(segments, first_layout, *first_toggles)
+    save(segments, layout, *toggles)
+    thumbnails, klipper_thumbnails = toggles
+    expected: list[str] = (list(printer_prefixes(layout)) if thumbnails else []) \
+        + (list(klipper_prefixes()) if klipper_thumbnails else [])
+    if first_toggles[0] and not thumbnails:
+        expected += printer_prefixes(first_layout)
+    if first_toggles[1] and not klipper_thumbnails:
+        expected += klipper_prefixes()
+    assert segments == expected + sliced()
+
+
+@pytest.mark.parametrize("layout", sorted(PrinterProfiles.layouts()))
+def test_resave_repeatedly(layout: str) -> None:
+    segments: list[str] = sliced()
+    for _ in range(3):
+        save(segments, layout, True, True)
+    assert segments == list(printer_prefixes(layout)) + list(klipper_prefixes()) + sliced()
+
+
+@pytest.mark.parametrize("layout", sorted(PrinterProfiles.layouts()))
+def test_detect_per_line_segments(layout: str) -> None:
+    printer: list[str] = per_line(printer_prefixes(layout))
+    klipper: list[str] = per_line(klipper_prefixes())
+    assert detect(printer + klipper) == [True] * (len(printer) + len(klipper))
+    assert detect(printer + klipper, klipper_thumbnails=False) == [True] * len(printer) + [False] * len(klipper)
+    assert detect(printer + klipper, thumbnails=False) == [False] * len(printer) + [True] * len(klipper)
+    segments: list[str] = printer + klipper + sliced()
+    save(segments, layout, True, True)
+    assert segments == list(printer_prefixes(layout)) + list(klipper_prefixes()) + sliced()
+
+
+@pytest.mark.parametrize("layout", sorted(PrinterProfiles.layouts()))
+def test_detect_toggles(layout: str) -> None:
+    # Thumbnails of other printers are detected too (the printer may have been switched since the last save)
+    segments: list[str] = list(printer_prefixes(layout)) + list(klipper_prefixes()) + [HEADER]
+    printer: int = len(printer_prefixes(layout))
+    klipper: int = len(klipper_prefixes())
+    assert detect(segments) == [True] * (printer + klipper) + [False]
+    assert detect(segments, klipper_thumbnails=False) == [True] * printer + [False] * (klipper + 1)
+    assert detect(segments, thumbnails=False) == [False] * printer + [True] * klipper + [False]
+    assert detect(segments, thumbnails=False, klipper_thumbnails=False) == [False] * (printer + klipper + 1)
+
+
+def test_detect_klipper_block_across_segments() -> None:
+    segments: list[str] = [HEADER, "; thumbnail begin 32 32 8\r", "; aGVsbG8=\r", "; thumbnail end\r", ";LAYER:0\n"]
+    assert detect(segments) == [False, True, True, True, False]
+    # A segment ending one block and starting the next one
+    segments = ["; thumbnail begin 32 32 8\r", "; a\r; thumbnail end\r; thumbnail begin 64 64 8\r", "; b\r",
+                "; thumbnail end\r", ";LAYER:0\n"]
+    assert detect(segments) == [True, True, True, True, False]
+
+
+def test_detect_padding_only_after_thumbnails() -> None:
+    # ColPic padding and old format rows are only recognizable next to a thumbnail line
+    assert detect([";gimage:abc\r", ";000000\r", "M10086 ;abc\r", ";0 \r", HEADER]) == [True] * 4 + [False]
+    assert detect([HEADER, ";000000\r", "M10086 ;abc\r"]) == [False] * 3
+    assert detect([";gimage:abc\r", HEADER, ";0\r"]) == [True, False, False]
+    assert detect([";simage:abc\r", ";01\r"]) == [True, False]
@@ -0,0 +1,128 @@
+# Copyright (c) 2023 - 2024 Molodos
+# The ElegooNeptuneThumbnails plugin is released under the terms of the AGPLv3 or higher.
+
+"""
+Byte for byte equivalence of the NumPy ColPic encoder and the pure Python reference
+Run with: python -m pytest tests
+"""
+
+import random
+from array import array
+from typing import Callable, Union
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from tools import lib_col_pic, lib_col_pic_numpy
+
+MIN_OUTPUT_SIZE: int = 8192
+
+
+def encode(function: Callable, pixels: list[int], width: int, height: int, colors_max: int = 1024,
+           output_size: int = 0, **kwargs) -> tuple[Union[int, float], bytes]:
+    """
+    Encode a copy of the pixels like ThumbnailEncoder does (output buffer of 10 bytes per pixel)
+    :return: Return value and the whole output buffer
+    """
+    output_size = output_size or max(width * height * 10, MIN_OUTPUT_SIZE)
+    output: bytearray = bytearray(output_size)
+    result = function(array("H", pixels), width, height, output, output_size, colors_max, **kwargs)
+    return result, bytes(output)
+
+
+def assert_equivalent(pixels: list[int], width: int, height: int, colors_max: int = 1024, output_size: int = 0,
+                      **kwargs) -> None:
+    """
+    Check that both encoders return the same value and write the same bytes
+    """
+    expected = encode(lib_col_pic.ColPic_EncodeStr_Python, pixels, width, height, colors_max, output_size, **kwargs)
+    actual = encode(lib_col_pic_numpy.ColPic_EncodeStr, pixels, width, height, colors_max, output_size, **kwargs)
+    assert actual[0] == expected[0]
+    assert actual[1] == expected[1]
+
+
+def distinct_colors(count: int, seed: int) -> list[int]:
+    """
+    Get distinct random RGB565 colors
+    """
+    return random.Random(seed).sample(range(65536), count)
+
+
+@pytest.mark.parametrize("color", [0, 1, 0x5C, 0xFFFF])
+def test_single_color(color: int) -> None:
+    assert_equivalent([color] * 64 * 64, 64, 64)
+
+
+def test_stripes() -> None:
+    assert_equivalent([0xF800 if x % 2 else 0x07E0 for y in range(32) for x in range(48)], 48, 32)
+
+
+def test_gradient() -> None:
+    assert_equivalent([((x >> 2) << 11) | (y << 5) | ((x + y) & 31) for y in range(64) for x in range(128)], 128, 64)
+
+
+@pytest.mark.parametrize("run_length", [1, 6, 7, 254, 255, 256, 257, 510, 511, 512, 513, 1024])
+def test_run_lengths(run_length: int) -> None:
+    # Runs are split at 255 pixels, short runs (up to 6) and long runs are encoded differently
+    pixels: list[int] = [0x1234] * run_length + [0x4321] * (run_length + 1) + [0x1234] * 3
+    assert_equivalent(pixels, len(pixels), 1)
+
+
+def test_run_lengths_across_palette_pages() -> None:
+    # Palette indices above 31 switch the palette page in the run encoding
+    colors: list[int] = distinct_colors(100, seed=1)
+    pixels: list[int] = [color for i, color in enumerate(colors) for _ in range((i * 37) % 600 + 1)]
+    assert_equivalent(pixels, len(pixels), 1)
+
+
+@pytest.mark.parametrize("color_count", [31, 32, 33, 1023, 1024, 1025, 2000, 4096])
+def test_palette_sizes(color_count: int) -> None:
+    # More than 1024 distinct colors are merged into the nearest palette color
+    colors: list[int] = distinct_colors(color_count, seed=color_count)
+    pixels: list[int] = [colors[i % color_count] for i in range(64 * 80)]
+    assert_equivalent(pixels, 64, 80)
+
+
+@pytest.mark.parametrize("colors_max", [1, 2, 64, 256, 1000])
+def test_reduced_palette(colors_max: int) -> None:
+    rng: random.Random = random.Random(colors_max)
+    colors: list[int] = distinct_colors(1500, seed=7)
+    pixels: list[int] = [colors[min(int(rng.expovariate(0.01)), 1499)] for _ in range(96 * 96)]
+    assert_equivalent(pixels, 96, 96, colors_max=colors_max)
+
+
+@pytest.mark.parametrize("weights", [(1, 1, 1), (2, 1, 3), (0, 1, 0)])
+def test_channel_weights(weights: tuple[int, int, int]) -> None:
+    colors: list[int] = distinct_colors(1200, seed=3)
+    pixels: list[int] = [colors[i * 7 % 1200] for i in range(48 * 48)]
+    assert_equivalent(pixels, 48, 48, colors_max=128, weights=weights)
+
+
+@pytest.mark.parametrize("output_size", [60, 100, 1000, 3000])
+def test_truncated_output(output_size: int) -> None:
+    # The encoded data is cut at the maximum size (strings that don't fit return 0)
+    colors: list[int] = distinct_colors(8, seed=5)
+    rng: random.Random = random.Random(output_size)
+    pixels: list[int] = [rng.choice(colors) for _ in range(64 * 64)]
+    assert_equivalent(pixels, 64, 64, output_size=output_size)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_images(seed: int) -> None:
+    rng: random.Random = random.Random(seed)
+    width, height = rng.randint(1, 120), rng.randint(1, 120)
+    colors: list[int] = distinct_colors(rng.choice([1, 5, 40, 300, 1024, 1500, 5000]), seed=seed)
+    pixels: list[int] = []
+    while len(pixels) < width * height:
+        pixels += [rng.choice(colors)] * rng.choice([1, 2, 7, 100, 255, 256, 600])
+    assert_equivalent(pixels[:width * height], width, height, colors_max=rng.choice([1024, 1024, 300, 16]))
+
+
+def test_output_too_small() -> None:
+    # Header and palette don't fit
+    pixels: list[int] = distinct_colors(64, seed=9)
+    with pytest.raises(IndexError):
+        encode(lib_col_pic.ColPic_EncodeStr_Python, pixels, 8, 8, output_size=64)
+    with pytest.raises(IndexError):
+        encode(lib_col_pic_numpy.ColPic_EncodeStr, pixels, 8, 8, output_size=64)
@@ -0,0 +1,106 @@
+# Copyright (c) 2023 - 2024 Molodos
+# The ElegooNeptuneThumbnails plugin is released under the terms of the AGPLv3 or higher.
+
+"""
+LRU cache of finished G-code prefixes
+"""
+
+from typing import Iterator
+
+import pytest
+
+from tools.prefix_cache import PrefixCache
+
+
+@pytest.fixture(autouse=True)
+def small_cache(monkeypatch) -> Iterator[None]:
+    """
+    Use an empty cache with small limits in every test
+    """
+    monkeypatch.setattr(PrefixCache, "MAX_ENTRIES", 3)
+    monkeypatch.setattr(PrefixCache, "MAX_SIZE", 10)
+    PrefixCache.clear()
+    yield
+    PrefixCache.clear()
+
+
+def cached_keys() -> list[str]:
+    """
+    Get the cached keys from least to most recently used
+    """
+    return list(PrefixCache._entries)
+
+
+def test_get_missing() -> None:
+    assert PrefixCache.get("missing") is None
+
+
+def test_evicts_least_recently_used_at_entry_cap() -> None:
+    for key in "abcd":
+        PrefixCache.put(key, [key])
+    assert cached_keys() == ["b", "c", "d"]
+    assert PrefixCache.get("a") is None
+    assert PrefixCache._size == 3
+
+
+def test_get_marks_recently_used() -> None:
+    for key in "abc":
+        PrefixCache.put(key, [key])
+    assert PrefixCache.get("a") == ["a"]
+    PrefixCache.put("d", ["d"])
+    assert cached_keys() == ["c", "a", "d"]
+
+
+def test_evicts_to_stay_within_size_cap() -> None:
+    PrefixCache.put("a", ["aaaa"])
+    PrefixCache.put("b", ["bb", "bb"])
+    PrefixCache.put("c", ["ccc"])
+    assert cached_keys() == ["b", "c"]
+    assert PrefixCache._size == 7
+
+
+def test_oversized_prefixes_are_not_cached() -> None:
+    PrefixCache.put("a", ["a"])
+    PrefixCache.put("big", ["x" * 11])
+    assert PrefixCache.get("big") is None
+    assert cached_keys() == ["a"]
+    # Exactly at the cap still fits (evicting everything else)
+    PrefixCache.put("full", ["x" * 10])
+    assert cached_keys() == ["full"]
+    assert PrefixCache._size == 10
+
+
+def test_put_replaces_key() -> None:
+    PrefixCache.put("a", ["aaaa"])
+    PrefixCache.put("b", ["bbbb"])
+    PrefixCache.put("a", ["aa"])
+    assert cached_keys() == ["b", "a"]
+    assert PrefixCache.get("a") == ["aa"]
+    assert PrefixCache._size == 6
+
+
+def test_entries_are_copies() -> None:
+    prefixes: list[str] = ["a", "b"]
+    PrefixCache.put("key", prefixes)
+    prefixes.append("c")
+    cached: list[str] = PrefixCache.get("key")
+    assert cached == ["a", "b"]
+    cached.append("d")
+    assert PrefixCache.get("key") == ["a", "b"]
+
+
+def test_clear() -> None:
+    PrefixCache.put("a", ["a"])
+    PrefixCache.clear()
+    assert PrefixCache.get("a") is None
+    assert PrefixCache._size == 0
+
+
+def test_make_key() -> None:
+    key: str = PrefixCache.make_key(["ab", b"c"])
+    assert key == PrefixCache.make_key([b"ab", "c"])
+    assert len(key) == 32
+    # Order and splits of the parts matter
+    assert key != PrefixCache.make_key(["c", "ab"])
+    assert key != PrefixCache.make_key(["a", "bc"])
+    assert key != PrefixCache.make_key(["abc"])
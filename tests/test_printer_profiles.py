@@ -0,0 +1,80 @@
+# Copyright (c) 2023 - 2024 Molodos
+# The ElegooNeptuneThumbnails plugin is released under the terms of the AGPLv3 or higher.
+
+"""
+Printer profiles and thumbnail layouts from printer_profiles.json
+"""
+
+import json
+import os
+from typing import Any, Callable, Iterator
+
+import pytest
+
+from tools.printer_profiles import PrinterProfiles
+
+with open(PrinterProfiles.PROFILES_PATH, "r", encoding="utf-8") as profiles_file:
+    PROFILES_JSON: dict[str, Any] = json.load(profiles_file)
+
+PRINTER_IDS: list[str] = [printer["id"] for printer in PROFILES_JSON["printers"]]
+
+
+@pytest.fixture(autouse=True)
+def reload_profiles() -> Iterator[None]:
+    """
+    Restore the profiles of the plugin after every test
+    """
+    yield
+    PrinterProfiles.load()
+
+
+@pytest.mark.parametrize("profile_id", PRINTER_IDS)
+def test_profile_resolves(profile_id: str) -> None:
+    printer: dict[str, Any] = PROFILES_JSON["printers"][PRINTER_IDS.index(profile_id)]
+    profile = PrinterProfiles.get(PrinterProfiles.index_of(profile_id))
+    assert profile.profile_id == profile_id
+    assert profile.layout in PrinterProfiles.layouts()
+    assert profile.thumbnails == PrinterProfiles.layouts()[profile.layout]
+    assert profile.thumbnails
+    assert os.path.isfile(os.path.join(PrinterProfiles.IMG_PATH, profile.background))
+    for name in [profile_id, printer["name"], *printer.get("aliases", [])]:
+        assert PrinterProfiles.find(name) is profile
+
+
+def test_display_order_and_default() -> None:
+    assert [profile.profile_id for profile in PrinterProfiles.profiles()] == PRINTER_IDS
+    assert PrinterProfiles.default_profile_id() in PRINTER_IDS
+
+
+@pytest.mark.parametrize("layout", sorted(PROFILES_JSON["layouts"]))
+def test_layout_thumbnails(layout: str) -> None:
+    assert PrinterProfiles.layouts()[layout] == [
+        (thumbnail["encoding"], thumbnail["width"], thumbnail["height"], thumbnail["tag"])
+        for thumbnail in PROFILES_JSON["layouts"][layout]]
+
+
+def test_find_normalizes_names() -> None:
+    assert PrinterProfiles.find("ELEGOO NEPTUNE 4 Pro") is PrinterProfiles.find("elegoo_neptune_4_pro")
+    assert PrinterProfiles.find("Unknown Printer") is None
+
+
+@pytest.mark.parametrize("mutate", [
+    lambda data: data["printers"][0].update(layout="missing"),
+    lambda data: data["printers"][0].update(background="missing.png"),
+    lambda data: data["printers"][1].update(name=data["printers"][0]["name"]),
+    lambda data: data["printers"][0].pop("id"),
+    lambda data: data["layouts"]["colpic"][0].update(encoding="png"),
+    lambda data: data["layouts"]["colpic"][0].update(width=0),
+    lambda data: data["layouts"]["colpic"][0].update(tag=""),
+    lambda data: data.update(default_printer="missing"),
+], ids=["layout", "background", "duplicate name", "id", "encoding", "size", "tag", "default"])
+def test_invalid_profiles(tmp_path, mutate: Callable[[dict[str, Any]], Any]) -> None:
+    data: dict[str, Any] = json.loads(json.dumps(PROFILES_JSON))
+    mutate(data)
+    profiles_path: str = str(tmp_path / "printer_profiles.json")
+    with open(profiles_path, "w", encoding="utf-8") as file:
+        json.dump(data, file)
+    with pytest.raises(ValueError):
+        PrinterProfiles.load(profiles_path)
+    # The loaded profiles stay as they were
+    assert [profile.profile_id for profile in PrinterProfiles.profiles()] == PRINTER_IDS
@@ -1,7 +1,44 @@
 # Copyright (c) 2023 - 2024 Molodos
 # The ElegooNeptuneThumbnails plugin is released under the terms of the AGPLv3 or higher.
 
-from .settings import Settings, SettingsManager
-from .gui import GUIManager
-from .statistics_sender import StatisticsSender
-from .thumbnail_generator import SliceData, ThumbnailGenerator
+import sys
+from importlib import import_module
+from importlib.util import resolve_name
+from types import ModuleType
+from typing import Any, Optional
+
+# Exports are imported on first access, so the Cura independent modules (encoders, G-code parsing) can also be used
+# without Cura (e.g. by the command line post processor)
+_EXPORTS: dict[str, str] = {
+    "Settings": ".settings",
+    "SettingsManager": ".settings",
+    "PrinterProfile": ".printer_profiles",
+    "PrinterProfiles": ".printer_profiles",
+    "GUIManager": ".gui",
+    "SettingsTranslator": ".settings_translator",
+    "ImageCache": ".image_cache",
+    "StatisticsSender": ".statistics_sender",
+    "SliceData": ".thumbnail_generator",
+    "RenderContext": ".thumbnail_generator",
+    "ThumbnailGenerator": ".thumbnail_generator",
+    "EncodingPipeline": ".encoding_pipeline",
+    "GCodeHeaderParser": ".gcode_header",
+    "GCodeSplicer": ".gcode_splicer",
+    "ThumbnailSegmentDetector": ".gcode_splicer",
+    "PrefixCache": ".prefix_cache",
+    "SaveProfiler": ".save_profiler"
+}
+
+
+def get_if_loaded(name: str) -> Optional[Any]:
+    """
+    Get an export only if its module was already imported (e.g. to stop workers of modules that were never used)
+    """
+    module: Optional[ModuleType] = sys.modules.get(resolve_name(_EXPORTS[name], __name__))
+    return getattr(module, name, None)
+
+
+def __getattr__(name: str) -> Any:
+    if name in _EXPORTS:
+        return getattr(import_module(_EXPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,73 @@
+# Copyright (c) 2023 - 2024 Molodos
+# The ElegooNeptuneThumbnails plugin is released under the terms of the AGPLv3 or higher.
+
+class ChunkWriter:
+    """
+    Streaming writer for line-chunked G-code payloads (collects complete lines, so the payload never has to be joined
+    into one string)
+    """
+
+    LINE_END: str = "\r"
+
+    def __init__(self) -> None:
+        self._lines: list[str] = []
+        self._line: list[str] = []
+
+    def write(self, text: str) -> None:
+        """
+        Write a piece of text (may contain line ends)
+        """
+        start: int = 0
+        end: int = text.find(self.LINE_END)
+        if end == len(text) - 1 and end > 0 and not self._line:
+            # Exactly one complete line
+            self._lines.append(text)
+            return
+        while end >= 0:
+            self._line.append(text[start:end + 1])
+            if end == start and not "".join(self._line).strip(self.LINE_END):
+                # Blank lines are kept with the line before them (or the one after them at the start), so every line
+                # has content
+                if self._lines:
+                    self._lines[-1] += "".join(self._line)
+                    self._line = []
+            else:
+                self._lines.append("".join(self._line))
+                self._line = []
+            start = end + 1
+            end = text.find(self.LINE_END, start)
+        if start < len(text):
+            self._line.append(text[start:])
+
+    def write_chunked(self, payload: str, chunk_size: int, line_prefix: str = "", line_suffix: str = "") -> None:
+        """
+        Write a payload split into fixed-width lines
+        :param payload: Payload to split
+        :param chunk_size: Amount of payload characters per line
+        :param line_prefix: Text in front of every line
+        :param line_suffix: Text after every line
+        """
+        for chunk in self.iter_chunks(payload=payload, chunk_size=chunk_size):
+            self.write(line_prefix + chunk + line_suffix)
+
+    def getlines(self) -> list[str]:
+        """
+        Get everything written so far as lines (each ending with the line end, except for an unfinished last line)
+        """
+        if self._line:
+            return self._lines + ["".join(self._line)]
+        return list(self._lines)
+
+    def getvalue(self) -> str:
+        """
+        Get everything written so far as one string
+        """
+        return "".join(self.getlines())
+
+    @staticmethod
+    def iter_chunks(payload: str, chunk_size: int):
+        """
+        Iterate over fixed-width slices of a payload (the last one may be shorter)
+        """
+        for start in range(0, len(payload), chunk_size):
+            yield payload[start:start + chunk_size]
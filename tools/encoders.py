@@ -0,0 +1,199 @@
+# Copyright (c) 2023 - 2024 Molodos
+# The ElegooNeptuneThumbnails plugin is released under the terms of the AGPLv3 or higher.
+
+import base64
+import struct
+import sys
+import zlib
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    # NumPy is not available in every Cura build, pixels are converted in pure Python then
+    numpy = None
+
+from . import lib_col_pic
+from .chunk_writer import ChunkWriter
+
+
+class ThumbnailEncoder:
+    """
+    Thumbnail encoders working on raw pixel buffers with width, height and stride (no Qt or Cura, so they can run in
+    worker processes, the command line post processor and benchmarks)
+    """
+
+    ELEGOO_LINE_SIZE: int = 1024 - 8 - 1
+    KLIPPER_THUMBNAIL_BLOCK_SIZE: int = 78
+    PNG_SIGNATURE: bytes = b"\x89PNG\r\n\x1a\n"
+
+    @classmethod
+    def encode_old_thumbnail(cls, rgba: bytes, width: int, height: int, stride: int, img_type: str) -> list[str]:
+        """
+        Encode RGBA pixels to the hex RGB565 thumbnail format of old printers
+        :param rgba: RGBA8888 pixels
+        :param width: Width of the image
+        :param height: Height of the image
+        :param stride: Bytes per pixel row in the buffer
+        :param img_type: Image type prefix (without leading semicolon and colon)
+        :return: G-code lines
+        """
+        img_type = f";{img_type}:"
+        writer: ChunkWriter = ChunkWriter()
+        writer.write(img_type)
+        if width and height:
+            # One line per pixel row, 4 hex chars per pixel
+            color16: bytes = cls.rgba_to_rgb565(rgba, width, height, stride).tobytes()
+            writer.write_chunked(cls.rgb565_to_hex(color16), width * 4, line_suffix="\rM10086 ;")
+            writer.write("\r")
+        return writer.getlines()
+
+    @classmethod
+    def encode_col_pic_thumbnail(cls, rgba: bytes, width: int, height: int, stride: int, img_type: str) -> list[str]:
+        """
+        Encode RGBA pixels to the ColPic thumbnail format of new printers
+        :param rgba: RGBA8888 pixels
+        :param width: Width of the image
+        :param height: Height of the image
+        :param stride: Bytes per pixel row in the buffer
+        :param img_type: Image type prefix (without leading semicolon and colon)
+        :return: G-code lines
+        """
+        img_type = f";{img_type}:"
+        pixels: array = cls.rgba_to_rgb565(rgba, width, height, stride)
+        output_data = bytearray(height * width * 10)
+        length: int = int(lib_col_pic.ColPic_EncodeStr(pixels, height, width, output_data, height * width * 10, 1024))
+
+        # Encoded data ends at the returned length (only zeros follow), the line layout is based on its length as
+        # printed string representation (10 chars longer than the data itself)
+        encoded: str = output_data[:length].decode("latin-1")
+        repr_length: int = len(encoded) + 10
+        writer: ChunkWriter = ChunkWriter()
+        cls.write_elegoo_lines(writer, encoded, img_type, repr_length)
+        writer.write("\r;")
+        writer.write("0" * (cls.ELEGOO_LINE_SIZE - 3 - repr_length % cls.ELEGOO_LINE_SIZE + 10))
+        writer.write("\r")
+        return writer.getlines()
+
+    @classmethod
+    def encode_b64jpg_thumbnail(cls, jpeg: bytes, img_type: str) -> list[str]:
+        """
+        Encode a JPEG image to the base64 thumbnail format of new printers (JPEG compression itself is left to the
+        caller, e.g. Qt, as there is no JPEG encoder in the standard library)
+        :param jpeg: JPEG file content
+        :param img_type: Image type prefix (without leading semicolon and colon)
+        :return: G-code lines
+        """
+        base64_string: str = str(base64.b64encode(jpeg), "UTF-8")
+        writer: ChunkWriter = ChunkWriter()
+        cls.write_elegoo_lines(writer, base64_string, f";{img_type}:", len(base64_string))
+        writer.write("\r")
+        return writer.getlines()
+
+    @classmethod
+    def encode_klipper_thumbnail(cls, rgba: bytes, width: int, height: int, stride: int) -> list[str]:
+        """
+        Encode RGBA pixels to a klipper thumbnail block (base64 PNG)
+        :param rgba: RGBA8888 pixels (not premultiplied)
+        :param width: Width of the image
+        :param height: Height of the image
+        :param stride: Bytes per pixel row in the buffer
+        :return: G-code lines
+        """
+        base64_string: str = str(base64.b64encode(cls.encode_png(rgba, width, height, stride)), "UTF-8")
+        writer: ChunkWriter = ChunkWriter()
+        writer.write(f"; thumbnail begin {width} {height} {len(base64_string)}\r")
+        writer.write_chunked(base64_string, cls.KLIPPER_THUMBNAIL_BLOCK_SIZE, line_prefix="; ", line_suffix="\r")
+        writer.write("; thumbnail end\r\r")
+        return writer.getlines()
+
+    @classmethod
+    def encode_footer(cls, plugin_name: str, plugin_version: str) -> list[str]:
+        """
+        Encode the comment line following the printer thumbnails
+        :param plugin_name: Name of the plugin (from plugin.json)
+        :param plugin_version: Version of the plugin (from plugin.json)
+        :return: G-code lines
+        """
+        writer: ChunkWriter = ChunkWriter()
+        writer.write(f"\r;Thumbnail generated by the {plugin_name} plugin version {plugin_version} "
+                     f"(https://github.com/Molodos/ElegooNeptuneThumbnails)\r\r")
+        return writer.getlines()
+
+    @classmethod
+    def encode_png(cls, rgba: bytes, width: int, height: int, stride: int) -> bytes:
+        """
+        Encode RGBA pixels to a PNG file
+        :param rgba: RGBA8888 pixels (not premultiplied)
+        :param width: Width of the image
+        :param height: Height of the image
+        :param stride: Bytes per pixel row in the buffer
+        """
+        # Every row gets filter type 0 (none)
+        rows: bytes = b"".join(b"\x00" + rgba[i * stride:i * stride + width * 4] for i in range(height))
+        header: bytes = struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)
+        return (cls.PNG_SIGNATURE + cls._png_chunk(b"IHDR", header) + cls._png_chunk(b"IDAT", zlib.compress(rows, 9))
+                + cls._png_chunk(b"IEND", b""))
+
+    @classmethod
+    def rgba_to_rgb565(cls, rgba: bytes, width: int, height: int, stride: int) -> array:
+        """
+        Convert RGBA pixels to RGB565 pixels (row by row) in one go
+        :param rgba: RGBA8888 pixels
+        :param width: Width of the image
+        :param height: Height of the image
+        :param stride: Bytes per pixel row in the buffer
+        :return: The RGB565 pixels
+        """
+        color16: array = array('H')
+        if numpy is not None:
+            pixels = numpy.frombuffer(rgba, dtype=numpy.uint8, count=height * stride).reshape(height, stride)
+            pixels = pixels[:, :width * 4].reshape(height, width, 4).astype(numpy.uint16)
+            rgb = ((pixels[:, :, 0] >> 3) << 11) | ((pixels[:, :, 1] >> 2) << 5) | (pixels[:, :, 2] >> 3)
+            color16.frombytes(rgb.astype(numpy.uint16).tobytes())
+        else:
+            for i in range(height):
+                row: bytes = rgba[i * stride:i * stride + width * 4]
+                color16.extend(((r >> 3) << 11) | ((g >> 2) << 5) | (b >> 3)
+                               for r, g, b in zip(row[0::4], row[1::4], row[2::4]))
+        return color16
+
+    @classmethod
+    def rgb565_to_hex(cls, color16: bytes) -> str:
+        """
+        Hex encode RGB565 pixels (native byte order) with the low byte first
+        """
+        if sys.byteorder != "little":
+            pixels: array = array('H')
+            pixels.frombytes(color16)
+            pixels.byteswap()
+            color16 = pixels.tobytes()
+        return color16.hex()
+
+    @classmethod
+    def write_elegoo_lines(cls, writer: ChunkWriter, payload: str, img_type: str, layout_length: int) -> None:
+        """
+        Write a payload as elegoo thumbnail lines of 1015 chars, each starting with the image type
+        :param writer: Writer to write to
+        :param payload: Payload to split into lines
+        :param img_type: Image type prefix of every line
+        :param layout_length: Length the line layout is based on (the line starting at the last full multiple of the
+                              line size gets an extra semicolon)
+        """
+        marked_line_start: int = (layout_length // cls.ELEGOO_LINE_SIZE) * cls.ELEGOO_LINE_SIZE
+        for i, chunk in enumerate(ChunkWriter.iter_chunks(payload=payload, chunk_size=cls.ELEGOO_LINE_SIZE)):
+            line_start: int = i * cls.ELEGOO_LINE_SIZE
+            if line_start == marked_line_start:
+                writer.write("\r;" + img_type)
+            elif line_start == 0:
+                writer.write(img_type)
+            else:
+                writer.write("\r" + img_type)
+            writer.write(chunk)
+
+    @classmethod
+    def _png_chunk(cls, chunk_type: bytes, data: bytes) -> bytes:
+        """
+        Build a PNG chunk (length, type, data and CRC)
+        """
+        return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
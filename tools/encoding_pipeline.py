@@ -0,0 +1,94 @@
+# Copyright (c) 2023 - 2024 Molodos
+# The ElegooNeptuneThumbnails plugin is released under the terms of the AGPLv3 or higher.
+
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from typing import Optional
+
+from UM.Logger import Logger
+from .parallel_encoder import ParallelEncoder
+from .save_profiler import SaveProfiler
+from .thumbnail_generator import RenderContext, ThumbnailGenerator
+
+
+class EncodingPipeline:
+    """
+    Thumbnail encoding pipeline (only the snapshot is taken on the Qt main thread, composing, pixel conversion,
+    encoding and G-code assembly run in a background worker)
+    """
+
+    _executor: Optional[ThreadPoolExecutor] = None
+
+    @classmethod
+    def submit(cls, render_context: RenderContext, thumbnails_enabled: bool,
+               klipper_thumbnails_enabled: bool) -> Future:
+        """
+        Take the snapshot on the calling (main) thread and start encoding in the background
+        :param render_context: Render context of the save
+        :param thumbnails_enabled: Whether to generate the printer thumbnail prefix
+        :param klipper_thumbnails_enabled: Whether to generate the klipper thumbnail prefix
+        :return: Future resolving to the G-code prefix segments (one per image)
+        """
+        # Offscreen rendering needs the OpenGL context of the main thread
+        render_context.get_snapshot()
+        return cls._get_executor().submit(cls._encode, render_context, thumbnails_enabled,
+                                          klipper_thumbnails_enabled, SaveProfiler.current_save())
+
+    @classmethod
+    def generate_prefixes(cls, render_context: RenderContext, thumbnails_enabled: bool,
+                          klipper_thumbnails_enabled: bool, timeout: float) -> list[str]:
+        """
+        Generate all G-code prefixes in the background and wait for them
+        :param render_context: Render context of the save
+        :param thumbnails_enabled: Whether to generate the printer thumbnail prefix
+        :param klipper_thumbnails_enabled: Whether to generate the klipper thumbnail prefix
+        :param timeout: Seconds to wait for the encoding
+        :return: The G-code prefix segments, one per image (empty if encoding failed or timed out, to write G-code
+                 without thumbnails)
+        """
+        future: Future = cls.submit(render_context=render_context, thumbnails_enabled=thumbnails_enabled,
+                                    klipper_thumbnails_enabled=klipper_thumbnails_enabled)
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            Logger.log("w", f"Thumbnail encoding took longer than {timeout}s, writing G-code without thumbnails")
+            # The worker stops the stale encoding at its next stage, so the next save doesn't wait long for it
+            future.cancel()
+            render_context.cancel()
+        except Exception as e:
+            Logger.log("e", f"Thumbnail encoding failed, writing G-code without thumbnails: {e}")
+        return []
+
+    @classmethod
+    def shutdown(cls) -> None:
+        """
+        Stop the background worker and worker processes (pending encodings are dropped)
+        """
+        if cls._executor is not None:
+            cls._executor.shutdown(wait=False, cancel_futures=True)
+            cls._executor = None
+        ParallelEncoder.shutdown()
+
+    @classmethod
+    def _get_executor(cls) -> ThreadPoolExecutor:
+        """
+        Get the worker (created on first use)
+        """
+        if cls._executor is None:
+            cls._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ElegooNeptuneThumbnails")
+        return cls._executor
+
+    @classmethod
+    def _encode(cls, render_context: RenderContext, thumbnails_enabled: bool, klipper_thumbnails_enabled: bool,
+                save_id: int) -> list[str]:
+        """
+        Encode all enabled thumbnails (runs in the worker, raises CancelledError if the save stopped waiting)
+        :param save_id: Save the encoding is timed for (timings of a cancelled save are dropped)
+        """
+        prefixes: list[str] = []
+        with SaveProfiler.bind_save(save_id):
+            if thumbnails_enabled:
+                prefixes.extend(ThumbnailGenerator.generate_gcode_prefix(render_context=render_context))
+            if klipper_thumbnails_enabled:
+                prefixes.extend(ThumbnailGenerator.generate_klipper_thumbnail_gcode(render_context=render_context))
+            render_context.raise_if_cancelled()
+        return prefixes
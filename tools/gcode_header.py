@@ -0,0 +1,115 @@
+# Copyright (c) 2023 - 2024 Molodos
+# The ElegooNeptuneThumbnails plugin is released under the terms of the AGPLv3 or higher.
+
+from typing import Iterable, Optional
+
+
+class GCodeHeaderParser:
+    """
+    Single pass parser for the parameters in the comment header of Cura G-code (no Cura dependency)
+    """
+
+    HEADER_END: str = ";Generated with Cura_SteamEngine"
+    PARAM_MAPPINGS: dict[str, dict[str, str]] = {
+        "elegoo": {
+            "flavor": "flavor",
+            "time": "time",
+            "filament used": "filament_used",
+            "layer height": "layer_height",
+            "minx": "minx",
+            "miny": "miny",
+            "minz": "minz",
+            "maxx": "maxx",
+            "maxy": "maxy",
+            "maxz": "maxz",
+            "target_machine.name": "machine_name",
+        },
+        "ultimaker": {
+            "flavor": "flavor",
+            "print.time": "time",
+            "print.size.min.x": "minx",
+            "print.size.min.y": "miny",
+            "print.size.min.z": "minz",
+            "print.size.max.x": "maxx",
+            "print.size.max.y": "maxy",
+            "print.size.max.z": "maxz",
+            "target_machine.name": "machine_name",
+        }
+    }
+    """
+    Example for parsed params:
+    {
+        'flavor': 'Marlin',
+        'time': '2432',
+        'filament_used': '2.02409m',
+        'layer_height': '0.2',
+        'minx': '86.84',
+        'miny': '101.226',
+        'minz': '0.2',
+        'maxx': '140.428',
+        'maxy': '130.771',
+        'maxz': '33',
+        'machine_name': 'ELEGOO NEPTUNE 4 Pro',
+    }
+    """
+
+    # Lowercase comment key (text between ";" and ":") -> param name, built once
+    KEY_INDEX: dict[str, str] = {key: param for param_mapping in PARAM_MAPPINGS.values()
+                                 for key, param in param_mapping.items()}
+
+    def __init__(self, params: Optional[Iterable[str]] = None):
+        """
+        :param params: Param names to look for (parsing is done once all are found), defaults to all known params
+        """
+        self.params: dict[str, str] = {}
+        self._missing: set[str] = set(params) if params is not None else set(self.KEY_INDEX.values())
+        self._index: dict[str, str] = {key: param for key, param in self.KEY_INDEX.items() if param in self._missing}
+        self.header_end_found: bool = False
+
+    @property
+    def done(self) -> bool:
+        """
+        Whether parsing is finished (all params found or end of header reached)
+        """
+        return self.header_end_found or not self._missing
+
+    def feed_line(self, line: str) -> bool:
+        """
+        Parse a single line
+        :return: Whether parsing is done
+        """
+        if line.startswith(";"):
+            if line.startswith(self.HEADER_END):
+                self.header_end_found = True
+            else:
+                separator: int = line.find(":")
+                if separator > 0:
+                    param: Optional[str] = self._index.get(line[1:separator].lower())
+                    if param is not None:
+                        self.params[param] = line[separator + 1:]
+                        self._missing.discard(param)
+        return self.done
+
+    def feed_segment(self, segment: str) -> bool:
+        """
+        Parse all lines of a G-code segment (stops early if done)
+        :return: Whether parsing is done
+        """
+        for line in segment.splitlines():
+            if self.feed_line(line):
+                break
+        return self.done
+
+    @classmethod
+    def parse(cls, segments: Iterable[str], params: Optional[Iterable[str]] = None) -> dict[str, str]:
+        """
+        Parse params from G-code segments until all params are found or the header ends
+        :param segments: G-code segments (or lines)
+        :param params: Param names to look for, defaults to all known params
+        :return: Found params
+        """
+        parser: GCodeHeaderParser = cls(params=params)
+        for segment in segments:
+            if parser.feed_segment(segment):
+                break
+        return parser.params
@@ -0,0 +1,84 @@
+# Copyright (c) 2023 - 2024 Molodos
+# The ElegooNeptuneThumbnails plugin is released under the terms of the AGPLv3 or higher.
+
+from typing import Iterable
+
+from .printer_profiles import PrinterProfiles
+
+
+class GCodeSplicer:
+    """
+    In-place editing of G-code segment lists (only touches the header region, layer segments are never copied)
+    """
+
+    @classmethod
+    def splice_prefixes(cls, segments: list[str], prefixes: list[str], header_length: int,
+                        thumbnail_segments: Iterable[int] = ()) -> None:
+        """
+        Replace existing thumbnail segments in the header region and insert new prefixes at the start of the list
+        :param segments: G-code segments (modified in place)
+        :param prefixes: Segments to insert at index 0
+        :param header_length: Amount of segments in the header region (everything up to the end of the header)
+        :param thumbnail_segments: Indices of existing thumbnail segments (must be in the header region)
+        """
+        removed: set[int] = set(thumbnail_segments)
+        header: list[str] = [segment for i, segment in enumerate(segments[:header_length]) if i not in removed]
+
+        # A single slice assignment, the list tail only moves if the header region changes in size
+        segments[0:header_length] = prefixes + header
+
+
+class ThumbnailSegmentDetector:
+    """
+    Single pass detection of thumbnail segments in the header region (thumbnails are inserted as one segment per
+    image, other versions inserted one segment per line or per prefix)
+    """
+
+    # Printer thumbnail lines contain the image type of a layout or are the footer, old format rows and the ColPic
+    # padding only count directly after them
+    LINE_MARKERS: tuple[str, ...] = (";Thumbnail generated by the ",)
+    OLD_FORMAT_ROW: str = "M10086 ;"
+    KLIPPER_BEGIN: str = "; thumbnail begin "
+    KLIPPER_END: str = "; thumbnail end"
+
+    def __init__(self, thumbnails_enabled: bool, klipper_thumbnails_enabled: bool):
+        """
+        :param thumbnails_enabled: Whether to detect printer thumbnails
+        :param klipper_thumbnails_enabled: Whether to detect klipper thumbnails
+        """
+        self._thumbnails_enabled: bool = thumbnails_enabled
+        self._klipper_thumbnails_enabled: bool = klipper_thumbnails_enabled
+        self._in_klipper_block: bool = False
+        self._previous_printer_thumbnail: bool = False
+        # Image types of all printers, the previous save may have been for another printer
+        self._printer_markers: tuple[str, ...] = tuple(sorted(
+            {f";{img_type}:" for layout in PrinterProfiles.layouts().values() for *_, img_type in layout})) \
+            + self.LINE_MARKERS
+
+    def feed_segment(self, segment: str) -> bool:
+        """
+        Check the next segment of the header region
+        :return: Whether the segment is a thumbnail segment to be replaced
+        """
+        # Klipper blocks span multiple segments, their lines are only recognizable by the block around them
+        klipper: bool = self._in_klipper_block or self.KLIPPER_BEGIN in segment
+        if klipper:
+            end: int = segment.rfind(self.KLIPPER_END)
+            self._in_klipper_block = segment.rfind(self.KLIPPER_BEGIN) > end or (self._in_klipper_block and end < 0)
+        printer: bool = self._is_printer_thumbnail(segment)
+        self._previous_printer_thumbnail = printer
+        if self._thumbnails_enabled and printer:
+            return True
+        return self._klipper_thumbnails_enabled and klipper
+
+    def _is_printer_thumbnail(self, segment: str) -> bool:
+        """
+        Check whether a segment contains printer thumbnails
+        """
+        if any(marker in segment for marker in self._printer_markers):
+            return True
+        if not self._previous_printer_thumbnail:
+            return False
+        # Old format rows and the padding line after ColPic thumbnails
+        return segment.startswith(self.OLD_FORMAT_ROW) or (
+                segment.startswith(";0") and not segment.rstrip()[1:].strip("0"))
@@ -220,6 +220,51 @@ Window
                 }
             }
 
+            // Settings item: Encoding timeout
+            RowLayout
+            {
+                spacing: UM.Theme.getSize("wide_margin").width
+                width: parent.width
+
+                // Name
+                UM.Label
+                {
+                    text: "Encoding timeout"
+                    elide: Text.ElideRight
+                    Layout.minimumWidth: 150 * screenScaleFactor
+                    Layout.maximumWidth: 150 * screenScaleFactor
+                    Layout.fillWidth: true
+                }
+
+                // Setting
+                ComboBox {
+                    objectName: "encodingTimeout"
+                    Layout.minimumWidth: 200 * screenScaleFactor
+                    Layout.maximumWidth: 200 * screenScaleFactor
+                    currentIndex: settings.selected_encoding_timeout
+                    model: settings.encoding_timeout_list
+                    onCurrentIndexChanged: settings.select_encoding_timeout(currentIndex)
+                }
+            }
+
+            // Settings item: Parallel encoding
+            RowLayout
+            {
+                spacing: UM.Theme.getSize("wide_margin").width
+                width: parent.width
+
+                // Checkbox
+                UM.CheckBox
+                {
+                    id: parallelEncoding
+                    objectName: "parallelEncoding"
+                    checked: settings.parallel_encoding
+                    onClicked: settings.set_parallel_encoding(parallelEncoding.checked)
+                    text: "Encode thumbnails in parallel"
+                    tooltip: "Encode the thumbnail sizes at the same time on multiple CPU cores"
+                }
+            }
+
             // Settings item: Enable statistics
             RowLayout
             {
@@ -237,6 +282,45 @@ Window
                     tooltip: "Statistics will help to improve the plugin in the future"
                 }
             }
+
+            // Settings item: Record save timings
+            RowLayout
+            {
+                spacing: UM.Theme.getSize("wide_margin").width
+                width: parent.width
+
+                // Checkbox
+                UM.CheckBox
+                {
+                    id: timingsEnabled
+                    objectName: "timingsEnabled"
+                    checked: settings.timings_enabled
+                    onClicked: settings.set_timings_enabled(timingsEnabled.checked)
+                    text: "Record save timings"
+                    tooltip: "Log the duration of every thumbnail generation step and show the recent ones below"
+                }
+
+                // Clear button
+                Cura.TertiaryButton
+                {
+                    visible: timingsEnabled.checked
+                    text: "Clear"
+                    onClicked: settings.clear_timings()
+                }
+            }
+
+            // Recent save timings
+            UM.Label
+            {
+                objectName: "saveTimings"
+                visible: timingsEnabled.checked
+                text: settings.timings_summary
+                font: UM.Theme.getFont("small")
+                wrapMode: Text.NoWrap
+                clip: true
+                Layout.maximumWidth: 420 * screenScaleFactor
+                Layout.maximumHeight: 150 * screenScaleFactor
+            }
         }
 
         // Thumbnail title
@@ -278,6 +362,7 @@ Window
                 objectName: "thumbnailPreview"
                 anchors.fill: parent
                 source: "../img/bg_new.png"
+                cache: false
                 fillMode: Image.PreserveAspectFit
             }
         }
@@ -0,0 +1,54 @@
+# Copyright (c) 2023 - 2024 Molodos
+# The ElegooNeptuneThumbnails plugin is released under the terms of the AGPLv3 or higher.
+
+import os
+from threading import Lock
+from typing import Optional
+
+from PyQt6.QtGui import QImage
+
+
+class ImageCache:
+    """
+    Process-wide cache of decoded images (keyed by path and modification time)
+    """
+
+    IMAGE_FORMAT: QImage.Format = QImage.Format.Format_RGBA8888
+
+    _images: dict[str, tuple[float, QImage]] = {}
+    _lock: Lock = Lock()
+
+    @classmethod
+    def get_image(cls, image_path: str) -> QImage:
+        """
+        Get a decoded image, only reads the file if it is not cached yet or has changed on disk
+        :param image_path: Path of the image
+        :return: The image (shared, must not be painted on)
+        """
+        try:
+            modified: float = os.path.getmtime(image_path)
+        except OSError:
+            # Missing files are not cached (results in a null image like loading it directly)
+            return QImage(image_path)
+
+        with cls._lock:
+            cached: Optional[tuple[float, QImage]] = cls._images.get(image_path)
+            if cached and cached[0] == modified:
+                return cached[1]
+
+        image: QImage = QImage(image_path).convertToFormat(cls.IMAGE_FORMAT)
+        with cls._lock:
+            cls._images[image_path] = (modified, image)
+        return image
+
+    @classmethod
+    def invalidate(cls, image_path: Optional[str] = None) -> None:
+        """
+        Drop cached images
+        :param image_path: Path of the image to drop (drops all images if not set)
+        """
+        with cls._lock:
+            if image_path is None:
+                cls._images.clear()
+            else:
+                cls._images.pop(image_path, None)
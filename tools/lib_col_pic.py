@@ -1,13 +1,51 @@
 # Copyright (c) 2023 - 2024 Molodos
 # The ElegooNeptuneThumbnails plugin is released under the terms of the AGPLv3 or higher.
 
-def ColPic_EncodeStr(fromcolor16, picw, pich, outputdata: bytearray, outputmaxtsize, colorsmax):
+import os
+import warnings
+from array import array
+from collections import Counter
+from itertools import compress, islice
+from operator import ne
+
+try:
+    from . import lib_col_pic_numpy
+except ImportError:
+    # NumPy is not available in every Cura build, fall back to the pure Python encoder
+    lib_col_pic_numpy = None
+
+try:
+    from . import lib_col_pic_native
+except ImportError:
+    # The native encoder is only available if its library was built for this platform (python -m build_native)
+    lib_col_pic_native = None
+
+# Backends in order of preference, the first available one is used unless one is forced with the environment variable
+# (e.g. ELEGOO_NEPTUNE_THUMBNAILS_COL_PIC_BACKEND=python for benchmarks)
+BACKENDS = ["native", "numpy", "python"]
+BACKEND_ENV_VAR = "ELEGOO_NEPTUNE_THUMBNAILS_COL_PIC_BACKEND"
+
+# Weights of the red, green and blue channel differences (on the 5/6/5 bit channels) in the distance used to merge
+# excess colors into kept ones, e.g. (2, 1, 2) compares the channels on the same scale (reference: (1, 1, 1))
+CHANNEL_WEIGHTS = (1, 1, 1)
+
+# Bucket size of the grid over the red, green and blue channels that is searched for the nearest kept color
+GRID_BUCKET_SIZE = (4, 8, 4)
+
+
+def ColPic_EncodeStr(fromcolor16, picw, pich, outputdata: bytearray, outputmaxtsize, colorsmax,
+                     weights=CHANNEL_WEIGHTS):
+    return _encode_str(fromcolor16, picw, pich, outputdata, outputmaxtsize, colorsmax, weights)
+
+
+def ColPic_EncodeStr_Python(fromcolor16, picw, pich, outputdata: bytearray, outputmaxtsize, colorsmax,
+                            weights=CHANNEL_WEIGHTS):
     qty = 0
     temp = 0
     strindex = 0
     hexindex = 0
     TempBytes = bytearray(4)
-    qty = ColPicEncode(fromcolor16, picw, pich, outputdata, outputmaxtsize, colorsmax)
+    qty = ColPicEncode(fromcolor16, picw, pich, outputdata, outputmaxtsize, colorsmax, weights)
     if qty == 0:
         return 0
     temp = 3 - qty % 3
@@ -53,59 +91,43 @@ def ColPic_EncodeStr(fromcolor16, picw, pich, outputdata: bytearray, outputmaxts
     return qty
 
 
-def ColPicEncode(fromcolor16, picw, pich, outputdata: bytearray, outputmaxtsize, colorsmax):
-    l0 = U16HEAD()
+def ColPicEncode(fromcolor16, picw, pich, outputdata: bytearray, outputmaxtsize, colorsmax, weights=CHANNEL_WEIGHTS):
     Head0 = ColPicHead3()
-    Listu16 = []
-    for i in range(1024):
-        Listu16.append(U16HEAD())
-
-    ListQty = 0
     enqty = 0
     dotsqty = picw * pich
     if colorsmax > 1024:
         colorsmax = 1024
-    for i in range(dotsqty):
-        ListQty = ADList0(fromcolor16[i], Listu16, ListQty, 1024)
-
-    for index in range(1, ListQty):
-        l0 = Listu16[index]
-        for i in range(index):
-            if l0.qty >= Listu16[i].qty:
-                aListu16 = bListu16 = Listu16.copy()
-                for j in range(index - i):
-                    Listu16[i + j + 1] = aListu16[i + j]
-
-                Listu16[i] = l0
-                break
 
-    while ListQty > colorsmax:
-        l0 = Listu16[ListQty - 1]
-        minval = 255
-        fid = -1
-        for i in range(colorsmax):
-            cha0 = Listu16[i].A0 - l0.A0
-            if cha0 < 0:
-                cha0 = 0 - cha0
-            cha1 = Listu16[i].A1 - l0.A1
-            if cha1 < 0:
-                cha1 = 0 - cha1
-            cha2 = Listu16[i].A2 - l0.A2
-            if cha2 < 0:
-                cha2 = 0 - cha2
-            chall = cha0 + cha1 + cha2
-            if chall < minval:
-                minval = chall
-                fid = i
+    # Palette as parallel columns in first appearance order, counting stops as soon as 1024 distinct colors have been
+    # seen (the pixels after that are not counted)
+    pixels = fromcolor16[:dotsqty]
+    Listu16 = array("H", dict.fromkeys(pixels))
+    if len(Listu16) >= 1024:
+        del Listu16[1024:]
+        pixels = pixels[:pixels.index(Listu16[-1]) + 1]
+    counted = Counter(pixels)
+    counts = array("I", [counted[color] for color in Listu16])
+    ListQty = len(Listu16)
 
-        for i in range(dotsqty):
-            if fromcolor16[i] == l0.colo16:
-                fromcolor16[i] = Listu16[fid].colo16
+    # Sort by count once (stable, ties are ordered by last first appearance)
+    order = sorted(range(ListQty - 1, -1, -1), key=counts.__getitem__, reverse=True)
+    Listu16 = array("H", [Listu16[i] for i in order])
+    counts = array("I", [counts[i] for i in order])
+    A0 = array("B", [color >> 11 & 31 for color in Listu16])
+    A1 = array("B", [(color & 2016) >> 5 for color in Listu16])
+    A2 = array("B", [color & 31 for color in Listu16])
 
-        ListQty = ListQty - 1
+    # Merge excess colors into their nearest kept color, all of them are looked up at once and the pixels are remapped
+    # through a single lookup table
+    if ListQty > colorsmax:
+        remap = array("H", range(65536))
+        for i, fid in enumerate(_nearest_kept_colors(A0, A1, A2, colorsmax, ListQty, weights), colorsmax):
+            remap[Listu16[i]] = Listu16[fid]
+        for i in range(dotsqty):
+            fromcolor16[i] = remap[fromcolor16[i]]
+        ListQty = colorsmax
 
-    for n in range(len(outputdata)):
-        outputdata[n] = 0
+    outputdata[0:len(outputdata)] = bytes(len(outputdata))
 
     Head0.encodever = 3
     Head0.oncelistqty = 0
@@ -122,8 +144,8 @@ def ColPicEncode(fromcolor16, picw, pich, outputdata: bytearray, outputmaxtsize,
     outputdata[19] = (ListQty * 2 & 4278190080) >> 24
     sizeofColPicHead3 = 32
     for i in range(ListQty):
-        outputdata[sizeofColPicHead3 + i * 2 + 1] = (Listu16[i].colo16 & 65280) >> 8
-        outputdata[sizeofColPicHead3 + i * 2 + 0] = Listu16[i].colo16 & 255
+        outputdata[sizeofColPicHead3 + i * 2 + 1] = (Listu16[i] & 65280) >> 8
+        outputdata[sizeofColPicHead3 + i * 2 + 0] = Listu16[i] & 255
 
     enqty = Byte8bitEncode(fromcolor16, sizeofColPicHead3, Head0.ListDataSize >> 1, dotsqty, outputdata,
                            sizeofColPicHead3 + Head0.ListDataSize,
@@ -146,108 +168,95 @@ def ColPicEncode(fromcolor16, picw, pich, outputdata: bytearray, outputmaxtsize,
     return sizeofColPicHead3 + Head0.ListDataSize + Head0.ColorDataSize
 
 
-def ADList0(val, Listu16, ListQty, maxqty):
-    qty = ListQty
-    if qty >= maxqty:
-        return ListQty
-    for i in range(qty):
-        if Listu16[i].colo16 == val:
-            Listu16[i].qty += 1
-            return ListQty
+def _nearest_kept_colors(A0, A1, A2, keptqty, listqty, weights):
+    """
+    Find the nearest kept palette entry (the first keptqty entries) for every excess entry up to listqty, returns their
+    indices (the kept entries are bucketed on a grid over the channels that is searched outwards from each excess
+    color, equally near entries resolve to the first one like a linear scan)
+    """
+    size0, size1, size2 = GRID_BUCKET_SIZE
+    w0, w1, w2 = weights
 
-    A0 = val >> 11 & 31
-    A1 = (val & 2016) >> 5
-    A2 = val & 31
-    Listu16[qty].colo16 = val
-    Listu16[qty].A0 = A0
-    Listu16[qty].A1 = A1
-    Listu16[qty].A2 = A2
-    Listu16[qty].qty = 1
-    ListQty = qty + 1
-    return ListQty
+    # With few kept colors most buckets are empty, comparing to all kept colors is faster then
+    if keptqty * 4 < (32 // size0) * (64 // size1) * (32 // size2):
+        return [min(range(keptqty), key=lambda i: w0 * abs(A0[i] - A0[l0]) + w1 * abs(A1[i] - A1[l0])
+                    + w2 * abs(A2[i] - A2[l0]), default=-1) for l0 in range(keptqty, listqty)]
 
+    grid = {}
+    for i in range(keptqty):
+        grid.setdefault((A0[i] // size0, A1[i] // size1, A2[i] // size2), []).append(i)
+    maxring = max(32 // size0, 64 // size1, 32 // size2)
 
-def Byte8bitEncode(fromcolor16, listu16Index, listqty, dotsqty, outputdata: bytearray, outputdataIndex, decMaxBytesize):
-    listu16 = outputdata
-    dots = 0
-    srcindex = 0
-    decindex = 0
-    lastid = 0
-    temp = 0
-    while dotsqty > 0:
-        dots = 1
-        for i in range(dotsqty - 1):
-            if fromcolor16[srcindex + i] != fromcolor16[srcindex + i + 1]:
-                break
-            dots += 1
-            if dots == 255:
+    nearest = []
+    for l0 in range(keptqty, listqty):
+        a0, a1, a2 = A0[l0], A1[l0], A2[l0]
+        b0, b1, b2 = a0 // size0, a1 // size1, a2 // size2
+        fid = -1
+        minval = 0
+        ring = 0
+        while ring <= maxring:
+            # Buckets with a distance of exactly ring buckets (in any channel) from the bucket of the color
+            for d0 in range(-ring, ring + 1):
+                for d1 in range(-ring, ring + 1):
+                    shell = ring == 0 or abs(d0) == ring or abs(d1) == ring
+                    for d2 in range(-ring, ring + 1) if shell else (-ring, ring):
+                        for i in grid.get((b0 + d0, b1 + d1, b2 + d2), ()):
+                            chall = w0 * abs(A0[i] - a0) + w1 * abs(A1[i] - a1) + w2 * abs(A2[i] - a2)
+                            if fid < 0 or chall < minval or (chall == minval and i < fid):
+                                minval = chall
+                                fid = i
+            ring += 1
+            # Colors in the next ring differ by at least (ring - 1) * bucket size + 1 in one of the channels
+            if fid >= 0 and minval < min(w0 * ((ring - 1) * size0 + 1), w1 * ((ring - 1) * size1 + 1),
+                                         w2 * ((ring - 1) * size2 + 1)):
                 break
+        nearest.append(fid)
+    return nearest
 
-        temp = 0
-        for i in range(listqty):
-            aa = listu16[i * 2 + 1 + listu16Index] << 8
-            aa |= listu16[i * 2 + 0 + listu16Index]
-            if aa == fromcolor16[srcindex]:
-                temp = i
-                break
 
-        tid = int(temp % 32)
-        if tid > 255:
-            tid = 255
-        sid = int(temp / 32)
-        if sid > 255:
-            sid = 255
-        if lastid != sid:
-            if decindex >= decMaxBytesize:
-                dotsqty = 0
-                break
-            outputdata[decindex + outputdataIndex] = 7
-            outputdata[decindex + outputdataIndex] <<= 5
-            outputdata[decindex + outputdataIndex] += sid
-            decindex += 1
-            lastid = sid
-        if dots <= 6:
-            if decindex >= decMaxBytesize:
-                dotsqty = 0
-                break
-            aa = dots
-            if aa > 255:
-                aa = 255
-            outputdata[decindex + outputdataIndex] = aa
-            outputdata[decindex + outputdataIndex] <<= 5
-            outputdata[decindex + outputdataIndex] += tid
-            decindex += 1
-        else:
-            if decindex >= decMaxBytesize:
-                dotsqty = 0
-                break
-            outputdata[decindex + outputdataIndex] = 0
-            outputdata[decindex + outputdataIndex] += tid
-            decindex += 1
-            if decindex >= decMaxBytesize:
-                dotsqty = 0
-                break
-            aa = dots
-            if aa > 255:
-                aa = 255
-            outputdata[decindex + outputdataIndex] = aa
-            decindex += 1
-        srcindex += dots
-        dotsqty -= dots
+def Byte8bitEncode(fromcolor16, listu16Index, listqty, dotsqty, outputdata: bytearray, outputdataIndex, decMaxBytesize):
+    """
+    Run-length encode palette indices in a single pass over the pixels, returns the amount of bytes written
+    """
+    if dotsqty <= 0 or decMaxBytesize <= 0:
+        return 0
 
-    return decindex
+    # Palette index of every RGB565 color, built once per image (the first palette entry of a color wins like a
+    # linear search, colors missing in the palette are encoded as index 0)
+    index_table = array("H", bytes(2 * 65536))
+    for i in range(listqty - 1, -1, -1):
+        index_table[outputdata[listu16Index + i * 2] | outputdata[listu16Index + i * 2 + 1] << 8] = i
 
+    # Start of every run of equal colors (compared pairwise while streaming over the pixels)
+    pixels = fromcolor16[:dotsqty]
+    starts = [0]
+    starts += compress(range(1, dotsqty), map(ne, pixels, islice(pixels, 1, None)))
+    starts.append(dotsqty)
 
-class U16HEAD:
+    # Each run (split into pieces of at most 255 pixels) emits an optional palette page switch, then either 1 short
+    # or 2 long bytes
+    encoded = bytearray()
+    lastid = 0
+    for srcindex, runend in zip(starts, islice(starts, 1, None)):
+        temp = index_table[pixels[srcindex]]
+        sid = temp >> 5
+        tid = temp & 31
+        while srcindex < runend:
+            dots = min(runend - srcindex, 255)
+            if lastid != sid:
+                encoded.append(224 + sid)
+                lastid = sid
+            if dots <= 6:
+                encoded.append((dots << 5) + tid)
+            else:
+                encoded.append(tid)
+                encoded.append(dots)
+            srcindex += dots
 
-    def __init__(self):
-        self.colo16 = 0
-        self.A0 = 0
-        self.A1 = 0
-        self.A2 = 0
-        self.res0 = 0
-        self.res1 = 0
-        self.qty = 0
+    # Write (truncated at the maximum size like writing byte by byte would)
+    decindex = min(len(encoded), decMaxBytesize)
+    outputdata[outputdataIndex:outputdataIndex + decindex] = encoded[:decindex]
+    return decindex
 
 
 class ColPicHead3:
@@ -263,3 +272,49 @@ class ColPicHead3:
         self.ColorDataSize = 0
         self.res1 = 0
         self.res2 = 0
+
+
+def _probe(encode):
+    """
+    Check whether a backend encodes a test image (with long runs and merged colors) like the pure Python encoder
+    """
+    pixels = array("H", [4660] * 300 + [(i * 7919) % 65536 for i in range(200)] + [i % 9 for i in range(76)])
+    expected = bytearray(len(pixels) * 10)
+    actual = bytearray(len(pixels) * 10)
+    try:
+        return (encode(array("H", pixels), 24, 24, actual, len(actual), 64) ==
+                ColPic_EncodeStr_Python(array("H", pixels), 24, 24, expected, len(expected), 64) and actual == expected)
+    except Exception:
+        return False
+
+
+def _available_backends():
+    """
+    Available ColPic_EncodeStr implementations by name (the native one only if it passes the probe)
+    """
+    available = {"python": ColPic_EncodeStr_Python}
+    if lib_col_pic_numpy is not None:
+        available["numpy"] = lib_col_pic_numpy.ColPic_EncodeStr
+    if lib_col_pic_native is not None and _probe(lib_col_pic_native.ColPic_EncodeStr):
+        available["native"] = lib_col_pic_native.ColPic_EncodeStr
+    return available
+
+
+def _select_backend(available):
+    """
+    Select the ColPic_EncodeStr implementation, returns its name and the implementation (warns and uses the preferred
+    one if the backend forced with the environment variable is not available)
+    """
+    forced = os.environ.get(BACKEND_ENV_VAR, "").strip().lower()
+    if forced in available:
+        return forced, available[forced]
+    if forced:
+        warnings.warn(f"ColPic backend {forced!r} set in {BACKEND_ENV_VAR} is not available (available: "
+                      f"{', '.join(available)}), using the preferred one", RuntimeWarning)
+    backend = next(backend for backend in BACKENDS if backend in available)
+    return backend, available[backend]
+
+
+_backends = _available_backends()
+AVAILABLE_BACKENDS = [backend for backend in BACKENDS if backend in _backends]
+BACKEND, _encode_str = _select_backend(_backends)
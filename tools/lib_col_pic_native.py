@@ -0,0 +1,55 @@
+# Copyright (c) 2023 - 2024 Molodos
+# The ElegooNeptuneThumbnails plugin is released under the terms of the AGPLv3 or higher.
+
+"""
+Native implementation of the ColPic encoder (same contract and output as lib_col_pic), loaded with ctypes from the
+shared library built from native/col_pic.c (raises ImportError if the library is missing or can't be loaded)
+"""
+
+import ctypes
+import sys
+from array import array
+from os import path
+
+LIBRARY_SUFFIX: str = ".dll" if sys.platform == "win32" else ".dylib" if sys.platform == "darwin" else ".so"
+LIBRARY_PATH: str = path.join(path.dirname(path.realpath(__file__)), "native", f"col_pic{LIBRARY_SUFFIX}")
+CHANNEL_WEIGHTS: tuple[int, int, int] = (1, 1, 1)  # Red, green and blue weights of the color distance
+
+try:
+    _library: ctypes.CDLL = ctypes.CDLL(LIBRARY_PATH)
+    _encode_str = _library.col_pic_encode_str
+except (OSError, AttributeError) as e:
+    raise ImportError(f"Native ColPic encoder is not available: {e}") from e
+_encode_str.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_int, ctypes.c_void_p, ctypes.c_int64, ctypes.c_int64,
+                        ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int]
+_encode_str.restype = ctypes.c_int64
+
+_ERROR_OUTPUT_TOO_SMALL: int = -1
+_ERROR_NO_MEMORY: int = -2
+
+
+def ColPic_EncodeStr(fromcolor16, picw, pich, outputdata: bytearray, outputmaxtsize, colorsmax,
+                     weights=CHANNEL_WEIGHTS):
+    """
+    Encode RGB565 pixels to the ColPic string format (drop-in for lib_col_pic.ColPic_EncodeStr, encodes a copy of the
+    pixels and releases the GIL while encoding)
+    """
+    dotsqty: int = picw * pich
+    if dotsqty < 0 or len(fromcolor16) < dotsqty or outputmaxtsize > len(outputdata):
+        raise IndexError("array index out of range")
+    if colorsmax < 1:
+        raise ValueError(f"Invalid palette size {colorsmax}")
+    pixels: array = array("H", fromcolor16[:dotsqty])
+    pixels_address: int = pixels.buffer_info()[0]
+    output: ctypes.Array = (ctypes.c_char * len(outputdata)).from_buffer(outputdata)
+    try:
+        qty: int = _encode_str(pixels_address, picw, pich, output, len(outputdata), outputmaxtsize, colorsmax,
+                               *weights)
+    finally:
+        # Release the export of the bytearray (it can't be resized while exported)
+        del output
+    if qty == _ERROR_OUTPUT_TOO_SMALL:
+        raise IndexError("bytearray index out of range")
+    if qty == _ERROR_NO_MEMORY:
+        raise MemoryError("Native ColPic encoder is out of memory")
+    return qty
@@ -0,0 +1,150 @@
+# Copyright (c) 2023 - 2024 Molodos
+# The ElegooNeptuneThumbnails plugin is released under the terms of the AGPLv3 or higher.
+
+"""
+NumPy implementation of the ColPic encoder (same contract and output as lib_col_pic)
+"""
+
+import numpy
+
+SIZE_OF_COL_PIC_HEAD_3: int = 32
+MAX_PALETTE_SIZE: int = 1024
+MAX_RUN_LENGTH: int = 255
+CHANNEL_WEIGHTS: tuple[int, int, int] = (1, 1, 1)  # Red, green and blue weights of the color distance
+
+
+def ColPic_EncodeStr(fromcolor16, picw, pich, outputdata: bytearray, outputmaxtsize, colorsmax,
+                     weights=CHANNEL_WEIGHTS):
+    """
+    Encode RGB565 pixels to the ColPic string format (drop-in for lib_col_pic.ColPic_EncodeStr)
+    """
+    qty = ColPicEncode(fromcolor16, picw, pich, outputdata, outputmaxtsize, colorsmax, weights)
+    if qty == 0:
+        return 0
+
+    # Pad to a multiple of 3 bytes (the reference implementation always adds 1-3 bytes, which are already zero)
+    qty = min(qty + 3 - qty % 3, max(qty, outputmaxtsize))
+    if qty * 4 / 3 >= outputmaxtsize:
+        return 0
+
+    # Split every 3 bytes into 4 groups of 6 bits and map them to printable characters
+    data: numpy.ndarray = numpy.frombuffer(outputdata, dtype=numpy.uint8, count=qty).reshape(-1, 3)
+    chars: numpy.ndarray = numpy.empty((data.shape[0], 4), dtype=numpy.uint8)
+    chars[:, 0] = data[:, 0] >> 2
+    chars[:, 1] = ((data[:, 0] & 3) << 4) + (data[:, 1] >> 4)
+    chars[:, 2] = ((data[:, 1] & 15) << 2) + (data[:, 2] >> 6)
+    chars[:, 3] = data[:, 2] & 63
+    chars += 48
+    chars[chars == ord("\\")] = 126
+    outputdata[0:chars.size] = chars.tobytes()
+
+    qty = qty * 4 / 3
+    outputdata[int(qty)] = 0
+    return qty
+
+
+def ColPicEncode(fromcolor16, picw, pich, outputdata: bytearray, outputmaxtsize, colorsmax, weights=CHANNEL_WEIGHTS):
+    """
+    Build the palette and header and run-length encode the pixels, returns the amount of bytes written
+    """
+    dotsqty: int = picw * pich
+    pixels: numpy.ndarray = numpy.asarray(fromcolor16, dtype=numpy.uint16)[:dotsqty]
+    if colorsmax > MAX_PALETTE_SIZE:
+        colorsmax = MAX_PALETTE_SIZE
+
+    # Histogram colors, the reference stops counting as soon as 1024 distinct colors have been seen
+    colors, first_index = numpy.unique(pixels, return_index=True)
+    if colors.size >= MAX_PALETTE_SIZE:
+        last_counted: int = int(numpy.sort(first_index)[MAX_PALETTE_SIZE - 1])
+        colors, first_index, counts = numpy.unique(pixels[:last_counted + 1], return_index=True, return_counts=True)
+    else:
+        colors, first_index, counts = numpy.unique(pixels, return_index=True, return_counts=True)
+
+    # Sort by frequency, ties are ordered by last first appearance (matches the reference insertion sort)
+    order: numpy.ndarray = numpy.lexsort((first_index, counts))[::-1]
+    palette: numpy.ndarray = colors[order]
+
+    # Merge excess colors into their nearest kept color in one pass
+    if palette.size > colorsmax:
+        kept: numpy.ndarray = palette[:colorsmax]
+        excess: numpy.ndarray = palette[colorsmax:]
+        distances: numpy.ndarray = _channel_distances(excess, kept, weights)
+        remap: numpy.ndarray = numpy.arange(65536, dtype=numpy.uint16)
+        remap[excess] = kept[numpy.argmin(distances, axis=1)]
+        pixels = remap[pixels]
+        palette = kept
+
+    # Write header and palette
+    list_qty: int = int(palette.size)
+    list_data_size: int = list_qty * 2
+    if len(outputdata) < SIZE_OF_COL_PIC_HEAD_3 + list_data_size:
+        raise IndexError("bytearray index out of range")
+    outputdata[0:len(outputdata)] = bytes(len(outputdata))
+    outputdata[0] = 3
+    outputdata[12:16] = (98419516).to_bytes(4, "little")
+    outputdata[16:20] = (list_data_size & 0xFFFFFFFF).to_bytes(4, "little")
+    outputdata[SIZE_OF_COL_PIC_HEAD_3:SIZE_OF_COL_PIC_HEAD_3 + list_data_size] = \
+        palette.astype("<u2").tobytes()
+
+    # Encode pixel data
+    enqty: int = Byte8bitEncode(pixels, palette, outputdata, SIZE_OF_COL_PIC_HEAD_3 + list_data_size,
+                                outputmaxtsize - SIZE_OF_COL_PIC_HEAD_3 - list_data_size)
+    outputdata[4:8] = (picw & 0xFFFFFFFF).to_bytes(4, "little")
+    outputdata[8:12] = (pich & 0xFFFFFFFF).to_bytes(4, "little")
+    outputdata[20:24] = (enqty & 0xFFFFFFFF).to_bytes(4, "little")
+    return SIZE_OF_COL_PIC_HEAD_3 + list_data_size + enqty
+
+
+def Byte8bitEncode(pixels: numpy.ndarray, palette: numpy.ndarray, outputdata: bytearray, outputdataIndex,
+                   decMaxBytesize):
+    """
+    Run-length encode palette indices with array ops, returns the amount of bytes written
+    """
+    if pixels.size == 0 or decMaxBytesize <= 0:
+        return 0
+
+    # Palette index per pixel (colors missing in the palette fall back to index 0)
+    index_lut: numpy.ndarray = numpy.zeros(65536, dtype=numpy.int64)
+    index_lut[palette] = numpy.arange(palette.size)
+
+    # Find runs of equal colors and split them into runs of at most 255 pixels
+    boundaries: numpy.ndarray = numpy.flatnonzero(pixels[1:] != pixels[:-1]) + 1
+    starts: numpy.ndarray = numpy.concatenate(([0], boundaries))
+    lengths: numpy.ndarray = numpy.diff(numpy.concatenate((starts, [pixels.size])))
+    pieces: numpy.ndarray = (lengths + MAX_RUN_LENGTH - 1) // MAX_RUN_LENGTH
+    piece_run: numpy.ndarray = numpy.repeat(numpy.arange(starts.size), pieces)
+    piece_number: numpy.ndarray = numpy.arange(piece_run.size) - numpy.repeat(numpy.cumsum(pieces) - pieces, pieces)
+    dots: numpy.ndarray = numpy.minimum(lengths[piece_run] - piece_number * MAX_RUN_LENGTH, MAX_RUN_LENGTH)
+    indices: numpy.ndarray = index_lut[pixels[starts[piece_run]]]
+
+    # Each run emits an optional palette page switch, then either 1 short or 2 long bytes
+    sid: numpy.ndarray = indices // 32
+    tid: numpy.ndarray = indices % 32
+    page_switch: numpy.ndarray = sid != numpy.concatenate(([0], sid[:-1]))
+    short: numpy.ndarray = dots <= 6
+    run_bytes: numpy.ndarray = page_switch.astype(numpy.int64) + numpy.where(short, 1, 2)
+    offsets: numpy.ndarray = numpy.cumsum(run_bytes) - run_bytes
+    encoded: numpy.ndarray = numpy.empty(int(run_bytes.sum()), dtype=numpy.uint8)
+    encoded[offsets[page_switch]] = (7 << 5) + sid[page_switch]
+    offsets += page_switch
+    encoded[offsets[short]] = (dots[short] << 5) + tid[short]
+    long: numpy.ndarray = ~short
+    encoded[offsets[long]] = tid[long]
+    encoded[offsets[long] + 1] = dots[long]
+
+    # Write (truncated like the reference implementation)
+    decindex: int = min(encoded.size, decMaxBytesize)
+    outputdata[outputdataIndex:outputdataIndex + decindex] = encoded[:decindex].tobytes()
+    return decindex
+
+
+def _channel_distances(colors: numpy.ndarray, palette: numpy.ndarray,
+                       weights: tuple[int, int, int] = CHANNEL_WEIGHTS) -> numpy.ndarray:
+    """
+    Weighted Manhattan distances between RGB565 colors on their 5/6/5 bit channels
+    """
+    colors = colors.astype(numpy.int32)[:, None]
+    palette = palette.astype(numpy.int32)[None, :]
+    return (weights[0] * numpy.abs((colors >> 11 & 31) - (palette >> 11 & 31))
+            + weights[1] * numpy.abs((colors >> 5 & 63) - (palette >> 5 & 63))
+            + weights[2] * numpy.abs((colors & 31) - (palette & 31)))
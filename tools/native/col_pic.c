@@ -0,0 +1,264 @@
+/*
+ * Copyright (c) 2023 - 2024 Molodos
+ * The ElegooNeptuneThumbnails plugin is released under the terms of the AGPLv3 or higher.
+ *
+ * Native ColPic encoder (same contract and output as lib_col_pic.ColPic_EncodeStr_Python), loaded with ctypes by
+ * tools/lib_col_pic_native.py. Build with: python -m build_native
+ */
+
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+
+#if defined(_WIN32)
+#define EXPORT __declspec(dllexport)
+#else
+#define EXPORT __attribute__((visibility("default")))
+#endif
+
+#define SIZE_OF_COL_PIC_HEAD_3 32
+#define MAX_PALETTE_SIZE 1024
+#define MAX_RUN_LENGTH 255
+#define COLOR_COUNT 65536
+
+/* Errors (raised as exceptions by the ctypes wrapper) */
+#define ERROR_OUTPUT_TOO_SMALL (-1)
+#define ERROR_NO_MEMORY (-2)
+
+typedef struct {
+    uint16_t color;
+    uint32_t count;
+    int first; /* Index in first appearance order */
+} PaletteEntry;
+
+/* Sort by count, ties are ordered by last first appearance (like the insertion sort of the reference) */
+static int compare_entries(const void *a, const void *b) {
+    const PaletteEntry *x = (const PaletteEntry *) a;
+    const PaletteEntry *y = (const PaletteEntry *) b;
+    if (x->count != y->count) {
+        return x->count < y->count ? 1 : -1;
+    }
+    return x->first < y->first ? 1 : -1;
+}
+
+static void write_u32(uint8_t *output, int64_t value) {
+    output[0] = (uint8_t) (value & 255);
+    output[1] = (uint8_t) ((value >> 8) & 255);
+    output[2] = (uint8_t) ((value >> 16) & 255);
+    output[3] = (uint8_t) ((value >> 24) & 255);
+}
+
+static int channel_distance(uint16_t a, uint16_t b, const int *weights) {
+    return weights[0] * abs((a >> 11 & 31) - (b >> 11 & 31)) + weights[1] * abs((a >> 5 & 63) - (b >> 5 & 63))
+           + weights[2] * abs((a & 31) - (b & 31));
+}
+
+/* Run-length encode palette indices, returns the amount of bytes written (at most max_size) */
+static int64_t byte_8bit_encode(const uint16_t *pixels, int64_t dots_qty, const PaletteEntry *palette, int list_qty,
+                                uint8_t *output, int64_t max_size, uint16_t *index_table) {
+    int64_t written = 0;
+    int64_t start = 0;
+    int last_id = 0;
+    int i;
+
+    if (dots_qty <= 0 || max_size <= 0) {
+        return 0;
+    }
+
+    /* Palette index of every color (first entry wins, colors missing in the palette are encoded as index 0) */
+    memset(index_table, 0, COLOR_COUNT * sizeof(uint16_t));
+    for (i = list_qty - 1; i >= 0; i--) {
+        index_table[palette[i].color] = (uint16_t) i;
+    }
+
+    while (start < dots_qty) {
+        uint16_t color = pixels[start];
+        int index = index_table[color];
+        int sid = index >> 5;
+        int tid = index & 31;
+        int64_t end = start + 1;
+        int64_t dots;
+
+        while (end < dots_qty && end - start < MAX_RUN_LENGTH && pixels[end] == color) {
+            end++;
+        }
+        dots = end - start;
+
+        if (last_id != sid) {
+            if (written >= max_size) {
+                return written;
+            }
+            output[written++] = (uint8_t) ((7 << 5) + sid);
+            last_id = sid;
+        }
+        if (dots <= 6) {
+            if (written >= max_size) {
+                return written;
+            }
+            output[written++] = (uint8_t) ((dots << 5) + tid);
+        } else {
+            if (written >= max_size) {
+                return written;
+            }
+            output[written++] = (uint8_t) tid;
+            if (written >= max_size) {
+                return written;
+            }
+            output[written++] = (uint8_t) dots;
+        }
+        start = end;
+    }
+    return written;
+}
+
+/* Build the palette and header and run-length encode the pixels, returns the amount of bytes written */
+static int64_t col_pic_encode(uint16_t *pixels, int pic_w, int pic_h, uint8_t *output, int64_t output_size,
+                              int64_t output_max_size, int colors_max, const int *weights) {
+    int64_t dots_qty = (int64_t) pic_w * pic_h;
+    int16_t *slots = NULL;
+    uint16_t *table = NULL;
+    PaletteEntry palette[MAX_PALETTE_SIZE];
+    int list_qty = 0;
+    int64_t list_data_size;
+    int64_t encoded;
+    int64_t i;
+    int j;
+
+    if (colors_max > MAX_PALETTE_SIZE) {
+        colors_max = MAX_PALETTE_SIZE;
+    }
+    slots = (int16_t *) malloc(COLOR_COUNT * sizeof(int16_t));
+    table = (uint16_t *) malloc(COLOR_COUNT * sizeof(uint16_t));
+    if (slots == NULL || table == NULL) {
+        free(slots);
+        free(table);
+        return ERROR_NO_MEMORY;
+    }
+
+    /* Palette in first appearance order, counting stops as soon as 1024 distinct colors have been seen */
+    memset(slots, 0xFF, COLOR_COUNT * sizeof(int16_t));
+    for (i = 0; i < dots_qty && list_qty < MAX_PALETTE_SIZE; i++) {
+        int16_t slot = slots[pixels[i]];
+        if (slot < 0) {
+            slots[pixels[i]] = (int16_t) list_qty;
+            palette[list_qty].color = pixels[i];
+            palette[list_qty].count = 1;
+            palette[list_qty].first = list_qty;
+            list_qty++;
+        } else {
+            palette[slot].count++;
+        }
+    }
+    qsort(palette, (size_t) list_qty, sizeof(PaletteEntry), compare_entries);
+
+    /* Merge excess colors into their nearest kept color and remap the pixels through one lookup table */
+    if (list_qty > colors_max) {
+        for (i = 0; i < COLOR_COUNT; i++) {
+            table[i] = (uint16_t) i;
+        }
+        for (j = colors_max; j < list_qty; j++) {
+            int nearest = -1;
+            int nearest_distance = 0;
+            int k;
+            for (k = 0; k < colors_max; k++) {
+                int distance = channel_distance(palette[k].color, palette[j].color, weights);
+                if (nearest < 0 || distance < nearest_distance) {
+                    nearest = k;
+                    nearest_distance = distance;
+                }
+            }
+            /* Without kept colors the reference maps to its last palette entry */
+            table[palette[j].color] = palette[nearest < 0 ? list_qty - 1 : nearest].color;
+        }
+        for (i = 0; i < dots_qty; i++) {
+            pixels[i] = table[pixels[i]];
+        }
+        list_qty = colors_max;
+    }
+
+    /* Write header and palette */
+    list_data_size = (int64_t) list_qty * 2;
+    if (output_size < SIZE_OF_COL_PIC_HEAD_3 + list_data_size) {
+        free(slots);
+        free(table);
+        return ERROR_OUTPUT_TOO_SMALL;
+    }
+    memset(output, 0, (size_t) output_size);
+    output[0] = 3;
+    write_u32(output + 12, 98419516);
+    write_u32(output + 16, list_data_size);
+    for (j = 0; j < list_qty; j++) {
+        output[SIZE_OF_COL_PIC_HEAD_3 + j * 2] = (uint8_t) (palette[j].color & 255);
+        output[SIZE_OF_COL_PIC_HEAD_3 + j * 2 + 1] = (uint8_t) (palette[j].color >> 8);
+    }
+
+    /* Encode pixel data */
+    encoded = byte_8bit_encode(pixels, dots_qty, palette, list_qty, output + SIZE_OF_COL_PIC_HEAD_3 + list_data_size,
+                               output_max_size - SIZE_OF_COL_PIC_HEAD_3 - list_data_size, table);
+    write_u32(output + 4, pic_w);
+    write_u32(output + 8, pic_h);
+    write_u32(output + 20, encoded);
+    free(slots);
+    free(table);
+    return SIZE_OF_COL_PIC_HEAD_3 + list_data_size + encoded;
+}
+
+/*
+ * Encode RGB565 pixels to the ColPic string format
+ * pixels: Pixels (dots_qty = pic_w * pic_h values, modified in place if colors are merged)
+ * output: Output buffer of output_size bytes, at most output_max_size bytes are used for the encoded data
+ * weights: Red, green and blue weights of the color distance used to merge excess colors
+ * Returns the length of the encoded string (0 if it doesn't fit) or a negative error
+ */
+EXPORT int64_t col_pic_encode_str(uint16_t *pixels, int pic_w, int pic_h, uint8_t *output, int64_t output_size,
+                                  int64_t output_max_size, int colors_max, int weight_red, int weight_green,
+                                  int weight_blue) {
+    int weights[3];
+    int64_t qty;
+    int64_t hex_index;
+    int64_t str_index;
+    int padding;
+
+    weights[0] = weight_red;
+    weights[1] = weight_green;
+    weights[2] = weight_blue;
+    qty = col_pic_encode(pixels, pic_w, pic_h, output, output_size, output_max_size, colors_max, weights);
+    if (qty <= 0) {
+        return qty;
+    }
+
+    /* Pad with 1 - 3 zero bytes (already zero) to a multiple of 3 */
+    padding = 3 - (int) (qty % 3);
+    while (padding > 0 && qty < output_max_size) {
+        qty++;
+        padding--;
+    }
+    if (qty * 4 >= output_max_size * 3) {
+        return 0;
+    }
+
+    /* Split every 3 bytes into 4 groups of 6 bits and map them to printable characters (backwards, in place) */
+    hex_index = qty;
+    str_index = qty * 4 / 3;
+    while (hex_index > 0) {
+        uint8_t chars[4];
+        int k;
+        hex_index -= 3;
+        str_index -= 4;
+        chars[0] = (uint8_t) (output[hex_index] >> 2);
+        chars[1] = (uint8_t) (((output[hex_index] & 3) << 4) + (output[hex_index + 1] >> 4));
+        chars[2] = (uint8_t) (((output[hex_index + 1] & 15) << 2) + (output[hex_index + 2] >> 6));
+        chars[3] = (uint8_t) (output[hex_index + 2] & 63);
+        for (k = 0; k < 4; k++) {
+            chars[k] += 48;
+            if (chars[k] == '\\') {
+                chars[k] = 126;
+            }
+            output[str_index + k] = chars[k];
+        }
+    }
+
+    qty = qty * 4 / 3;
+    output[qty] = 0;
+    return qty;
+}
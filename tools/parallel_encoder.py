@@ -0,0 +1,121 @@
+# Copyright (c) 2023 - 2024 Molodos
+# The ElegooNeptuneThumbnails plugin is released under the terms of the AGPLv3 or higher.
+
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import CancelledError, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from threading import Event
+from typing import Any, Callable, Optional
+
+EncodingJob = tuple[Callable[..., list[str]], tuple[Any, ...]]
+
+
+class ParallelEncoder:
+    """
+    Runs independent encoding jobs (picklable functions on plain buffers), optionally fanned out to a worker pool
+    """
+
+    MAX_WORKERS: int = 4
+
+    _pool: Optional[Executor] = None
+
+    @classmethod
+    def run_sequential(cls, jobs: list[EncodingJob], durations: Optional[list[float]] = None,
+                       cancelled: Optional[Event] = None) -> list[list[str]]:
+        """
+        Run jobs one after another in this process
+        :param durations: List to append the run time of every job to (seconds, in job order)
+        :param cancelled: Event that stops running further jobs (raises CancelledError)
+        :return: Job results in job order
+        """
+        timed_results: list[tuple[list[str], float]] = []
+        for function, args in jobs:
+            cls._raise_if_cancelled(cancelled)
+            timed_results.append(timed_call(function, args) if durations is not None else (function(*args), 0.0))
+        if durations is None:
+            return [result for result, _ in timed_results]
+        return cls._split_timed(timed_results, durations)
+
+    @classmethod
+    def run_parallel(cls, jobs: list[EncodingJob], durations: Optional[list[float]] = None,
+                     cancelled: Optional[Event] = None) -> list[list[str]]:
+        """
+        Run jobs in the worker pool (runs a single job in the calling thread, raises if the pool fails)
+        :param durations: List to append the run time of every job to (seconds measured in the worker, in job order)
+        :param cancelled: Event that stops waiting for the jobs (drops the pending ones, raises CancelledError)
+        :return: Job results in job order
+        """
+        if len(jobs) < 2:
+            return cls.run_sequential(jobs, durations=durations, cancelled=cancelled)
+        cls._raise_if_cancelled(cancelled)
+        futures: list[Future] = [cls._get_pool().submit(timed_call, function, args) for function, args in jobs]
+        timed_results: list[tuple[list[str], float]] = []
+        for future in futures:
+            timed_results.append(future.result())
+            if cancelled is not None and cancelled.is_set():
+                for pending in futures:
+                    pending.cancel()
+                raise CancelledError()
+        if durations is None:
+            return [result for result, _ in timed_results]
+        return cls._split_timed(timed_results, durations)
+
+    @classmethod
+    def uses_processes(cls) -> bool:
+        """
+        Check if the pool runs worker processes (not in frozen builds, spawned workers would start the whole frozen
+        application again instead of a python interpreter, worker threads are used there)
+        """
+        return not getattr(sys, "frozen", False)
+
+    @classmethod
+    def shutdown(cls) -> None:
+        """
+        Stop the workers
+        """
+        if cls._pool is not None:
+            cls._pool.shutdown(wait=False, cancel_futures=True)
+            cls._pool = None
+
+    @classmethod
+    def _raise_if_cancelled(cls, cancelled: Optional[Event]) -> None:
+        """
+        Raise CancelledError if the event is set
+        """
+        if cancelled is not None and cancelled.is_set():
+            raise CancelledError()
+
+    @classmethod
+    def _split_timed(cls, timed_results: list[tuple[list[str], float]],
+                     durations: list[float]) -> list[list[str]]:
+        """
+        Split timed job results into results and durations
+        """
+        durations.extend(duration for _, duration in timed_results)
+        return [result for result, _ in timed_results]
+
+    @classmethod
+    def _get_pool(cls) -> Executor:
+        """
+        Get the worker pool (created on first use, processes are spawned to not fork the Qt process, worker threads
+        encode in parallel as far as the encoders release the GIL, like the native one does)
+        """
+        if cls._pool is None:
+            workers: int = min(cls.MAX_WORKERS, os.cpu_count() or 1)
+            if cls.uses_processes():
+                cls._pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                cls._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ElegooNeptuneThumbnailsEncoder")
+        return cls._pool
+
+
+def timed_call(function: Callable[..., list[str]], args: tuple[Any, ...]) -> tuple[list[str], float]:
+    """
+    Run a job and measure its run time (module level, so it can be sent to worker processes)
+    :return: Job result and run time in seconds
+    """
+    start: float = time.perf_counter()
+    result: list[str] = function(*args)
+    return result, time.perf_counter() - start
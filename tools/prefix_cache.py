@@ -0,0 +1,74 @@
+# Copyright (c) 2023 - 2024 Molodos
+# The ElegooNeptuneThumbnails plugin is released under the terms of the AGPLv3 or higher.
+
+import hashlib
+from collections import OrderedDict
+from threading import Lock
+from typing import Iterable, Optional, Union
+
+
+class PrefixCache:
+    """
+    LRU cache of finished G-code prefixes, keyed by a hash of everything the thumbnails are rendered from (saving an
+    unchanged slice again, e.g. to another destination, skips rendering and encoding)
+    """
+
+    MAX_ENTRIES: int = 8
+    MAX_SIZE: int = 16 * 1024 * 1024  # Characters of all cached prefixes
+
+    _entries: "OrderedDict[str, list[str]]" = OrderedDict()
+    _size: int = 0
+    _lock: Lock = Lock()
+
+    @classmethod
+    def make_key(cls, parts: Iterable[Union[str, bytes]]) -> str:
+        """
+        Hash the inputs of the thumbnails to a cache key
+        :param parts: Everything the thumbnails depend on (order matters)
+        :return: The key
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        for part in parts:
+            data: bytes = part.encode("utf-8") if isinstance(part, str) else part
+            # Length prefixed, so different splits of the same data don't collide
+            digest.update(len(data).to_bytes(8, "little"))
+            digest.update(data)
+        return digest.hexdigest()
+
+    @classmethod
+    def get(cls, key: str) -> Optional[list[str]]:
+        """
+        Get cached prefixes (marks them as recently used)
+        :return: The prefixes (None if not cached)
+        """
+        with cls._lock:
+            prefixes: Optional[list[str]] = cls._entries.get(key)
+            if prefixes is None:
+                return None
+            cls._entries.move_to_end(key)
+            return list(prefixes)
+
+    @classmethod
+    def put(cls, key: str, prefixes: list[str]) -> None:
+        """
+        Cache prefixes (the least recently used ones are evicted to stay within the limits)
+        """
+        size: int = sum(len(prefix) for prefix in prefixes)
+        if size > cls.MAX_SIZE:
+            return
+        with cls._lock:
+            if key in cls._entries:
+                cls._size -= sum(len(prefix) for prefix in cls._entries.pop(key))
+            while cls._entries and (len(cls._entries) >= cls.MAX_ENTRIES or cls._size + size > cls.MAX_SIZE):
+                cls._size -= sum(len(prefix) for prefix in cls._entries.popitem(last=False)[1])
+            cls._entries[key] = list(prefixes)
+            cls._size += size
+
+    @classmethod
+    def clear(cls) -> None:
+        """
+        Drop all cached prefixes
+        """
+        with cls._lock:
+            cls._entries.clear()
+            cls._size = 0
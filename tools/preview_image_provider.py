@@ -0,0 +1,43 @@
+# Copyright (c) 2023 - 2024 Molodos
+# The ElegooNeptuneThumbnails plugin is released under the terms of the AGPLv3 or higher.
+
+from threading import Lock
+
+from PyQt6.QtCore import QSize
+from PyQt6.QtGui import QImage
+from PyQt6.QtQml import QQmlImageProviderBase
+from PyQt6.QtQuick import QQuickImageProvider
+
+
+class PreviewImageProvider(QQuickImageProvider):
+    """
+    Provides the latest rendered thumbnail preview to QML from memory (image://elegooNeptuneThumbnails/<id>)
+    """
+
+    PROVIDER_ID: str = "elegooNeptuneThumbnails"
+
+    def __init__(self):
+        QQuickImageProvider.__init__(self, QQmlImageProviderBase.ImageType.Image)
+        self._image: QImage = QImage()
+        self._lock: Lock = Lock()
+
+    def set_image(self, image: QImage) -> None:
+        """
+        Replace the provided preview
+        """
+        with self._lock:
+            self._image = image
+
+    def get_url(self, image_id: str) -> str:
+        """
+        Get the url of the preview for QML (use a new id for every preview, so QML reloads it)
+        """
+        return f"image://{self.PROVIDER_ID}/{image_id}"
+
+    def requestImage(self, image_id: str, requested_size: QSize) -> tuple[QImage, QSize]:
+        """
+        Called by QML to load the preview (the id is ignored, the latest preview is always provided)
+        """
+        with self._lock:
+            image: QImage = self._image
+        return image, image.size()
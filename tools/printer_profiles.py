@@ -0,0 +1,170 @@
+# Copyright (c) 2023 - 2024 Molodos
+# The ElegooNeptuneThumbnails plugin is released under the terms of the AGPLv3 or higher.
+
+import json
+import re
+from os import path
+from typing import Any, Optional
+
+# Thumbnail of a layout: (encoding, width, height, image type)
+ThumbnailSpec = tuple[str, int, int, str]
+
+
+class PrinterProfile:
+    """
+    Thumbnail profile of a printer model
+    """
+
+    def __init__(self, profile_id: str, name: str, layout: str, thumbnails: list[ThumbnailSpec], background: str,
+                 light_background: bool = False, aliases: Optional[list[str]] = None):
+        """
+        :param profile_id: Id of the profile (stored in the settings)
+        :param name: Display name
+        :param layout: Name of the thumbnail layout
+        :param thumbnails: Thumbnails of the layout in G-code order (the encoding plan of the printer)
+        :param background: File name of the thumbnail background in the img folder
+        :param light_background: Whether the background is light (dark text is used then)
+        :param aliases: Other Cura definition ids of the printer (the profile id is matched too)
+        """
+        self.profile_id: str = profile_id
+        self.name: str = name
+        self.layout: str = layout
+        self.thumbnails: list[ThumbnailSpec] = thumbnails
+        self.background: str = background
+        self.light_background: bool = light_background
+        self.aliases: list[str] = aliases or []
+
+
+class PrinterProfiles:
+    """
+    Registry of the supported printers, compiled from printer_profiles.json on first use (in display order, lookups
+    are precomputed)
+    """
+
+    PROFILES_PATH: str = path.abspath(path.join(path.dirname(path.realpath(__file__)), "..", "printer_profiles.json"))
+    IMG_PATH: str = path.abspath(path.join(path.dirname(path.realpath(__file__)), "..", "img"))
+    ENCODINGS: list[str] = ["old", "colpic", "b64jpg"]
+
+    _profiles: list[PrinterProfile] = []
+    _layouts: dict[str, list[ThumbnailSpec]] = {}
+    _default_profile_id: str = ""
+    _indices: dict[str, int] = {}
+    _lookup: dict[str, PrinterProfile] = {}
+
+    @classmethod
+    def profiles(cls) -> list[PrinterProfile]:
+        """
+        Get all profiles in display order
+        """
+        if not cls._profiles:
+            cls.load()
+        return cls._profiles
+
+    @classmethod
+    def layouts(cls) -> dict[str, list[ThumbnailSpec]]:
+        """
+        Get all thumbnail layouts by name
+        """
+        if not cls._profiles:
+            cls.load()
+        return cls._layouts
+
+    @classmethod
+    def default_profile_id(cls) -> str:
+        """
+        Get the id of the profile used if the printer is not configured
+        """
+        if not cls._profiles:
+            cls.load()
+        return cls._default_profile_id
+
+    @classmethod
+    def get(cls, index: int) -> PrinterProfile:
+        """
+        Get a profile by its index
+        """
+        return cls.profiles()[index]
+
+    @classmethod
+    def index_of(cls, profile_id: str) -> int:
+        """
+        Get the index of a profile (raises KeyError for unknown ids)
+        """
+        if not cls._profiles:
+            cls.load()
+        return cls._indices[profile_id]
+
+    @classmethod
+    def find(cls, name: str) -> Optional[PrinterProfile]:
+        """
+        Find the profile of a printer
+        :param name: Profile id, Cura definition id or machine name (e.g. "ELEGOO NEPTUNE 4 Pro")
+        :return: The profile (None if the printer is not supported)
+        """
+        if not cls._profiles:
+            cls.load()
+        return cls._lookup.get(cls._normalize(name))
+
+    @classmethod
+    def load(cls, profiles_path: Optional[str] = None) -> None:
+        """
+        Load and compile the profile file (raises ValueError if it is invalid)
+        :param profiles_path: Profile file to load (default: printer_profiles.json of the plugin)
+        """
+        profiles_path = profiles_path or cls.PROFILES_PATH
+        with open(profiles_path, "r", encoding="utf-8") as file:
+            data: dict[str, Any] = json.load(file)
+        try:
+            layouts: dict[str, list[ThumbnailSpec]] = {name: [cls._compile_thumbnail(thumbnail) for thumbnail in
+                                                               thumbnails] for name, thumbnails in
+                                                        data["layouts"].items()}
+            profiles: list[PrinterProfile] = [cls._compile_profile(printer, layouts) for printer in data["printers"]]
+            default_profile_id: str = data["default_printer"]
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Invalid printer profiles in {profiles_path}: {e!r}") from e
+
+        indices: dict[str, int] = {profile.profile_id: i for i, profile in enumerate(profiles)}
+        lookup: dict[str, PrinterProfile] = {}
+        for profile in profiles:
+            for key in [profile.profile_id, profile.name, *profile.aliases]:
+                if lookup.setdefault(cls._normalize(key), profile) is not profile:
+                    raise ValueError(f"Invalid printer profiles in {profiles_path}: {key!r} is used twice")
+        if default_profile_id not in indices:
+            raise ValueError(f"Invalid printer profiles in {profiles_path}: unknown default {default_profile_id!r}")
+        cls._layouts, cls._profiles, cls._default_profile_id = layouts, profiles, default_profile_id
+        cls._indices, cls._lookup = indices, lookup
+
+    @classmethod
+    def _compile_thumbnail(cls, thumbnail: dict[str, Any]) -> ThumbnailSpec:
+        """
+        Compile and check a thumbnail of a layout
+        """
+        encoding, width, height, tag = thumbnail["encoding"], thumbnail["width"], thumbnail["height"], thumbnail["tag"]
+        if encoding not in cls.ENCODINGS:
+            raise ValueError(f"Unknown encoding {encoding!r}")
+        if not isinstance(width, int) or not isinstance(height, int) or width <= 0 or height <= 0:
+            raise ValueError(f"Invalid size {width!r}x{height!r}")
+        if not isinstance(tag, str) or not tag:
+            raise ValueError(f"Invalid tag {tag!r}")
+        return encoding, width, height, tag
+
+    @classmethod
+    def _compile_profile(cls, printer: dict[str, Any], layouts: dict[str, list[ThumbnailSpec]]) -> PrinterProfile:
+        """
+        Compile and check a printer (resolves its layout to the thumbnails to encode)
+        """
+        if printer["layout"] not in layouts:
+            raise ValueError(f"Unknown layout {printer['layout']!r} of printer {printer['id']!r}")
+        if not path.isfile(path.join(cls.IMG_PATH, printer["background"])):
+            raise ValueError(f"Missing background {printer['background']!r} of printer {printer['id']!r}")
+        return PrinterProfile(profile_id=printer["id"], name=printer["name"], layout=printer["layout"],
+                              thumbnails=layouts[printer["layout"]], background=printer["background"],
+                              light_background=printer.get("light_background", False),
+                              aliases=printer.get("aliases", []))
+
+    @classmethod
+    def _normalize(cls, name: str) -> str:
+        """
+        Normalize a printer name for lookups ("Elegoo Neptune 4 Pro" -> "elegoo_neptune_4_pro")
+        """
+        return re.sub(r"[^a-z0-9]+", "_", name.replace("(beta)", "").lower()).strip("_")
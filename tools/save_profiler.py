@@ -0,0 +1,172 @@
+# Copyright (c) 2023 - 2024 Molodos
+# The ElegooNeptuneThumbnails plugin is released under the terms of the AGPLv3 or higher.
+
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from threading import Lock, local
+from typing import ContextManager, Iterator, Optional
+
+
+class SaveProfiler:
+    """
+    Opt-in timing of the stages of a save (durations and payload sizes per save, rolling history per stage)
+    """
+
+    HISTORY_SIZE: int = 100
+    BUCKET_EDGES_MS: list[float] = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+    SPARKLINE_CHARS: str = " ▁▂▃▄▅▆▇█"
+    TOTAL_STAGE: str = "total"
+
+    _lock: Lock = Lock()
+    _save_id: int = 0
+    _save_start: Optional[float] = None
+    # Save a worker thread works for (unbound threads work for the current save)
+    _thread_save: local = local()
+    _stages: dict[str, list[float]] = {}
+    _sizes: dict[str, int] = {}
+    _history: dict[str, deque[float]] = {}
+
+    @classmethod
+    def start_save(cls, enabled: bool) -> None:
+        """
+        Start recording a save (stages are only recorded while a save is recorded)
+        :param enabled: Whether to record this save
+        """
+        with cls._lock:
+            cls._save_id += 1
+            cls._save_start = time.perf_counter() if enabled else None
+            cls._stages = {}
+            cls._sizes = {}
+
+    @classmethod
+    def current_save(cls) -> int:
+        """
+        Get the id of the current save (to bind workers to it)
+        """
+        return cls._save_id
+
+    @classmethod
+    @contextmanager
+    def bind_save(cls, save_id: int) -> Iterator[None]:
+        """
+        Record the stages of the calling thread for the given save only (stages of a worker that outlives its save,
+        e.g. after a timeout, are dropped instead of being added to the next save)
+        :param save_id: Id of the save from current_save
+        """
+        cls._thread_save.save_id = save_id
+        try:
+            yield
+        finally:
+            del cls._thread_save.save_id
+
+    @classmethod
+    def is_recording(cls) -> bool:
+        """
+        Check if a save is being recorded (for the save the calling thread works for)
+        """
+        return cls._save_start is not None and cls._is_current_save()
+
+    @classmethod
+    def stage(cls, name: str, size: Optional[int] = None) -> ContextManager:
+        """
+        Measure a stage of the save (no-op if not recording)
+        :param name: Stage name (durations of the same stage in a save are added up)
+        :param size: Payload size of the stage (e.g. chars of encoded G-code)
+        """
+        if not cls.is_recording():
+            return nullcontext()
+        return cls._measure(name, size)
+
+    @classmethod
+    def record(cls, name: str, seconds: float, size: Optional[int] = None) -> None:
+        """
+        Record a stage duration measured elsewhere (e.g. in a worker process)
+        :param name: Stage name (durations of the same stage in a save are added up)
+        :param seconds: Duration of the stage
+        :param size: Payload size of the stage (e.g. chars of encoded G-code)
+        """
+        with cls._lock:
+            if not cls.is_recording():
+                return
+            cls._stages.setdefault(name, []).append(seconds)
+            if size is not None:
+                cls._sizes[name] = cls._sizes.get(name, 0) + size
+
+    @classmethod
+    def finish_save(cls) -> Optional[str]:
+        """
+        Stop recording the save and add its stages to the history
+        :return: Report of the save (None if not recorded)
+        """
+        with cls._lock:
+            if cls._save_start is None:
+                return None
+            cls._stages[cls.TOTAL_STAGE] = [time.perf_counter() - cls._save_start]
+            cls._save_start = None
+            parts: list[str] = []
+            for name, durations in cls._stages.items():
+                duration_ms: float = sum(durations) * 1e3
+                cls._history.setdefault(name, deque(maxlen=cls.HISTORY_SIZE)).append(duration_ms)
+                size: str = f" ({cls._sizes[name]} chars)" if name in cls._sizes else ""
+                parts.append(f"{name} {duration_ms:.1f} ms{size}")
+            return ", ".join(parts)
+
+    @classmethod
+    def histogram(cls, name: str) -> list[int]:
+        """
+        Get the histogram of the recent durations of a stage
+        :return: Amount of durations per bucket (bucket i holds durations below BUCKET_EDGES_MS[i], the last bucket
+                 everything above)
+        """
+        counts: list[int] = [0] * (len(cls.BUCKET_EDGES_MS) + 1)
+        with cls._lock:
+            durations: list[float] = list(cls._history.get(name, []))
+        for duration in durations:
+            counts[next((i for i, edge in enumerate(cls.BUCKET_EDGES_MS) if duration < edge),
+                        len(cls.BUCKET_EDGES_MS))] += 1
+        return counts
+
+    @classmethod
+    def summary(cls) -> list[str]:
+        """
+        Summarize the recent saves per stage (median, 90th percentile, maximum and a histogram sparkline from 1 ms
+        to 5 s)
+        """
+        with cls._lock:
+            history: dict[str, list[float]] = {name: sorted(durations) for name, durations in cls._history.items()}
+        lines: list[str] = []
+        for name, durations in history.items():
+            counts: list[int] = cls.histogram(name)
+            sparkline: str = "".join(
+                cls.SPARKLINE_CHARS[-(-count * (len(cls.SPARKLINE_CHARS) - 1) // max(counts))] for count in counts)
+            lines.append(f"{name}: {durations[len(durations) // 2]:.1f} / {durations[len(durations) * 9 // 10]:.1f} / "
+                         f"{durations[-1]:.1f} ms [{sparkline}] n={len(durations)}")
+        return lines
+
+    @classmethod
+    def clear(cls) -> None:
+        """
+        Clear the history
+        """
+        with cls._lock:
+            cls._history = {}
+
+    @classmethod
+    def _is_current_save(cls) -> bool:
+        """
+        Check if the calling thread works for the current save
+        """
+        return getattr(cls._thread_save, "save_id", cls._save_id) == cls._save_id
+
+    @classmethod
+    @contextmanager
+    def _measure(cls, name: str, size: Optional[int]) -> Iterator[None]:
+        """
+        Measure the duration of the wrapped block
+        """
+        start: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            cls.record(name, time.perf_counter() - start, size=size)
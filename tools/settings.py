@@ -9,6 +9,7 @@ from typing import Any, Optional
 from UM.Application import Application
 from UM.Settings import ContainerStack
 from cura.Settings import GlobalStack
+from .printer_profiles import PrinterProfile, PrinterProfiles
 
 
 class Settings:
@@ -17,6 +18,8 @@ class Settings:
     """
 
     CURA_VERSION_KEY: str = "general/last_run_version"
+    DEFAULT_ENCODING_TIMEOUT: float = 10.0
+    ENCODING_TIMEOUTS: list[float] = [5.0, 10.0, 30.0, 60.0]
     OPTIONS: dict[str, str] = {
         "nothing": "Nothing",
         "time_estimate": "Time Estimate",
@@ -27,21 +30,7 @@ class Settings:
         "filament_meters_estimate": "Filament Meters Estimate",
         "line_width": "Line Width"
     }
-    PRINTER_MODELS: dict[str, str] = {
-        "elegoo_neptune_4": "Elegoo Neptune 4",
-        "elegoo_neptune_4_pro": "Elegoo Neptune 4 Pro",
-        "elegoo_neptune_4_plus": "Elegoo Neptune 4 Plus",
-        "elegoo_neptune_4_max": "Elegoo Neptune 4 Max",
-        "elegoo_neptune_3_pro": "Elegoo Neptune 3 Pro",
-        "elegoo_neptune_3_plus": "Elegoo Neptune 3 Plus",
-        "elegoo_neptune_3_max": "Elegoo Neptune 3 Max",
-        "elegoo_neptune_2": "Elegoo Neptune 2",
-        "elegoo_neptune_2_s": "Elegoo Neptune 2S",
-        "elegoo_neptune_2_d": "Elegoo Neptune 2D",
-        "elegoo_neptune_x": "Elegoo Neptune X",
-        "artillery_sidewinder_x3_pro": "Artillery Sidewinder X3 Pro (beta)",
-        "elegoo_orangestorm_giga": "Elegoo OrangeStorm Giga (beta)"
-    }
+    OPTION_IDS: list[str] = list(OPTIONS.keys())
 
     def __init__(self, statistics_id: str, plugin_json: dict[str, Any]):
         # Read stuff from params
@@ -55,31 +44,39 @@ class Settings:
 
         # Define config
         self.thumbnails_enabled: bool = True
-        self.printer_model: int = list(self.PRINTER_MODELS.keys()).index("elegoo_neptune_3_pro")
+        self.printer_model: int = PrinterProfiles.index_of(PrinterProfiles.default_profile_id())
         self.corner_options: list[int] = [1, 4, 3, 5]
         self.statistics_enabled: bool = True
         self.use_current_model: bool = False
         self.klipper_thumbnails_enabled: bool = True
+        self.encoding_timeout: float = self.DEFAULT_ENCODING_TIMEOUT
+        self.parallel_encoding: bool = False
+        self.timings_enabled: bool = False
+
+    def get_printer_profile(self) -> PrinterProfile:
+        """
+        Get the profile of the printer model
+        """
+        return PrinterProfiles.get(self.printer_model)
 
     def get_printer_model_id(self) -> str:
         """
         Get str id of printer model
         """
-        return list(self.PRINTER_MODELS.keys())[self.printer_model]
+        return self.get_printer_profile().profile_id
 
     def _set_printer_model_id(self, printer_model_id: str) -> None:
         """
         Set printer model from string id
         """
-        self.printer_model = list(self.PRINTER_MODELS.keys()).index(printer_model_id)
+        self.printer_model = PrinterProfiles.index_of(printer_model_id)
 
     def get_corner_option_ids(self) -> list[str]:
         """
         Get corner option ids (str)
         """
         # Find selected options
-        option_ids: list[str] = list(self.OPTIONS.keys())
-        selected_options: list[str] = [option_ids[i] for i in self.corner_options]
+        selected_options: list[str] = [self.OPTION_IDS[i] for i in self.corner_options]
 
         # Return
         return selected_options
@@ -89,45 +86,22 @@ class Settings:
         Set corner options from ids
         """
         if corner_option_ids:
-            option_ids: list[str] = list(self.OPTIONS.keys())
             for i, option_id in enumerate(corner_option_ids):
-                self.corner_options[i] = option_ids.index(option_id)
-
-    def is_elegoo_printer(self) -> bool:
-        """
-        Check if it is an elegoo printer
-        """
-        return "elegoo" in list(self.PRINTER_MODELS.keys())[self.printer_model]
-
-    def is_old_thumbnail(self) -> bool:
-        """
-        Check if old thumbnail is required
-        """
-        return list(self.PRINTER_MODELS.keys())[self.printer_model] in ["elegoo_neptune_2", "elegoo_neptune_2_s",
-                                                                        "elegoo_neptune_2_d", "elegoo_neptune_x"]
-
-    def is_b64jpg_thumbnail(self) -> bool:
-        """
-        Check if b64jpg thumbnail is required
-        """
-        return list(self.PRINTER_MODELS.keys())[self.printer_model] in ["elegoo_orangestorm_giga"]
-
-    def is_artillery_printer(self) -> bool:
-        """
-        Check if it is an artillery printer
-        """
-        return "artillery" in list(self.PRINTER_MODELS.keys())[self.printer_model]
+                self.corner_options[i] = self.OPTION_IDS.index(option_id)
 
     def load_json(self, data: dict[str, Any]) -> None:
         """
         Load from json
         """
         self.thumbnails_enabled = data.get("thumbnails_enabled", True)
-        self._set_printer_model_id(data.get("printer_model", "elegoo_neptune_3_pro"))
+        self._set_printer_model_id(data.get("printer_model", PrinterProfiles.default_profile_id()))
         self._set_corner_option_ids(data.get("corner_options", None))
         self.statistics_enabled = data.get("statistics_enabled", True)
         self.use_current_model = data.get("use_current_model", False)
         self.klipper_thumbnails_enabled = data.get("klipper_thumbnails_enabled", True)
+        self.encoding_timeout = data.get("encoding_timeout", self.DEFAULT_ENCODING_TIMEOUT)
+        self.parallel_encoding = data.get("parallel_encoding", False)
+        self.timings_enabled = data.get("timings_enabled", False)
 
     def to_json(self) -> dict[str, Any]:
         """
@@ -139,7 +113,10 @@ class Settings:
             "corner_options": self.get_corner_option_ids(),
             "statistics_enabled": self.statistics_enabled,
             "use_current_model": self.use_current_model,
-            "klipper_thumbnails_enabled": self.klipper_thumbnails_enabled
+            "klipper_thumbnails_enabled": self.klipper_thumbnails_enabled,
+            "encoding_timeout": self.encoding_timeout,
+            "parallel_encoding": self.parallel_encoding,
+            "timings_enabled": self.timings_enabled
         }
 
 
@@ -182,41 +159,21 @@ class SettingsManager:
             # Default settings
             cls._settings.thumbnails_enabled = True
             # Neptune 3 Pro is most probable
-            cls._settings.printer_model = list(Settings.PRINTER_MODELS.keys()).index("elegoo_neptune_3_pro")
+            cls._settings.printer_model = PrinterProfiles.index_of(PrinterProfiles.default_profile_id())
             cls._settings.corner_options = [1, 4, 3, 5]
             cls._settings.statistics_enabled = True
             cls._settings.use_current_model = False
             cls._settings.klipper_thumbnails_enabled = True
+            cls._settings.encoding_timeout = Settings.DEFAULT_ENCODING_TIMEOUT
+            cls._settings.parallel_encoding = False
+            cls._settings.timings_enabled = False
 
             # Try to recognize current printer model
             active_machine: Optional[GlobalStack] = Application.getInstance().getMachineManager().activeMachine
             printer_id: str = active_machine.definition.getId() if active_machine else "unknown"
-            if printer_id in ["elegoo_neptune_4"]:
-                cls._settings.printer_model = list(Settings.PRINTER_MODELS.keys()).index("elegoo_neptune_4")
-            elif printer_id in ["elegoo_neptune_4pro", "elegoo_neptune_4_pro"]:
-                cls._settings.printer_model = list(Settings.PRINTER_MODELS.keys()).index("elegoo_neptune_4_pro")
-            elif printer_id in ["elegoo_neptune_4plus", "elegoo_neptune_4_plus"]:
-                cls._settings.printer_model = list(Settings.PRINTER_MODELS.keys()).index("elegoo_neptune_4_plus")
-            elif printer_id in ["elegoo_neptune_4max", "elegoo_neptune_4_max"]:
-                cls._settings.printer_model = list(Settings.PRINTER_MODELS.keys()).index("elegoo_neptune_4_max")
-            elif printer_id in ["elegoo_neptune_3pro", "elegoo_neptune_3_pro"]:
-                cls._settings.printer_model = list(Settings.PRINTER_MODELS.keys()).index("elegoo_neptune_3_pro")
-            elif printer_id in ["elegoo_neptune_3plus", "elegoo_neptune_3_plus"]:
-                cls._settings.printer_model = list(Settings.PRINTER_MODELS.keys()).index("elegoo_neptune_3_plus")
-            elif printer_id in ["elegoo_neptune_3max", "elegoo_neptune_3_max"]:
-                cls._settings.printer_model = list(Settings.PRINTER_MODELS.keys()).index("elegoo_neptune_3_max")
-            elif printer_id in ["elegoo_neptune_2"]:
-                cls._settings.printer_model = list(Settings.PRINTER_MODELS.keys()).index("elegoo_neptune_2")
-            elif printer_id in ["elegoo_neptune_2s", "elegoo_neptune_2_s"]:
-                cls._settings.printer_model = list(Settings.PRINTER_MODELS.keys()).index("elegoo_neptune_2_s")
-            elif printer_id in ["elegoo_neptune_2d", "elegoo_neptune_2_d"]:
-                cls._settings.printer_model = list(Settings.PRINTER_MODELS.keys()).index("elegoo_neptune_2_d")
-            elif printer_id in ["elegoo_neptune_x"]:
-                cls._settings.printer_model = list(Settings.PRINTER_MODELS.keys()).index("elegoo_neptune_x")
-            elif printer_id in ["artillery_sidewinder_x3_pro"]:
-                cls._settings.printer_model = list(Settings.PRINTER_MODELS.keys()).index("artillery_sidewinder_x3_pro")
-            elif printer_id in ["elegoo_orangestorm_giga"]:
-                cls._settings.printer_model = list(Settings.PRINTER_MODELS.keys()).index("elegoo_orangestorm_giga")
+            profile: Optional[PrinterProfile] = PrinterProfiles.find(printer_id)
+            if profile:
+                cls._settings.printer_model = PrinterProfiles.index_of(profile.profile_id)
             else:
                 # Disable thumbnails if printer is not recognized (to avoid slice errors)
                 cls._settings.thumbnails_enabled = False
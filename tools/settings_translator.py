@@ -0,0 +1,287 @@
+# Copyright (c) 2023 - 2024 Molodos
+# The ElegooNeptuneThumbnails plugin is released under the terms of the AGPLv3 or higher.
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal, pyqtSlot, pyqtProperty
+from PyQt6.QtGui import QImage
+from PyQt6.QtQuick import QQuickItem, QQuickWindow
+
+from UM.Logger import Logger
+from .preview_image_provider import PreviewImageProvider
+from .save_profiler import SaveProfiler
+from .printer_profiles import PrinterProfiles
+from .settings import Settings, SettingsManager
+from .thumbnail_generator import ThumbnailGenerator
+
+
+class SettingsTranslator(QObject):
+    """
+    Settings manager (integration between python code and gui)
+    """
+
+    PREVIEW_DEBOUNCE_MS: int = 150
+    BUY_ME_A_COFFEE_URL: str = "https://img.buymeacoffee.com/button-api/?text=Buy%20me%20a%20coffee&emoji=&slug=molodos&button_colour=196EF0&font_colour=ffffff&font_family=Comic&outline_colour=000000&coffee_colour=FFDD00"
+
+    # Emitted from the preview worker with the generation and image of a rendered preview
+    preview_rendered = pyqtSignal(int, QImage)
+
+    def __init__(self):
+        QObject.__init__(self)
+        self._popup: Optional[QQuickWindow] = None
+        self._selected_corner: int = -1
+        self._support_button_loaded: bool = False
+
+        # Preview rendering (debounced, composed in a worker and provided to QML from memory)
+        self.preview_provider: PreviewImageProvider = PreviewImageProvider()
+        self._preview_generation: int = 0
+        self._preview_executor: Optional[ThreadPoolExecutor] = None
+        self._preview_timer: QTimer = QTimer(self)
+        self._preview_timer.setSingleShot(True)
+        self._preview_timer.setInterval(self.PREVIEW_DEBOUNCE_MS)
+        self._preview_timer.timeout.connect(self._start_preview_render)
+        self.preview_rendered.connect(self._show_preview)
+
+    def set_popup_ref(self, popup: QQuickWindow) -> None:
+        """
+        Set the popup ref for updates
+        """
+        self._popup = popup
+
+    def render_thumbnail(self) -> None:
+        """
+        Render a thumbnail image form settings (needs to be called on settings change, changes in quick succession are
+        rendered once)
+        """
+        self._preview_timer.start()
+
+    def _start_preview_render(self) -> None:
+        """
+        Take the snapshot on the main thread and compose the preview in the background
+        """
+        self._preview_generation += 1
+        snapshot: Optional[QImage] = ThumbnailGenerator.take_preview_snapshot()
+        if self._preview_executor is None:
+            self._preview_executor = ThreadPoolExecutor(max_workers=1,
+                                                        thread_name_prefix="ElegooNeptuneThumbnailsPreview")
+        self._preview_executor.submit(self._render_preview, self._preview_generation, snapshot)
+
+    def _render_preview(self, generation: int, snapshot: Optional[QImage]) -> None:
+        """
+        Compose the preview (runs in the worker, skipped if a newer preview was requested meanwhile)
+        """
+        if generation != self._preview_generation:
+            return
+        try:
+            self.preview_rendered.emit(generation, ThumbnailGenerator.generate_preview(snapshot=snapshot))
+        except Exception as e:
+            Logger.log("e", f"Failed to render thumbnail preview: {e}")
+
+    @pyqtSlot(int, QImage)
+    def _show_preview(self, generation: int, image: QImage) -> None:
+        """
+        Show a rendered preview (outdated previews are dropped)
+        """
+        if generation != self._preview_generation or not self._popup:
+            return
+        self.preview_provider.set_image(image)
+        self._popup.findChild(QQuickItem, "thumbnailPreview") \
+            .setProperty("source", self.preview_provider.get_url(str(generation)))
+
+    def update_timings(self) -> None:
+        """
+        Show the timings of the recent saves
+        """
+        if self._popup:
+            self._popup.findChild(QQuickItem, "saveTimings").setProperty("text", self.timings_summary)
+
+    def update_gui(self) -> None:
+        """
+        Updates all values in the gui
+        """
+        # Only update if popup exists
+        if self._popup:
+            self._popup.findChild(QQuickItem, "thumbnailsEnabled") \
+                .setProperty("checked", SettingsManager.get_settings().thumbnails_enabled)
+            self._popup.findChild(QQuickItem, "klipperThumbnailsEnabled") \
+                .setProperty("checked", SettingsManager.get_settings().klipper_thumbnails_enabled)
+            self._popup.findChild(QQuickItem, "printerModel") \
+                .setProperty("currentIndex", SettingsManager.get_settings().printer_model)
+            for i, v in enumerate(SettingsManager.get_settings().corner_options):
+                self._popup.findChild(QQuickItem, f"corner{i}") \
+                    .setProperty("currentIndex", v)
+            self._popup.findChild(QQuickItem, "sendStatistics") \
+                .setProperty("checked", SettingsManager.get_settings().statistics_enabled)
+            self._popup.findChild(QQuickItem, "useCurrentModel") \
+                .setProperty("checked", SettingsManager.get_settings().use_current_model)
+            self._popup.findChild(QQuickItem, "encodingTimeout") \
+                .setProperty("currentIndex", self.selected_encoding_timeout)
+            self._popup.findChild(QQuickItem, "parallelEncoding") \
+                .setProperty("checked", SettingsManager.get_settings().parallel_encoding)
+            self._popup.findChild(QQuickItem, "timingsEnabled") \
+                .setProperty("checked", SettingsManager.get_settings().timings_enabled)
+            self.update_timings()
+            if not self._support_button_loaded:
+                self._popup.findChild(QQuickItem, "donationLink") \
+                    .setProperty("source", self.BUY_ME_A_COFFEE_URL + f"&nonce={str(uuid.uuid4())}")
+                self._support_button_loaded = True
+            self.render_thumbnail()
+
+    # Thumbnails enabled state
+
+    @pyqtProperty(bool)
+    def thumbnails_enabled(self) -> bool:
+        return SettingsManager.get_settings().thumbnails_enabled
+
+    @pyqtSlot(bool)
+    def set_thumbnails_enabled(self, enabled: bool) -> None:
+        updated: bool = SettingsManager.get_settings().thumbnails_enabled != enabled
+        SettingsManager.get_settings().thumbnails_enabled = enabled
+        if updated:
+            # Update preview
+            self.render_thumbnail()
+
+    # Klipper thumbnails enabled state
+
+    @pyqtProperty(bool)
+    def klipper_thumbnails_enabled(self) -> bool:
+        return SettingsManager.get_settings().klipper_thumbnails_enabled
+
+    @pyqtSlot(bool)
+    def set_klipper_thumbnails_enabled(self, enabled: bool) -> None:
+        updated: bool = SettingsManager.get_settings().klipper_thumbnails_enabled != enabled
+        SettingsManager.get_settings().klipper_thumbnails_enabled = enabled
+        if updated:
+            # Update preview
+            self.render_thumbnail()
+
+    # Printer dropdown
+
+    @pyqtProperty(list)  # List must be untyped!
+    def printer_model_list(self) -> list[str]:
+        return [profile.name for profile in PrinterProfiles.profiles()]
+
+    @pyqtSlot(int)
+    def select_printer_model(self, model: int) -> None:
+        updated: bool = SettingsManager.get_settings().printer_model != model
+        SettingsManager.get_settings().printer_model = model
+        if updated:
+            # Update preview
+            self.render_thumbnail()
+
+    @pyqtProperty(int)
+    def selected_printer_model(self) -> int:
+        return SettingsManager.get_settings().printer_model
+
+    # Options dropdowns
+
+    @pyqtProperty(list)  # List must be untyped!
+    def option_list(self) -> list[str]:
+        return list(Settings.OPTIONS.values())
+
+    @pyqtSlot(int)
+    def select_corner(self, corner: int) -> None:
+        self._selected_corner = corner
+
+    @pyqtProperty(int)
+    def selected_corner_option(self) -> int:
+        return SettingsManager.get_settings().corner_options[self._selected_corner]
+
+    @pyqtSlot(int, int)
+    def set_corner_option(self, corner: int, option: int) -> None:
+        updated: bool = SettingsManager.get_settings().corner_options[corner] != option
+        SettingsManager.get_settings().corner_options[corner] = option
+        if updated:
+            # Update preview
+            self.render_thumbnail()
+
+    # Statistics enabled state
+
+    @pyqtProperty(bool)
+    def statistics_enabled(self) -> bool:
+        return SettingsManager.get_settings().statistics_enabled
+
+    @pyqtSlot(bool)
+    def set_statistics_enabled(self, enabled: bool) -> None:
+        SettingsManager.get_settings().statistics_enabled = enabled
+
+    # Encoding timeout dropdown
+
+    @pyqtProperty(list)  # List must be untyped!
+    def encoding_timeout_list(self) -> list[str]:
+        return [f"{timeout:g} s" for timeout in Settings.ENCODING_TIMEOUTS]
+
+    @pyqtSlot(int)
+    def select_encoding_timeout(self, index: int) -> None:
+        SettingsManager.get_settings().encoding_timeout = Settings.ENCODING_TIMEOUTS[index]
+
+    @pyqtProperty(int)
+    def selected_encoding_timeout(self) -> int:
+        # Closest option (the persisted value may have been edited by hand)
+        timeout: float = SettingsManager.get_settings().encoding_timeout
+        return min(range(len(Settings.ENCODING_TIMEOUTS)), key=lambda i: abs(Settings.ENCODING_TIMEOUTS[i] - timeout))
+
+    # Parallel encoding enabled state
+
+    @pyqtProperty(bool)
+    def parallel_encoding(self) -> bool:
+        return SettingsManager.get_settings().parallel_encoding
+
+    @pyqtSlot(bool)
+    def set_parallel_encoding(self, enabled: bool) -> None:
+        SettingsManager.get_settings().parallel_encoding = enabled
+
+    # Save timings enabled state
+
+    @pyqtProperty(bool)
+    def timings_enabled(self) -> bool:
+        return SettingsManager.get_settings().timings_enabled
+
+    @pyqtSlot(bool)
+    def set_timings_enabled(self, enabled: bool) -> None:
+        SettingsManager.get_settings().timings_enabled = enabled
+
+    @pyqtProperty(str)
+    def timings_summary(self) -> str:
+        lines: list[str] = SaveProfiler.summary()
+        if not lines:
+            return "No saves recorded yet"
+        return "Stage: median / p90 / max (histogram 1 ms - 5 s)\n" + "\n".join(lines)
+
+    @pyqtSlot()
+    def clear_timings(self) -> None:
+        SaveProfiler.clear()
+        self.update_timings()
+
+    # Use current model enabled state
+
+    @pyqtProperty(bool)
+    def use_current_model(self) -> bool:
+        return SettingsManager.get_settings().use_current_model
+
+    @pyqtSlot(bool)
+    def set_use_current_model(self, enabled: bool) -> None:
+        updated: bool = SettingsManager.get_settings().use_current_model != enabled
+        SettingsManager.get_settings().use_current_model = enabled
+        if updated:
+            # Update preview
+            self.render_thumbnail()
+
+    # Save/restore buttons
+
+    @pyqtSlot(bool)
+    def visibility_changed(self, visible: bool) -> None:
+        """
+        Popup open/close
+        """
+        if not visible:
+            # Discard settings on close
+            SettingsManager.load()
+
+    @pyqtSlot()
+    def save(self) -> None:
+        """
+        Save the settings
+        """
+        SettingsManager.save()
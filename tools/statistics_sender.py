@@ -1,25 +1,47 @@
 # Copyright (c) 2023 - 2024 Molodos
 # The ElegooNeptuneThumbnails plugin is released under the terms of the AGPLv3 or higher.
 
+import json
+import os
 import platform
-from typing import Any
-
-import requests
+import tempfile
+from os import path
+from queue import Empty, Full, Queue
+from threading import Lock, Thread
+from typing import Any, Optional, TYPE_CHECKING
 
+from UM.Logger import Logger
+from UM.Resources import Resources
 from .settings import SettingsManager
 
+if TYPE_CHECKING:
+    import requests
+
 
 class StatisticsSender:
     """
-    Sender for statistics
+    Sender for statistics (sends in a background thread, identical statistics are only sent once per session and
+    statistics that can't be sent are spooled to disk and sent with the next successful request)
     """
 
     TARGET_URL: str = "http://statistics.molodos.com:8090/cura"
+    TIMEOUT: float = 5.0
+    QUEUE_SIZE: int = 16
+    SPOOL_SIZE: int = 50
+    SPOOL_FILE_NAME: str = "elegoo_neptune_thumbnails_statistics.jsonl"
+
+    _queue: Queue = Queue(maxsize=QUEUE_SIZE)
+    _worker: Optional[Thread] = None
+    _worker_lock: Lock = Lock()
+    _spool_lock: Lock = Lock()
+    _spool_path: Optional[str] = None
+    _session: Optional["requests.Session"] = None
+    _seen: set[str] = set()
 
     @classmethod
     def send_statistics(cls) -> None:
         """
-        Sends anonymous statistics
+        Sends anonymous statistics (returns immediately)
         """
         # Collect statistics
         statistics: dict[str, Any] = {
@@ -36,7 +58,169 @@ class StatisticsSender:
         }
 
         # Send statistics
+        cls.enqueue(statistics)
+
+    @classmethod
+    def enqueue(cls, statistics: dict[str, Any]) -> None:
+        """
+        Queue statistics for sending (skipped if identical statistics were already queued in this session)
+        """
+        key: str = cls._key(statistics)
+        if key in cls._seen:
+            return
         try:
-            requests.post(url=cls.TARGET_URL, json=statistics, timeout=1)
+            cls._queue.put_nowait(statistics)
+        except Full:
+            Logger.log("d", "Statistics queue is full, dropping statistics")
+            return
+        cls._seen.add(key)
+        cls._start_worker()
+
+    @classmethod
+    def shutdown(cls) -> None:
+        """
+        Spool statistics that were not sent yet and stop the background thread
+        """
+        pending: list[dict[str, Any]] = []
+        while True:
+            try:
+                statistics: Optional[dict[str, Any]] = cls._queue.get_nowait()
+            except Empty:
+                break
+            cls._queue.task_done()
+            if statistics is not None:
+                pending.append(statistics)
+        if pending:
+            cls._spool(pending)
+        with cls._worker_lock:
+            if cls._worker is not None and cls._worker.is_alive():
+                cls._queue.put(None)
+            cls._worker = None
+
+    @classmethod
+    def _start_worker(cls) -> None:
+        """
+        Start the background thread if it isn't running
+        """
+        with cls._worker_lock:
+            if cls._worker is None or not cls._worker.is_alive():
+                cls._worker = Thread(target=cls._run, name="ElegooNeptuneThumbnailsStatistics", daemon=True)
+                cls._worker.start()
+
+    @classmethod
+    def _run(cls) -> None:
+        """
+        Send queued statistics until shutdown (runs in the background thread)
+        """
+        while True:
+            statistics: Optional[dict[str, Any]] = cls._queue.get()
+            try:
+                if statistics is None:
+                    break
+                if cls._post(statistics):
+                    # Online again, send what was spooled while offline
+                    cls._send_spool()
+                else:
+                    cls._spool([statistics])
+            except Exception as e:
+                Logger.log("d", f"Failed to send statistics: {e}")
+            finally:
+                cls._queue.task_done()
+        if cls._session is not None:
+            cls._session.close()
+            cls._session = None
+
+    @classmethod
+    def _post(cls, statistics: dict[str, Any]) -> bool:
+        """
+        Send statistics with the pooled session
+        :return: Success state
+        """
+        if cls._session is None:
+            # Imported in the background thread on first send, as it is slow to import
+            import requests
+            cls._session = requests.Session()
+        try:
+            cls._session.post(url=cls.TARGET_URL, json=statistics, timeout=cls.TIMEOUT).raise_for_status()
+            return True
         except Exception:
+            return False
+
+    @classmethod
+    def _send_spool(cls) -> None:
+        """
+        Send spooled statistics (the ones that fail stay in the spool)
+        """
+        with cls._spool_lock:
+            spooled: list[dict[str, Any]] = cls._read_spool()
+            if not spooled:
+                return
+            for i, statistics in enumerate(spooled):
+                if not cls._post(statistics):
+                    cls._write_spool(spooled[i:])
+                    return
+            cls._write_spool([])
+
+    @classmethod
+    def _spool(cls, statistics: list[dict[str, Any]]) -> None:
+        """
+        Add statistics to the spool (identical statistics are stored once, the oldest are dropped if it is full)
+        """
+        with cls._spool_lock:
+            spooled: dict[str, dict[str, Any]] = {cls._key(entry): entry for entry in cls._read_spool()}
+            for entry in statistics:
+                spooled.pop(cls._key(entry), None)
+                spooled[cls._key(entry)] = entry
+            cls._write_spool(list(spooled.values())[-cls.SPOOL_SIZE:])
+
+    @classmethod
+    def _read_spool(cls) -> list[dict[str, Any]]:
+        """
+        Read the spooled statistics (broken lines are skipped)
+        """
+        spooled: list[dict[str, Any]] = []
+        try:
+            with open(cls._get_spool_path(), "r", encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        spooled.append(json.loads(line))
+                    except ValueError:
+                        pass
+        except OSError:
             pass
+        return spooled
+
+    @classmethod
+    def _write_spool(cls, statistics: list[dict[str, Any]]) -> None:
+        """
+        Replace the spool (removed if empty)
+        """
+        spool_path: str = cls._get_spool_path()
+        if not statistics:
+            if path.exists(spool_path):
+                os.remove(spool_path)
+            return
+        file_descriptor, temp_path = tempfile.mkstemp(dir=path.dirname(spool_path), suffix=".tmp")
+        try:
+            with os.fdopen(file_descriptor, "w", encoding="utf-8") as file:
+                file.writelines(json.dumps(entry) + "\n" for entry in statistics)
+            os.replace(temp_path, spool_path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    @classmethod
+    def _get_spool_path(cls) -> str:
+        """
+        Get the path of the spool file (in the Cura data directory)
+        """
+        if cls._spool_path is None:
+            cls._spool_path = path.join(Resources.getDataStoragePath(), cls.SPOOL_FILE_NAME)
+        return cls._spool_path
+
+    @classmethod
+    def _key(cls, statistics: dict[str, Any]) -> str:
+        """
+        Key to detect identical statistics
+        """
+        return json.dumps(statistics, sort_keys=True)
@@ -2,15 +2,21 @@
 # The ElegooNeptuneThumbnails plugin is released under the terms of the AGPLv3 or higher.
 
 import math
-from array import array
+from concurrent.futures import CancelledError
 from os import path
+from threading import Event
+from typing import Callable, Iterator, Optional
 
 from PyQt6.QtCore import Qt, QByteArray, QBuffer, QIODeviceBase
 from PyQt6.QtGui import QImage, QPainter, QColor, QFont
 
 from UM.Logger import Logger
 from cura.Snapshot import Snapshot
-from . import lib_col_pic
+from .encoders import ThumbnailEncoder
+from .image_cache import ImageCache
+from .parallel_encoder import EncodingJob, ParallelEncoder
+from .save_profiler import SaveProfiler
+from .printer_profiles import PrinterProfile
 from .settings import SettingsManager
 
 
@@ -32,12 +38,78 @@ class SliceData:
         self.currency: str = currency
 
 
+class RenderContext:
+    """
+    Per save render context (takes a single snapshot of the scene and derives all thumbnails from it, can be cancelled
+    if the save stops waiting for it)
+    """
+
+    SNAPSHOT_SIZE: int = 600
+
+    def __init__(self, slice_data: SliceData):
+        self.slice_data: SliceData = slice_data
+        self.cancelled: Event = Event()
+        self._snapshot: Optional[QImage] = None
+        self._snapshot_taken: bool = False
+        self._thumbnails: dict[bool, QImage] = {}
+
+    def cancel(self) -> None:
+        """
+        Stop generating thumbnails for this save (the worker stops at the next stage)
+        """
+        self.cancelled.set()
+
+    def raise_if_cancelled(self) -> None:
+        """
+        Raise CancelledError if the save stopped waiting for the thumbnails
+        """
+        if self.cancelled.is_set():
+            raise CancelledError()
+
+    def get_snapshot(self) -> Optional[QImage]:
+        """
+        Get the snapshot of the scene (rendered on first access)
+        """
+        if not self._snapshot_taken:
+            with SaveProfiler.stage("snapshot"):
+                self._snapshot = ThumbnailGenerator._take_snapshot(width=self.SNAPSHOT_SIZE,
+                                                                   height=self.SNAPSHOT_SIZE)
+            self._snapshot_taken = True
+        return self._snapshot
+
+    def get_thumbnail(self, add_background: bool = True) -> QImage:
+        """
+        Get the composed 900x900 thumbnail with or without background (composed on first access)
+        """
+        if add_background not in self._thumbnails:
+            self.raise_if_cancelled()
+            snapshot: Optional[QImage] = self.get_snapshot()
+            with SaveProfiler.stage("compose" if add_background else "compose (no background)"):
+                self._thumbnails[add_background] = ThumbnailGenerator._render_thumbnail(
+                    slice_data=self.slice_data, is_preview=False, add_background=add_background, snapshot=snapshot,
+                    take_snapshot=False)
+        return self._thumbnails[add_background]
+
+    def get_scaled_snapshot(self, width: int, height: int) -> QImage:
+        """
+        Get the plain snapshot downscaled to the given size
+        """
+        snapshot: Optional[QImage] = self.get_snapshot()
+        if not snapshot:
+            empty: QImage = QImage(width, height, QImage.Format.Format_RGBA8888)
+            empty.fill(Qt.GlobalColor.transparent)
+            return empty
+        self.raise_if_cancelled()
+        with SaveProfiler.stage(f"scale snapshot {width}x{height}"):
+            return snapshot.scaled(width, height, Qt.AspectRatioMode.KeepAspectRatio,
+                                   Qt.TransformationMode.SmoothTransformation)
+
+
 class ThumbnailGenerator:
     """
     Thumbnail generator
     """
 
-    KLIPPER_THUMBNAIL_BLOCK_SIZE: int = 78
     COLORS: dict[str, QColor] = {
         "green": QColor(34, 236, 128),
         "red": QColor(209, 76, 81),
@@ -49,113 +121,107 @@ class ThumbnailGenerator:
         "own_gray": QColor(200, 200, 200),
         "darker_gray": QColor(63, 63, 63)
     }
-    BACKGROUND_OLD_PATH: str = path.abspath(path.join(path.dirname(path.realpath(__file__)), "..", "img", "bg_old.png"))
-    BACKGROUND_NEW_PATH: str = path.abspath(path.join(path.dirname(path.realpath(__file__)), "..", "img", "bg_new.png"))
-    BACKGROUND_ARTILLERY_PATH: str = path.abspath(
-        path.join(path.dirname(path.realpath(__file__)), "..", "img", "bg_artillery.png"))
-    BACKGROUND_ORANGESTORM_PATH: str = path.abspath(
-        path.join(path.dirname(path.realpath(__file__)), "..", "img", "bg_orangestorm.png"))
+    IMG_PATH: str = path.abspath(path.join(path.dirname(path.realpath(__file__)), "..", "img"))
     FOREGROUND_IMAGE_PATH: str = path.abspath(
         path.join(path.dirname(path.realpath(__file__)), "..", "img", "benchy.png"))
     NO_FOREGROUND_IMAGE_PATH: str = path.abspath(
         path.join(path.dirname(path.realpath(__file__)), "..", "img", "cross.png"))
-    THUMBNAIL_PREVIEW_PATH: str = path.abspath(
-        path.join(path.dirname(path.realpath(__file__)), "..", "img", "thumbnail_preview.png"))
 
     @classmethod
-    def generate_preview(cls) -> None:
+    def take_preview_snapshot(cls) -> Optional[QImage]:
         """
-        Generate a preview image based on settings
+        Take the snapshot shown in the preview (needs the Qt main thread)
+        :return: The snapshot (None if the preview doesn't show the current model or the scene is empty)
         """
-        thumbnail: QImage = cls._render_thumbnail(is_preview=True, slice_data=SliceData())
-        thumbnail.save(cls.THUMBNAIL_PREVIEW_PATH)
+        if not SettingsManager.get_settings().use_current_model or (
+                not SettingsManager.get_settings().thumbnails_enabled and
+                not SettingsManager.get_settings().klipper_thumbnails_enabled):
+            return None
+        return cls._take_snapshot(width=RenderContext.SNAPSHOT_SIZE, height=RenderContext.SNAPSHOT_SIZE)
 
     @classmethod
-    def generate_gcode_prefix(cls, slice_data: SliceData) -> str:
+    def generate_preview(cls, snapshot: Optional[QImage] = None) -> QImage:
         """
-        Generate a g-code prefix string based on settings
+        Generate a preview image based on settings (can run off the Qt main thread, as no snapshot is taken)
+        :param snapshot: Snapshot from take_preview_snapshot
         """
-        # Generate thumbnail
-        thumbnail: QImage = cls._render_thumbnail(is_preview=False, slice_data=slice_data)
-
-        # Parse to g-code prefix
-        gcode_prefix: str = ""
-        if SettingsManager.get_settings().is_elegoo_printer():
-            if SettingsManager.get_settings().is_old_thumbnail():
-                gcode_prefix += cls._parse_thumbnail_old(thumbnail, 100, 100, "simage")
-                gcode_prefix += cls._parse_thumbnail_old(thumbnail, 200, 200, ";gimage")
-            elif SettingsManager.get_settings().is_b64jpg_thumbnail():
-                gcode_prefix += cls._parse_thumbnail_b64jpg(thumbnail, 400, 400, "gimage")
-                gcode_prefix += cls._parse_thumbnail_b64jpg(thumbnail, 114, 114, "simage")
-            else:
-                gcode_prefix += cls._parse_thumbnail_new(thumbnail, 200, 200, "gimage")
-                gcode_prefix += cls._parse_thumbnail_new(thumbnail, 160, 160, "simage")
-        elif SettingsManager.get_settings().is_artillery_printer():
-            gcode_prefix += cls._parse_thumbnail_new(thumbnail, 85, 85, "simage")
-            gcode_prefix += cls._parse_thumbnail_new(thumbnail, 230, 230, "gimage")
-            gcode_prefix += cls._parse_thumbnail_new(thumbnail, 170, 170, "mimage")
-        gcode_prefix += f"\r;Thumbnail generated by the {SettingsManager.get_settings().plugin_json['name']} plugin version {SettingsManager.get_settings().plugin_json['version']} (https://github.com/Molodos/ElegooNeptuneThumbnails)\r\r"
+        return cls._render_thumbnail(is_preview=True, slice_data=SliceData(), snapshot=snapshot, take_snapshot=False)
 
-        # Return
-        return gcode_prefix
+    @classmethod
+    def generate_gcode_prefix(cls, render_context: RenderContext) -> Iterator[str]:
+        """
+        Generate the g-code prefix based on settings
+        :return: The prefix as G-code segments, one per image and one for the footer (images are never split over
+                 segments, so lines other plugins add to the first segment don't end up inside of an image)
+        """
+        # Generate thumbnail
+        thumbnail: QImage = render_context.get_thumbnail(add_background=True)
+
+        # Parse to g-code prefix (independent sizes are encoded as separate jobs)
+        job_builders: dict[str, Callable[[QImage, int, int, str], EncodingJob]] = {
+            "old": cls._old_thumbnail_job,
+            "colpic": cls._new_thumbnail_job,
+            "b64jpg": cls._b64jpg_thumbnail_job
+        }
+        jobs: list[EncodingJob] = []
+        labels: list[str] = []
+        for encoding, width, height, img_type in SettingsManager.get_settings().get_printer_profile().thumbnails:
+            labels.append(f"{encoding} {img_type.strip(';')} {width}x{height}")
+            render_context.raise_if_cancelled()
+            with SaveProfiler.stage(f"scale {labels[-1]}"):
+                jobs.append(job_builders[encoding](thumbnail, width, height, img_type))
+        for lines in cls._run_encoding_jobs(jobs, labels=labels, cancelled=render_context.cancelled):
+            yield "".join(lines)
+        yield "".join(ThumbnailEncoder.encode_footer(SettingsManager.get_settings().plugin_json["name"],
+                                                     SettingsManager.get_settings().plugin_json["version"]))
 
     @classmethod
-    def generate_klipper_thumbnail_gcode(cls, slice_data: SliceData) -> str:
+    def generate_klipper_thumbnail_gcode(cls, render_context: RenderContext) -> Iterator[str]:
         """
         Generate klipper thumbnail gcode for thumbnails in sizes 32x32 and 300x300
+        :return: The thumbnails as G-code segments, one per image
         """
-        small_icon: QImage = cls._take_snapshot(width=32, height=32)
-        big_icon: QImage = cls._render_thumbnail(slice_data=slice_data, is_preview=False, add_background=False)
-        big_icon = big_icon.scaled(300, 300)
-        g_code: str = "\r"
-        for icon in [small_icon, big_icon]:
-            byte_array: QByteArray = QByteArray()
-            byte_buffer: QBuffer = QBuffer(byte_array)
-            byte_buffer.open(QIODeviceBase.OpenModeFlag.WriteOnly)
-            icon.save(byte_buffer, "PNG")
-            base64_string: str = str(byte_array.toBase64().data(), "UTF-8")
-            g_code += f"; thumbnail begin {icon.width()} {icon.height()} {len(base64_string)}\r"
-            while base64_string:
-                g_code += f"; {base64_string[0:cls.KLIPPER_THUMBNAIL_BLOCK_SIZE]}\r"
-                base64_string = base64_string[cls.KLIPPER_THUMBNAIL_BLOCK_SIZE:]
-            g_code += "; thumbnail end\r\r"
-        return g_code
+        small_icon: QImage = render_context.get_scaled_snapshot(width=32, height=32)
+        big_icon: QImage = render_context.get_thumbnail(add_background=False)
+        with SaveProfiler.stage("scale klipper 300x300"):
+            big_icon = big_icon.scaled(300, 300)
+        jobs: list[EncodingJob] = [cls._klipper_thumbnail_job(icon) for icon in [small_icon, big_icon]]
+        results: list[list[str]] = cls._run_encoding_jobs(jobs, labels=["klipper 32x32", "klipper 300x300"],
+                                                          cancelled=render_context.cancelled)
+        # Blank line in front of the thumbnails (part of the first image, so no segment is blank)
+        results[0][0] = "\r" + results[0][0]
+        for lines in results:
+            yield "".join(lines)
 
     @classmethod
-    def _render_thumbnail(cls, slice_data: SliceData, is_preview: bool = True, add_background: bool = True) -> QImage:
+    def _render_thumbnail(cls, slice_data: SliceData, is_preview: bool = True, add_background: bool = True,
+                          snapshot: Optional[QImage] = None, take_snapshot: bool = True) -> QImage:
         """
         Renders a thumbnail based on settings
+        :param snapshot: Already taken snapshot of the scene to use instead of taking a new one
+        :param take_snapshot: Whether to take a snapshot if none is given (only possible on the Qt main thread)
         """
         # Create background
-        is_light_background: bool = False
+        profile: PrinterProfile = SettingsManager.get_settings().get_printer_profile()
+        is_light_background: bool = add_background and profile.light_background
         background: QImage = QImage(900, 900, QImage.Format.Format_RGBA8888)
+        background.fill(Qt.GlobalColor.transparent)
         if add_background:
-            if SettingsManager.get_settings().is_old_thumbnail():
-                painter = QPainter(background)
-                painter.drawImage(0, 0, QImage(cls.BACKGROUND_OLD_PATH))
-                painter.end()
-            elif SettingsManager.get_settings().is_b64jpg_thumbnail():
-                is_light_background = True
-                painter = QPainter(background)
-                painter.drawImage(0, 0, QImage(cls.BACKGROUND_ORANGESTORM_PATH))
-                painter.end()
-            elif SettingsManager.get_settings().is_artillery_printer():
-                painter = QPainter(background)
-                painter.drawImage(0, 0, QImage(cls.BACKGROUND_ARTILLERY_PATH))
-                painter.end()
-            else:
-                painter = QPainter(background)
-                painter.drawImage(0, 0, QImage(cls.BACKGROUND_NEW_PATH))
-                painter.end()
+            painter = QPainter(background)
+            painter.drawImage(0, 0, ImageCache.get_image(path.join(cls.IMG_PATH, profile.background)))
+            painter.end()
 
         # Create foreground
-        foreground: QImage
+        foreground: Optional[QImage]
         if not SettingsManager.get_settings().thumbnails_enabled and not SettingsManager.get_settings().klipper_thumbnails_enabled:
-            foreground = QImage(cls.NO_FOREGROUND_IMAGE_PATH)
+            foreground = ImageCache.get_image(cls.NO_FOREGROUND_IMAGE_PATH)
+        elif snapshot is not None:
+            foreground = snapshot
         elif SettingsManager.get_settings().use_current_model or not is_preview:
-            foreground = cls._take_snapshot(width=600, height=600)
+            foreground = cls._take_snapshot(width=RenderContext.SNAPSHOT_SIZE,
+                                            height=RenderContext.SNAPSHOT_SIZE) if take_snapshot else None
         else:
-            foreground = QImage(cls.FOREGROUND_IMAGE_PATH)
+            foreground = ImageCache.get_image(cls.FOREGROUND_IMAGE_PATH)
 
         # Paint foreground on background
         if foreground:
@@ -198,7 +264,7 @@ class ThumbnailGenerator:
         """
         lines: list[str] = []
         for i in SettingsManager.get_settings().corner_options:
-            option: str = list(SettingsManager.get_settings().OPTIONS.keys())[i]
+            option: str = SettingsManager.get_settings().OPTION_IDS[i]
             if option == "nothing":
                 lines.append("")
             elif option == "time_estimate":
@@ -225,131 +291,78 @@ class ThumbnailGenerator:
         return lines
 
     @classmethod
-    def _parse_thumbnail_old(cls, img: QImage, width: int, height: int, img_type: str) -> str:
+    def _old_thumbnail_job(cls, img: QImage, width: int, height: int, img_type: str) -> EncodingJob:
         """
-        Parse thumbnail to string for old printers
-        TODO: Maybe optimize at some time
+        Scale an image for the old printer thumbnail encoder
         """
-        img_type = f";{img_type}:"
-        result = ""
         b_image = img.scaled(width, height, Qt.AspectRatioMode.KeepAspectRatio)
-        img_size = b_image.size()
-        result += img_type
-        datasize = 0
-        for i in range(img_size.height()):
-            for j in range(img_size.width()):
-                pixel_color = b_image.pixelColor(j, i)
-                r = pixel_color.red() >> 3
-                g = pixel_color.green() >> 2
-                b = pixel_color.blue() >> 3
-                rgb = (r << 11) | (g << 5) | b
-                str_hex = "%x" % rgb
-                if len(str_hex) == 3:
-                    str_hex = '0' + str_hex[0:3]
-                elif len(str_hex) == 2:
-                    str_hex = '00' + str_hex[0:2]
-                elif len(str_hex) == 1:
-                    str_hex = '000' + str_hex[0:1]
-                if str_hex[2:4] != '':
-                    result += str_hex[2:4]
-                    datasize += 2
-                if str_hex[0:2] != '':
-                    result += str_hex[0:2]
-                    datasize += 2
-                if datasize >= 50:
-                    datasize = 0
-            # if i != img_size.height() - 1:
-            result += '\rM10086 ;'
-            if i == img_size.height() - 1:
-                result += "\r"
-        return result
+        return ThumbnailEncoder.encode_old_thumbnail, (*cls._rgba_buffer(b_image), img_type)
 
     @classmethod
-    def _parse_thumbnail_new(cls, img: QImage, width: int, height: int, img_type: str) -> str:
+    def _new_thumbnail_job(cls, img: QImage, width: int, height: int, img_type: str) -> EncodingJob:
         """
-        Parse thumbnail to string for new printers
-        TODO: Maybe optimize at some time
+        Scale an image for the ColPic (new printer) thumbnail encoder
         """
-        img_type = f";{img_type}:"
-
-        result = ""
         b_image = img.scaled(width, height, Qt.AspectRatioMode.KeepAspectRatio)
-        img_size = b_image.size()
-        color16 = array('H')
-        try:
-            for i in range(img_size.height()):
-                for j in range(img_size.width()):
-                    pixel_color = b_image.pixelColor(j, i)
-                    r = pixel_color.red() >> 3
-                    g = pixel_color.green() >> 2
-                    b = pixel_color.blue() >> 3
-                    rgb = (r << 11) | (g << 5) | b
-                    color16.append(rgb)
-            output_data = bytearray(img_size.height() * img_size.width() * 10)
-            result_int = lib_col_pic.ColPic_EncodeStr(color16, img_size.height(), img_size.width(), output_data,
-                                                      img_size.height() * img_size.width() * 10, 1024)
-
-            data0 = str(output_data).replace('\\x00', '')
-            data1 = data0[2:len(data0) - 2]
-            each_max = 1024 - 8 - 1
-            max_line = int(len(data1) / each_max)
-            append_len = each_max - 3 - int(len(data1) % each_max) + 10
-            j = 0
-            for i in range(len(output_data)):
-                if output_data[i] != 0:
-                    if j == max_line * each_max:
-                        result += '\r;' + img_type + chr(output_data[i])
-                    elif j == 0:
-                        result += img_type + chr(output_data[i])
-                    elif j % each_max == 0:
-                        result += '\r' + img_type + chr(output_data[i])
-                    else:
-                        result += chr(output_data[i])
-                    j += 1
-            result += '\r;'
-            for m in range(append_len):
-                result += '0'
-
-        except Exception as e:
-            Logger.log("d", "Exception == " + str(e))
-
-        return result + '\r'
+        return ThumbnailEncoder.encode_col_pic_thumbnail, (*cls._rgba_buffer(b_image), img_type)
 
     @classmethod
-    def _parse_thumbnail_b64jpg(cls, img: QImage, width: int, height: int, img_type: str) -> str:
+    def _b64jpg_thumbnail_job(cls, img: QImage, width: int, height: int, img_type: str) -> EncodingJob:
         """
-        Parse thumbnail to string for new printers
-        TODO: Maybe optimize at some time
+        Scale and JPEG compress an image for the base64 JPEG thumbnail encoder
         """
-        img_type = f";{img_type}:"
-
-        result = ""
         b_image = img.scaled(width, height, Qt.AspectRatioMode.KeepAspectRatio)
+        byte_array: QByteArray = QByteArray()
+        byte_buffer: QBuffer = QBuffer(byte_array)
+        byte_buffer.open(QIODeviceBase.OpenModeFlag.WriteOnly)
+        b_image.save(byte_buffer, "JPEG")
+        return ThumbnailEncoder.encode_b64jpg_thumbnail, (byte_array.data(), img_type)
 
-        try:
-            byte_array: QByteArray = QByteArray()
-            byte_buffer: QBuffer = QBuffer(byte_array)
-            byte_buffer.open(QIODeviceBase.OpenModeFlag.WriteOnly)
-            b_image.save(byte_buffer, "JPEG")
-            base64_string: str = str(byte_array.toBase64().data(), "UTF-8")
-
-            each_max = 1024 - 8 - 1
-            max_line = int(len(base64_string) / each_max)
-
-            for i in range(len(base64_string)):
-                if i == max_line * each_max:
-                    result += '\r;' + img_type + base64_string[i]
-                elif i == 0:
-                    result += img_type + base64_string[i]
-                elif i % each_max == 0:
-                    result += '\r' + img_type + base64_string[i]
-                else:
-                    result += base64_string[i]
+    @classmethod
+    def _klipper_thumbnail_job(cls, img: QImage) -> EncodingJob:
+        """
+        Get the pixels of an image for the klipper thumbnail encoder
+        """
+        return ThumbnailEncoder.encode_klipper_thumbnail, cls._rgba_buffer(img)
 
-        except Exception as e:
-            Logger.log("d", "Exception == " + str(e))
+    @classmethod
+    def _run_encoding_jobs(cls, jobs: list[EncodingJob], labels: list[str],
+                           cancelled: Optional[Event] = None) -> list[list[str]]:
+        """
+        Run encoding jobs, in parallel workers if enabled (falls back to this thread if that fails)
+        :param labels: Names of the jobs for the save profiler
+        :param cancelled: Event of a cancelled save (raises CancelledError instead of running further jobs)
+        :return: G-code lines of every job in job order
+        """
+        durations: Optional[list[float]] = [] if SaveProfiler.is_recording() else None
+        results: Optional[list[list[str]]] = None
+        if SettingsManager.get_settings().parallel_encoding:
+            try:
+                results = ParallelEncoder.run_parallel(jobs, durations=durations, cancelled=cancelled)
+            except CancelledError:
+                raise
+            except Exception as e:
+                Logger.log("w", f"Parallel thumbnail encoding failed, encoding sequentially: {e}")
+                ParallelEncoder.shutdown()
+                if durations is not None:
+                    durations.clear()
+        if results is None:
+            results = ParallelEncoder.run_sequential(jobs, durations=durations, cancelled=cancelled)
+        for label, duration, result in zip(labels, durations or [], results):
+            SaveProfiler.record(f"encode {label}", duration, size=sum(len(line) for line in result))
+        return results
 
-        return result + '\r'
+    @classmethod
+    def _rgba_buffer(cls, img: QImage) -> tuple[bytes, int, int, int]:
+        """
+        Get the raw pixel buffer of an image (copied, so it can be sent to worker processes)
+        :param img: Image to read
+        :return: RGBA8888 pixels, width, height and bytes per pixel row
+        """
+        rgba_image: QImage = img.convertToFormat(QImage.Format.Format_RGBA8888)
+        bits = rgba_image.constBits()
+        bits.setsize(rgba_image.sizeInBytes())
+        return bits.asstring(), rgba_image.width(), rgba_image.height(), rgba_image.bytesPerLine()
 
     @classmethod
     def _take_snapshot(cls, width: int, height: int) -> QImage: